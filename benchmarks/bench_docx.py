@@ -0,0 +1,111 @@
+# benchmarks/bench_docx.py
+"""
+Сборка DOCX: прежний путь (весь Document в памяти, глава одним абзацем) против
+фрагментов глав, которые готовятся по мере перевода и в конце склеиваются потоком.
+Сначала проверяется, что в новом файле те же заголовки и абзацы по строкам перевода.
+Запуск из корня проекта: python -m benchmarks.bench_docx [--chapters 300] [--paragraphs 60]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from docx import Document
+
+from core.docx_writer import DocxAssembler
+
+WORDS = ("ночь", "была", "тихой", "и", "она", "шла", "вдоль", "реки", "мимо", "старой", "мельницы",
+         "пока", "он", "ждал", "вестей", "из", "столицы", "никто", "не", "говорил", "Наруто")
+
+
+def read_chapter(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().split('\n', 1)
+    return content[0].replace("<h1>", "").replace("</h1>", ""), content[1] if len(content) > 1 else ""
+
+
+def make_chapters(directory, chapters, paragraphs, seed=0):
+    rng = random.Random(seed)
+    paths = []
+    for i in range(chapters):
+        text = "\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))).capitalize() + "."
+                         for _ in range(paragraphs))
+        path = os.path.join(directory, f"chapter_{i:04d}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"<h1>Глава {i + 1}</h1>\n{text}")
+        paths.append((i, path))
+    return paths
+
+
+def old_assembly(chapters, output_path):
+    doc = Document()
+    doc.add_heading("Книга", 0)
+    for _, path in chapters:
+        title, text = read_chapter(path)
+        doc.add_heading(title, level=1)
+        doc.add_paragraph(text)
+        doc.add_page_break()
+    doc.save(output_path)
+
+
+def measure(function):
+    # tracemalloc видит только память Python: дерево lxml прежнего пути в пик не попадает, он занижен
+    tracemalloc.start()
+    started = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 1024 / 1024
+
+
+def check_equivalence(chapters, output_path):
+    expected = []
+    for _, path in chapters:
+        title, text = read_chapter(path)
+        expected.append(("Heading 1", title))
+        expected.extend(("Normal", line) for line in text.split('\n') if line.strip())
+    actual = [(p.style.name, p.text) for p in Document(output_path).paragraphs[1:] if p.text]
+    return 0 if actual == expected else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chapters", type=int, default=300)
+    parser.add_argument("--paragraphs", type=int, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_docx_") as work_dir:
+        chapters = make_chapters(work_dir, args.chapters, args.paragraphs)
+        assembler = DocxAssembler(os.path.join(work_dir, "docx"))
+        old_path = os.path.join(work_dir, "old.docx")
+        new_path = os.path.join(work_dir, "new.docx")
+
+        old_seconds, old_peak = measure(lambda: old_assembly(chapters, old_path))
+        # Во время перевода фрагменты пишутся по одному, когда глава готова; здесь это время суммарно
+        fragments_seconds, _ = measure(lambda: [assembler.add_chapter(i, *read_chapter(path)) for i, path in chapters])
+        new_seconds, new_peak = measure(lambda: assembler.write(new_path, "Книга", chapters, read_chapter))
+
+        # Правка одной главы: заново оформляется только она
+        index, path = chapters[len(chapters) // 2]
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("\nИсправленный абзац.")
+        os.utime(path, (time.time() + 1, time.time() + 1))
+        rerendered = []
+        fix_seconds, _ = measure(lambda: rerendered.append(assembler.write(new_path, "Книга", chapters, read_chapter)))
+
+        mismatches = check_equivalence(chapters, new_path)
+        print(f"Глав: {args.chapters} по {args.paragraphs} абзацев, расхождений: {mismatches}")
+        print(f"Прежняя сборка: {old_seconds:.2f} с, пик памяти {old_peak:.0f} МБ, {os.path.getsize(old_path) // 1024} КБ")
+        print(f"Фрагменты по ходу перевода: {fragments_seconds:.2f} с суммарно")
+        print(f"Склейка: {new_seconds:.2f} с, пик памяти {new_peak:.1f} МБ, {os.path.getsize(new_path) // 1024} КБ "
+              f"({old_seconds / new_seconds:.1f}x)")
+        print(f"Пересборка после правки одной главы: {fix_seconds:.2f} с, оформлено заново глав: {rerendered[0]}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# benchmarks/bench_html_text.py
+"""
+Сравнение быстрого извлечения текста (lxml) с прежним путем через BeautifulSoup.
+Сначала проверяется, что оба пути дают одинаковый текст и заголовок на наборе образцов
+и на всех главах переданных EPUB, затем замеряется скорость.
+Запуск из корня проекта: python -m benchmarks.bench_html_text [книга.epub ...] [--repeat 20]
+"""
+import argparse
+import sys
+import time
+
+from core.epub_reader import LazyEpub
+from core.html_text import HAVE_LXML, extract_chapter, extract_with_bs4
+
+SAMPLES = [
+    # Обычная глава XHTML с объявлением XML и пространствами имен
+    '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+    '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+    '<head><title>Chapter One</title><link rel="stylesheet" href="s.css"/></head>'
+    '<body><h1 class="c">Chapter <em>One</em></h1><p>It was a dark night.</p><p>She said: “Hello”.</p></body></html>',
+    # Сущности, неразрывные пробелы, вложенная разметка
+    '<html><body><h2>  Part&nbsp;II </h2><p>Tom &amp; Jerry&#8217;s <b>big</b> <i>day</i>&hellip;</p>'
+    '<div><p>Line one<br/>Line two</p></div></body></html>',
+    # Скрипты, стили, шаблоны, руби и комментарии
+    '<html><head><style>p { color: red }</style></head><body><script>var a = 1;</script>'
+    '<p>漢<ruby>字<rt>かんじ</rt><rp>(</rp></ruby></p><!-- note --><template>hidden</template>'
+    '<noscript>noscript text</noscript><h3>Late heading</h3></body></html>',
+    # Без заголовка, списки и таблицы
+    '<html><body><ul><li>First</li><li>Second <span>item</span></li></ul>'
+    '<table><tr><td>A</td><td>B</td></tr></table></body></html>',
+    # Пустой заголовок и пустой документ
+    '<html><body><h1></h1><p>Text after empty heading</p></body></html>',
+    '<html><body>   </body></html>',
+    # Фрагмент без <body>: BeautifulSoup берет текст всего документа
+    '<h2>Dedication</h2><p>For my mother.</p>',
+]
+
+
+def check_equivalence(documents):
+    mismatches = 0
+    for name, content in documents:
+        expected = extract_with_bs4(content)
+        actual = extract_chapter(content)
+        if expected != actual:
+            mismatches += 1
+            print(f"РАСХОЖДЕНИЕ в {name}:\n  bs4:  {expected!r}\n  fast: {actual!r}")
+    return mismatches
+
+
+def measure(function, documents, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for _, content in documents:
+            function(content)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("epubs", nargs="*")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    documents = [(f"образец {n + 1}", sample.encode('utf-8')) for n, sample in enumerate(SAMPLES)]
+    # Синтетическая «толстая» глава, чтобы замер был заметен и без EPUB
+    big_chapter = "<html><body><h1>Omnibus</h1>" + "".join(
+        f"<p>Paragraph {n} with <em>some</em> &amp; <a href='#n{n}'>links</a> and text.</p>" for n in range(5000)
+    ) + "</body></html>"
+    documents.append(("синтетическая глава", big_chapter.encode('utf-8')))
+    for path in args.epubs:
+        with LazyEpub(path) as book:
+            for document in book.documents:
+                documents.append((f"{path}:{document.href}", book.read(document)))
+
+    if not HAVE_LXML:
+        print("lxml не установлен: быстрый путь совпадает с BeautifulSoup, сравнивать нечего.")
+    mismatches = check_equivalence(documents)
+    print(f"Проверено документов: {len(documents)}, расхождений: {mismatches}")
+
+    bs4_seconds = measure(extract_with_bs4, documents, args.repeat)
+    fast_seconds = measure(extract_chapter, documents, args.repeat)
+    print(f"BeautifulSoup: {bs4_seconds * 1000:.1f} мс за проход, "
+          f"быстрый путь: {fast_seconds * 1000:.1f} мс ({bs4_seconds / fast_seconds:.1f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
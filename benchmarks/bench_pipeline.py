@@ -0,0 +1,220 @@
+# benchmarks/bench_pipeline.py
+"""
+Сквозной замер translation_process на синтетических EPUB без обращения к API.
+Модель берется у локального провайдера (benchmarks.fake_gemini); каждый размер книги гоняется
+в отдельном процессе, чтобы пиковая память не смешивалась между прогонами.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_pipeline [--sizes small,medium] [--latency 0.5] [--concurrency 4]
+    python -m benchmarks.bench_pipeline --sizes small --record responses.jsonl --api-key KEY
+    python -m benchmarks.bench_pipeline --sizes small --replay responses.jsonl
+    python -m benchmarks.bench_pipeline --sizes small --context-cache --style-guide-tokens 3000
+    python -m benchmarks.bench_pipeline --sizes medium --straggler-rate 0.05 --request-timeout 3 --stop-after 10
+    python -m benchmarks.bench_pipeline --sizes small --exhausted-models gemini-2.0-flash --fallback-models gemini-1.5-flash
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import tempfile
+import threading
+import time
+
+from ebooklib import epub
+
+SIZES = {
+    # название: (глав, абзацев в главе)
+    "small": (10, 20),
+    "medium": (40, 40),
+    "large": (120, 60),
+}
+WORDS = ("the", "night", "was", "quiet", "and", "she", "walked", "along", "river", "past", "old", "mill",
+         "while", "he", "waited", "for", "news", "from", "capital", "no", "one", "spoke", "Naruto", "shinobi")
+# Без записи и воспроизведения лимиты модели не должны влиять на замер самого конвейера
+UNLIMITED_RPM = 100000
+UNLIMITED_TPM = 10 ** 9
+
+
+def make_epub(path, chapters, paragraphs, seed=0):
+    rng = random.Random(seed)
+    book = epub.EpubBook()
+    book.set_identifier(f"bench-{chapters}-{paragraphs}")
+    book.set_title("Benchmark Book")
+    book.set_language("en")
+    items = []
+    for i in range(chapters):
+        body = "".join(
+            "<p>" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))).capitalize() + ".</p>"
+            for _ in range(paragraphs))
+        item = epub.EpubHtml(title=f"Chapter {i + 1}", file_name=f"chapter_{i:04d}.xhtml", lang="en")
+        item.content = f"<html><head><title>Chapter {i + 1}</title></head><body><h1>Chapter {i + 1}</h1>{body}</body></html>"
+        book.add_item(item)
+        items.append(item)
+    book.toc = items
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ["nav"] + items
+    epub.write_epub(path, book)
+
+
+def run_once(options):
+    """Один прогон в дочернем процессе: возвращает метрики в виде словаря."""
+    from benchmarks import fake_gemini
+    from core.prompts import DEFAULT_PROMPT
+    from core.translator import translation_process
+
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    # ProjectManager и память переводов работают относительно текущей папки
+    os.chdir(work_dir)
+    chapters, paragraphs = SIZES[options["size"]]
+    epub_path = os.path.join(work_dir, f"{options['size']}.epub")
+    make_epub(epub_path, chapters, paragraphs, options["seed"])
+
+    config = fake_gemini.FakeConfig(
+        latency=options["latency"], tokens_per_second=options["tokens_per_second"],
+        exhausted_rate=options["exhausted_rate"], blocked_rate=options["blocked_rate"],
+        truncate_rate=options["truncate_rate"], retry_after=options["retry_after"], seed=options["seed"],
+        straggler_rate=options["straggler_rate"], exhausted_models=options["exhausted_models"],
+        thinking_tokens=options["thinking_tokens"])
+    provider = fake_gemini.install(options["mode"], config, options.get("responses"))
+
+    project_data = {
+        "api_key": options.get("api_key") or "fake-key", "prompt": DEFAULT_PROMPT, "glossary": "Naruto -> Наруто",
+        "model": options["model"], "delay": 0, "use_regex": False, "project_name": "bench",
+        "resume": False, "completed_chapters_list": [], "epub_path": epub_path,
+        "output_path": os.path.join(work_dir, "out.docx"), "concurrency": options["concurrency"],
+        "chunk_tokens": options["chunk_tokens"], "stream": options["stream"],
+        "rpm": options["rpm"], "tpm": options["tpm"], "use_translation_memory": False, "provider": provider,
+        "context_cache": options["context_cache"], "hedge_percentile": options["hedge_percentile"],
+        "request_timeout": options["request_timeout"], "fallback_models": options["fallback_models"],
+    }
+    if options["style_guide_tokens"]:
+        # Длинные инструкции перед стандартным промптом, как у проектов со своим руководством по стилю
+        rng = random.Random(options["seed"])
+        words = options["style_guide_tokens"] * 4 // 6
+        project_data["prompt"] = "Style guide: " + " ".join(rng.choice(WORDS) for _ in range(words)) + ".\n\n" + DEFAULT_PROMPT
+    progress_queue = queue.Queue()
+    stop_event = threading.Event()
+    stopped_at = []
+    if options["stop_after"]:
+        # Остановка посреди прогона: замеряется, как быстро translation_process возвращает управление
+        timer = threading.Timer(options["stop_after"], lambda: (stopped_at.append(time.perf_counter()), stop_event.set()))
+        timer.daemon = True
+        timer.start()
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    translation_process(project_data, progress_queue, stop_event)
+    finished = time.perf_counter()
+    wall = finished - started
+    cpu = time.process_time() - cpu_started
+
+    errors = []
+    prompt_tokens = cached_tokens = hedges = hedge_wins = timeouts = 0
+    models = {}
+    while not progress_queue.empty():
+        kind, data = progress_queue.get()
+        if kind == "error":
+            errors.append(data)
+        elif kind == "metrics":
+            prompt_tokens += data["prompt_tokens"]
+            cached_tokens += data["cached_tokens"]
+            hedges += data["hedged"]
+            hedge_wins += data["hedge_won"]
+            timeouts += data["timeouts"]
+            models[data["model"]] = models.get(data["model"], 0) + 1
+    # ru_maxrss в Linux — килобайты
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    stats = fake_gemini.FakeGenerativeModel.stats.counts if options["mode"] == "fake" else {}
+    return {
+        "size": options["size"], "chapters": chapters, "wall_seconds": round(wall, 3),
+        "chapters_per_minute": round(chapters / wall * 60, 1), "cpu_seconds": round(cpu, 3),
+        "peak_rss_mb": round(peak_rss_mb, 1), "errors": errors, "backend": dict(stats),
+        "prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens, "hedges": hedges, "hedge_wins": hedge_wins,
+        "timeouts": timeouts, "models": models, "stop_seconds": round(finished - stopped_at[0], 3) if stopped_at else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="small,medium", help=f"через запятую из: {', '.join(SIZES)}")
+    parser.add_argument("--model", default="gemini-2.0-flash")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--chunk-tokens", type=int, default=4000)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--latency", type=float, default=0.5, help="задержка до первого токена, сек")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--exhausted-rate", type=float, default=0.0)
+    parser.add_argument("--blocked-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="доля запросов с 10-кратной задержкой")
+    parser.add_argument("--hedge-percentile", type=float, default=None, help="дублировать запросы дольше перцентиля (доля, 0.9)")
+    parser.add_argument("--request-timeout", type=float, default=None, help="срок ответа на запрос, сек")
+    parser.add_argument("--stop-after", type=float, default=None, help="нажать «Стоп» через столько секунд")
+    parser.add_argument("--fallback-models", default="", help="каскад резервных моделей через запятую")
+    parser.add_argument("--exhausted-models", default="", help="модели с исчерпанной квотой, через запятую")
+    parser.add_argument("--thinking-tokens", type=int, default=0,
+                        help="выходных токенов на рассуждение перед ответом (как у моделей 2.5)")
+    parser.add_argument("--rpm", type=int, default=None)
+    parser.add_argument("--tpm", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--context-cache", action="store_true", help="статический префикс через кеш контекста")
+    parser.add_argument("--style-guide-tokens", type=int, default=0, help="добавить к промпту инструкции такого размера")
+    parser.add_argument("--record", metavar="JSONL", help="писать ответы настоящей модели (нужен --api-key)")
+    parser.add_argument("--replay", metavar="JSONL", help="отвечать записанными ответами")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    parser.add_argument("--json", metavar="PATH", help="сохранить результаты в JSON для сравнения прогонов")
+    args = parser.parse_args()
+    if args.hedge_percentile is not None and not 0 < args.hedge_percentile < 1:
+        parser.error("--hedge-percentile — доля между 0 и 1, например 0.9")
+
+    mode = "record" if args.record else "replay" if args.replay else "fake"
+    if mode == "record" and not args.api_key:
+        parser.error("для --record нужен --api-key или GEMINI_API_KEY")
+    real_limits = mode == "record"
+    base_options = {
+        "mode": mode, "responses": os.path.abspath(args.record or args.replay) if mode != "fake" else None,
+        "api_key": args.api_key, "model": args.model, "concurrency": args.concurrency,
+        "chunk_tokens": args.chunk_tokens, "stream": args.stream, "latency": args.latency,
+        "tokens_per_second": args.tokens_per_second, "exhausted_rate": args.exhausted_rate,
+        "blocked_rate": args.blocked_rate, "truncate_rate": args.truncate_rate, "retry_after": args.retry_after,
+        "rpm": args.rpm or (None if real_limits else UNLIMITED_RPM),
+        "tpm": args.tpm or (None if real_limits else UNLIMITED_TPM), "seed": args.seed,
+        "context_cache": args.context_cache, "style_guide_tokens": args.style_guide_tokens,
+        "straggler_rate": args.straggler_rate, "hedge_percentile": args.hedge_percentile,
+        "request_timeout": args.request_timeout, "stop_after": args.stop_after,
+        "fallback_models": [name for name in args.fallback_models.split(",") if name],
+        "exhausted_models": [name for name in args.exhausted_models.split(",") if name],
+        "thinking_tokens": args.thinking_tokens,
+    }
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for size in args.sizes.split(","):
+        with context.Pool(1) as pool:
+            result = pool.apply(run_once, (dict(base_options, size=size.strip()),))
+        results.append(result)
+        print(f"{result['size']:>7}: {result['chapters']} глав за {result['wall_seconds']:.2f} с "
+              f"({result['chapters_per_minute']:.0f} глав/мин), CPU {result['cpu_seconds']:.2f} с, "
+              f"пик RSS {result['peak_rss_mb']:.0f} МБ, ошибок {len(result['errors'])}, "
+              f"входных токенов {result['prompt_tokens']} (из кеша {result['cached_tokens']})"
+              + (f", дублей {result['hedges']} (выиграли {result['hedge_wins']})" if result["hedges"] else "")
+              + (f", без ответа к сроку {result['timeouts']}" if result["timeouts"] else "")
+              + (f", ответы по моделям {result['models']}" if base_options["fallback_models"] else "")
+              + (f", остановка за {result['stop_seconds']:.2f} с" if result["stop_seconds"] is not None else "")
+              + (f", модель: {result['backend']}" if result["backend"] else ""))
+        for error in result["errors"]:
+            print(error)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"options": base_options | {"api_key": None}, "results": results}, f,
+                      indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+# benchmarks/fake_gemini.py
+"""
+Локальные провайдеры модели (core.providers) для замеров без расхода квоты.
+
+FakeGenerativeModel отвечает «переводом» текста из промпта с настраиваемой задержкой,
+скоростью выдачи токенов, ошибками ResourceExhausted, блокировками и обрезанными ответами.
+RecordingModel записывает ответы настоящей модели в JSONL, ReplayModel проигрывает их
+по хешу промпта — так реальные ответы можно прогонять через конвейер сколько угодно раз.
+LocalCachedModel заменяет кеш контекста: префикс хранится в памяти и подставляется перед запросом.
+"""
+import enum
+import hashlib
+import json
+import random
+import threading
+import time
+
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
+
+from core.providers import GeminiProvider, register_provider
+from core.rate_limiter import estimate_tokens
+
+# Промпт по умолчанию заканчивается разделителем, после которого идет текст главы
+TEXT_SEPARATOR = "---\n"
+STREAM_CHUNK_CHARS = 400
+
+
+class FinishReason(enum.IntEnum):
+    # Те же номера, что у google.ai.generativelanguage Candidate.FinishReason
+    STOP = 1
+    MAX_TOKENS = 2
+    SAFETY = 3
+
+
+class BlockReason(enum.IntEnum):
+    SAFETY = 1
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens, output_tokens, cached_tokens=0):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+        self.cached_content_token_count = cached_tokens
+
+
+class FakeCandidate:
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+
+
+class FakePromptFeedback:
+    def __init__(self, block_reason=None):
+        self.block_reason = block_reason
+
+
+class FakeResponse:
+    """Повторяет поведение ответа SDK: у заблокированного ответа .text бросает ValueError."""
+
+    def __init__(self, text, finish_reason=FinishReason.STOP, block_reason=None, usage=None):
+        self._text = text
+        self.candidates = [] if block_reason else [FakeCandidate(finish_reason)]
+        self.prompt_feedback = FakePromptFeedback(block_reason)
+        self.usage_metadata = usage
+
+    @property
+    def text(self):
+        if self.prompt_feedback.block_reason:
+            raise ValueError("The response was blocked.")
+        if not self._text:
+            raise ValueError("The response.text quick accessor requires a valid Part, but none were returned.")
+        return self._text
+
+
+class FakeStream:
+    def __init__(self, chunks, final):
+        self._chunks = chunks
+        self._final = final
+        self.candidates = final.candidates
+        self.prompt_feedback = final.prompt_feedback
+        self.usage_metadata = final.usage_metadata
+
+    def __iter__(self):
+        for delay, text in self._chunks:
+            time.sleep(delay)
+            yield FakeResponse(text, usage=self.usage_metadata)
+
+    @property
+    def text(self):
+        return self._final.text
+
+
+class FakeConfig:
+    """
+    latency — задержка до первого токена, сек; tokens_per_second — скорость выдачи ответа (0 — мгновенно);
+    exhausted_rate, blocked_rate, truncate_rate — доля запросов с ошибкой квоты, блокировкой и обрезкой;
+    retry_after — подсказка ожидания в тексте ResourceExhausted, сек.;
+    straggler_rate — доля запросов, задержка которых в straggler_factor раз больше обычной;
+    exhausted_models — модели, квота которых исчерпана на весь прогон (для каскада резервных моделей);
+    thinking_tokens — выходных токенов на «рассуждение» перед ответом, они расходуют max_output_tokens, как у 2.5.
+    """
+
+    def __init__(self, latency=0.5, tokens_per_second=200.0, exhausted_rate=0.0, blocked_rate=0.0,
+                 truncate_rate=0.0, retry_after=1.0, seed=0, straggler_rate=0.0, straggler_factor=10.0,
+                 exhausted_models=(), thinking_tokens=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.exhausted_rate = exhausted_rate
+        self.blocked_rate = blocked_rate
+        self.truncate_rate = truncate_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.straggler_rate = straggler_rate
+        self.straggler_factor = straggler_factor
+        self.exhausted_models = set(exhausted_models)
+        self.thinking_tokens = thinking_tokens
+
+
+class FakeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "exhausted": 0, "blocked": 0, "truncated": 0, "stragglers": 0,
+                       "deadline_exceeded": 0, "empty": 0}
+
+    def add(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+
+def fake_translate(prompt):
+    """«Перевод»: абзацы текста главы с пометкой, маркеры пакета не трогаются."""
+    source = prompt.rsplit(TEXT_SEPARATOR, 1)[-1]
+    lines = []
+    for line in source.splitlines():
+        lines.append(line if not line.strip() or line.startswith("[[[SEGMENT") else f"[RU] {line}")
+    return "\n".join(lines)
+
+
+class FakeGenerativeModel:
+    config = FakeConfig()
+    stats = FakeStats()
+    _rng = random.Random(0)
+    _rng_lock = threading.Lock()
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+
+    @classmethod
+    def _roll(cls, rate):
+        with cls._rng_lock:
+            return rate > 0 and cls._rng.random() < rate
+
+    def generate_content(self, prompt, safety_settings=None, stream=False, **kwargs):
+        config = self.config
+        self.stats.add("requests")
+        latency = config.latency
+        if self._roll(config.straggler_rate):
+            self.stats.add("stragglers")
+            latency *= config.straggler_factor
+        # Как gRPC: срок из request_options обрывает вызов ошибкой DeadlineExceeded
+        timeout = (kwargs.get("request_options") or {}).get("timeout")
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            self.stats.add("deadline_exceeded")
+            raise DeadlineExceeded("504 Deadline Exceeded")
+        time.sleep(latency)
+        if self.model_name in config.exhausted_models or self._roll(config.exhausted_rate):
+            self.stats.add("exhausted")
+            raise ResourceExhausted(f"429 Resource has been exhausted. Please retry in {config.retry_after}s.")
+
+        prompt_tokens = estimate_tokens(prompt)
+        if self._roll(config.blocked_rate):
+            self.stats.add("blocked")
+            blocked = FakeResponse("", block_reason=BlockReason.SAFETY, usage=FakeUsage(prompt_tokens, 0))
+            return FakeStream([], blocked) if stream else blocked
+
+        text = fake_translate(prompt)
+        finish_reason = FinishReason.STOP
+        if self._roll(config.truncate_rate):
+            self.stats.add("truncated")
+            text = text[:max(1, len(text) // 2)]
+            finish_reason = FinishReason.MAX_TOKENS
+        # Как у API: ответ длиннее max_output_tokens обрывается с причиной MAX_TOKENS;
+        # рассуждение расходует предел первым, и на текст может не остаться ничего
+        limit = (kwargs.get("generation_config") or {}).get("max_output_tokens")
+        if limit and config.thinking_tokens >= limit:
+            self.stats.add("empty")
+            text = ""
+            finish_reason = FinishReason.MAX_TOKENS
+        elif limit and estimate_tokens(text) > limit - config.thinking_tokens:
+            self.stats.add("truncated")
+            text = text[:len(text) * (limit - config.thinking_tokens) // estimate_tokens(text)]
+            finish_reason = FinishReason.MAX_TOKENS
+        usage = FakeUsage(prompt_tokens, estimate_tokens(text) + config.thinking_tokens)
+        response = FakeResponse(text, finish_reason, usage=usage)
+
+        seconds_per_char = 0.0
+        if config.tokens_per_second > 0:
+            seconds_per_char = usage.candidates_token_count / config.tokens_per_second / max(len(text), 1)
+        if not stream:
+            time.sleep(seconds_per_char * len(text))
+            return response
+        chunks = [(seconds_per_char * len(text[i:i + STREAM_CHUNK_CHARS]), text[i:i + STREAM_CHUNK_CHARS])
+                  for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        return FakeStream(chunks, response)
+
+
+def prompt_hash(model_name, prompt):
+    return hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+class RecordingModel:
+    """Настоящая модель, ответы которой дописываются в JSONL для последующего воспроизведения."""
+
+    path = None
+    _lock = threading.Lock()
+
+    def __init__(self, model, model_name):
+        self._model = model
+        self.model_name = model_name
+
+    def _record(self, prompt, text, response):
+        finish_reason = response.candidates[0].finish_reason if response.candidates else None
+        block_reason = response.prompt_feedback.block_reason if response.prompt_feedback else None
+        usage = getattr(response, "usage_metadata", None)
+        entry = {
+            "hash": prompt_hash(self.model_name, prompt),
+            "text": text,
+            "finish_reason": int(finish_reason) if finish_reason else int(FinishReason.STOP),
+            "block_reason": int(block_reason) if block_reason else 0,
+            "prompt_tokens": getattr(usage, "prompt_token_count", 0) if usage else 0,
+            "output_tokens": getattr(usage, "candidates_token_count", 0) if usage else 0,
+        }
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def generate_content(self, prompt, safety_settings=None, stream=False, **kwargs):
+        response = self._model.generate_content(prompt, safety_settings=safety_settings, stream=stream, **kwargs)
+        if not stream:
+            try:
+                text = response.text
+            except ValueError:
+                text = ""
+            self._record(prompt, text, response)
+            return response
+        return _RecordingStream(self, prompt, response)
+
+
+class _RecordingStream:
+    def __init__(self, model, prompt, response):
+        self._model = model
+        self._prompt = prompt
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def __iter__(self):
+        parts = []
+        for chunk in self._response:
+            try:
+                parts.append(chunk.text)
+            except ValueError:
+                pass
+            yield chunk
+        self._model._record(self._prompt, "".join(parts), self._response)
+
+
+class ReplayModel:
+    """Отвечает записанными ответами; промпта нет в записи — ошибка, чтобы замер не шел вслепую."""
+
+    responses = {}
+    latency = 0.0
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+
+    @classmethod
+    def load(cls, path):
+        cls.responses = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    cls.responses[entry["hash"]] = entry
+
+    def generate_content(self, prompt, safety_settings=None, stream=False, **kwargs):
+        entry = self.responses.get(prompt_hash(self.model_name, prompt))
+        if entry is None:
+            raise KeyError("Ответ на этот промпт не записан; перезапишите сессию с --record.")
+        time.sleep(self.latency)
+        response = FakeResponse(
+            entry["text"], FinishReason(entry["finish_reason"]),
+            block_reason=BlockReason(entry["block_reason"]) if entry["block_reason"] else None,
+            usage=FakeUsage(entry["prompt_tokens"], entry["output_tokens"]),
+        )
+        if not stream:
+            return response
+        text = entry["text"]
+        chunks = [(0.0, text[i:i + STREAM_CHUNK_CHARS]) for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        return FakeStream(chunks, response)
+
+
+class LocalCachedModel:
+    """
+    Замена кеша контекста: модель получает префикс и запрос одним промптом, как без кеша,
+    а в usage_metadata токены префикса отмечаются как взятые из кеша.
+    """
+
+    def __init__(self, model, prefix):
+        self._model = model
+        self.prefix = prefix
+        self.cached_tokens = estimate_tokens(prefix)
+
+    def generate_content(self, prompt, safety_settings=None, stream=False, **kwargs):
+        response = self._model.generate_content(self.prefix + prompt, safety_settings=safety_settings,
+                                                stream=stream, **kwargs)
+        if response.usage_metadata is not None:
+            response.usage_metadata.cached_content_token_count = self.cached_tokens
+        return response
+
+
+class LocalProvider:
+    """Провайдер для core.providers: отдает локальные модели вместо клиентов Gemini."""
+
+    def __init__(self, model_class):
+        self.model_class = model_class
+        self._models = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, model_name):
+        with self._lock:
+            if model_name not in self._models:
+                self._models[model_name] = self.model_class(model_name)
+            return self._models[model_name]
+
+    def create_cached_model(self, model_name, prefix, ttl_seconds):
+        with self._lock:
+            name = f"cachedContents/local-{len(self._caches) + 1}"
+            self._caches[name] = prefix
+        return LocalCachedModel(self.get_model(model_name), prefix), name
+
+    def delete_cached_content(self, name):
+        with self._lock:
+            del self._caches[name]
+
+    def list_models(self):
+        return sorted(self._models)
+
+
+class RecordingProvider:
+    """Настоящий провайдер Gemini, модели которого записывают ответы."""
+
+    def __init__(self, api_key):
+        self._provider = GeminiProvider(api_key)
+
+    def get_model(self, model_name):
+        return RecordingModel(self._provider.get_model(model_name), model_name)
+
+    def list_models(self):
+        return self._provider.list_models()
+
+
+def install(mode="fake", config=None, path=None):
+    """
+    Регистрирует провайдер с именем mode ("fake", "record" или "replay") и возвращает это имя:
+    его нужно передать в project_data["provider"].
+    """
+    if mode == "fake":
+        FakeGenerativeModel.config = config or FakeConfig()
+        FakeGenerativeModel.stats = FakeStats()
+        FakeGenerativeModel._rng = random.Random(FakeGenerativeModel.config.seed)
+        register_provider(mode, lambda api_key: LocalProvider(FakeGenerativeModel))
+    elif mode == "record":
+        RecordingModel.path = path
+        register_provider(mode, RecordingProvider)
+    elif mode == "replay":
+        ReplayModel.load(path)
+        ReplayModel.latency = config.latency if config else 0.0
+        register_provider(mode, lambda api_key: LocalProvider(ReplayModel))
+    else:
+        raise ValueError(f"Неизвестный режим: {mode}")
+    return mode
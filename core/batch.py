@@ -0,0 +1,141 @@
+# core/batch.py
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .dedup import DuplicateIndex
+from .estimator import announce_estimate
+from .project_manager import ProjectManager
+from .translator import translation_process
+
+DEFAULT_PARALLEL_BOOKS = 2
+
+
+def book_project_name(base_project_name, epub_path):
+    """Отдельный проект на каждую книгу пакета: свои temp-файлы и свой журнал прогресса."""
+    base = os.path.splitext(os.path.basename(epub_path))[0]
+    slug = re.sub(r"[^\w\-]+", "_", base).strip("_")[:40] or "book"
+    digest = hashlib.sha1(os.path.abspath(epub_path).encode('utf-8')).hexdigest()[:8]
+    return f"{base_project_name}__{slug}_{digest}"
+
+
+class BookProgressQueue:
+    """
+    Обертка над общей очередью прогресса для одной книги пакета.
+    Подписывает сообщения названием книги, а прогресс глав сводит в общий по всем книгам.
+    """
+
+    def __init__(self, batch, book_index, label):
+        self.batch = batch
+        self.book_index = book_index
+        self.label = label
+
+    def put(self, message):
+        kind, data = message
+        if kind == "log":
+            self.batch.progress_queue.put(("log", f"[{self.label}] {data}"))
+        elif kind == "progress":
+            self.batch.update_book_progress(self.book_index, *data)
+        elif kind == "done":
+            self.batch.progress_queue.put(("log", f"[{self.label}] ✅ Книга переведена."))
+        elif kind == "error":
+            self.batch.failed.add(self.book_index)
+            self.batch.progress_queue.put(("error", f"[{self.label}] {data}"))
+        elif kind == "finish_signal":
+            # Завершение всего пакета сообщает планировщик, а не отдельная книга
+            pass
+        else:
+            self.batch.progress_queue.put(message)
+
+
+class BatchScheduler:
+    """
+    Переводит несколько книг одновременно в пуле потоков.
+    Ограничители квоты общие для процесса (по ключу и модели), поэтому все книги
+    укладываются в один лимит RPM/TPM.
+    """
+
+    def __init__(self, base_project_data, files, progress_queue, stop_event):
+        self.base_project_data = base_project_data
+        self.files = files
+        self.progress_queue = progress_queue
+        self.stop_event = stop_event
+        self.parallel_books = max(1, int(base_project_data.get("parallel_books", DEFAULT_PARALLEL_BOOKS)))
+        self._lock = threading.Lock()
+        self._book_progress = {}
+        self._books_done = 0
+        # Номера книг, перевод которых завершился ошибкой
+        self.failed = set()
+        # Общие для серии документы (копирайт, «Другие книги автора») переводятся один раз на пакет
+        self.duplicates = None
+        if base_project_data.get("deduplicate", True):
+            self.duplicates = DuplicateIndex(base_project_data.get("near_duplicates", False))
+
+    def update_book_progress(self, book_index, current, total):
+        with self._lock:
+            self._book_progress[book_index] = (current, total)
+            done = sum(current for current, _ in self._book_progress.values())
+            total_all = sum(total for _, total in self._book_progress.values())
+        self.progress_queue.put(("book_progress", (book_index, current, total)))
+        self.progress_queue.put(("progress", (done, total_all)))
+
+    def _book_project_data(self, file_info):
+        pm = ProjectManager()
+        project_name = book_project_name(self.base_project_data["project_name"], file_info["input"])
+        try:
+            completed = pm.progress_store(project_name).completed()
+        finally:
+            pm.close()
+
+        project_data = dict(self.base_project_data)
+        project_data.update({
+            "project_name": project_name,
+            "epub_path": file_info["input"],
+            "output_path": file_info["output"],
+            "resume": bool(completed),
+            "completed_chapters_list": completed,
+        })
+        # Общие пути отчетов превращаются в файлы на каждую книгу, иначе книги затрут отчеты друг друга
+        for key in ("report_path", "prometheus_path"):
+            if project_data.get(key):
+                root, ext = os.path.splitext(project_data[key])
+                project_data[key] = f"{root}_{project_name}{ext}"
+        return project_data
+
+    def _run_book(self, book_index, file_info):
+        if self.stop_event.is_set():
+            return
+        label = os.path.basename(file_info["input"])
+        project_data = self._book_project_data(file_info)
+        self.progress_queue.put(("log", f"--- Книга {book_index + 1}/{len(self.files)}: {label} ---"))
+        translation_process(project_data, BookProgressQueue(self, book_index, label), self.stop_event,
+                            self.duplicates)
+
+        with self._lock:
+            self._books_done += 1
+            books_done = self._books_done
+        self.progress_queue.put(("log", f"Готово книг: {books_done}/{len(self.files)}"))
+
+    def estimate(self, exact=False):
+        """Сухой прогон пакета: оценка по каждой книге без перевода, книги идут по очереди."""
+        for book_index, file_info in enumerate(self.files):
+            if self.stop_event.is_set():
+                break
+            label = os.path.basename(file_info["input"])
+            announce_estimate(self._book_project_data(file_info), BookProgressQueue(self, book_index, label),
+                              exact=exact, is_halted=self.stop_event.is_set)
+
+    def run(self):
+        total_books = len(self.files)
+        self.progress_queue.put(("log", f"Начинаем пакетную обработку. Всего книг: {total_books}, "
+                                        f"одновременно: {min(self.parallel_books, total_books)}"))
+        with ThreadPoolExecutor(max_workers=self.parallel_books) as executor:
+            for future in [executor.submit(self._run_book, i, file_info) for i, file_info in enumerate(self.files)]:
+                future.result()
+
+        if self.stop_event.is_set():
+            self.progress_queue.put(("log", "Пакетная обработка отменена пользователем."))
+        else:
+            self.progress_queue.put(("log", "🎉 Вся пакетная обработка завершена!"))
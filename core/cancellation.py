@@ -0,0 +1,61 @@
+# core/cancellation.py
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+# Срок ответа на один запрос к API: длинная глава с полным выводом укладывается с запасом
+DEFAULT_REQUEST_TIMEOUT = 300
+# Как часто ожидание ответа проверяет, не нажата ли остановка
+HALT_POLL_INTERVAL = 0.5
+
+
+class RequestTimeout(Exception):
+    """Ответ не пришел к сроку; попытка повторяется как при любой временной ошибке API."""
+
+
+class RequestCancelled(Exception):
+    """Работа остановлена, пока запрос был в полете."""
+
+
+def call_async(function):
+    """
+    Запускает вызов API в отдельном потоке и возвращает Future.
+    Поток фоновый: проигравший или зависший вызов не держит завершение программы.
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(function())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def wait_first(futures, is_halted, deadline, timeout=None):
+    """
+    Ждет, пока завершится хотя бы один из вызовов, и возвращает множество завершившихся.
+    Остановка проверяется каждые HALT_POLL_INTERVAL секунд (RequestCancelled),
+    по сроку deadline (time.monotonic) бросается RequestTimeout.
+    С timeout по его истечении возвращается пустое множество — так ждется порог дублирования.
+    """
+    until = deadline if timeout is None else min(deadline, time.monotonic() + timeout)
+    while True:
+        if is_halted():
+            raise RequestCancelled()
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            if until >= deadline:
+                raise RequestTimeout()
+            return set()
+        done, _ = wait(futures, timeout=min(remaining, HALT_POLL_INTERVAL), return_when=FIRST_COMPLETED)
+        if done:
+            return done
+
+
+def await_result(future, is_halted, deadline):
+    """Результат вызова из call_async с проверкой остановки и срока (см. wait_first)."""
+    wait_first([future], is_halted, deadline)
+    return future.result()
@@ -0,0 +1,58 @@
+# core/checkpoint.py
+import os
+
+
+def split_for_resume(source_text, translated_text):
+    """
+    Сопоставляет уже переведенные абзацы с исходником по их количеству.
+    Возвращает (перевод полных абзацев, непереведенный хвост исходника).
+    Последняя строка перевода считается оборванной и отбрасывается.
+    Если сопоставить не удалось, возвращает ("", source_text) — глава переводится целиком.
+    """
+    complete, _, _ = translated_text.rpartition('\n')
+    done_paragraphs = [line for line in complete.split('\n') if line.strip()]
+    source_paragraphs = [line for line in source_text.split('\n') if line.strip()]
+    if not done_paragraphs or len(done_paragraphs) >= len(source_paragraphs):
+        return "", source_text
+    return '\n'.join(done_paragraphs), '\n'.join(source_paragraphs[len(done_paragraphs):])
+
+
+class StreamCheckpoint:
+    """
+    Файл с частичным ответом потокового запроса.
+    Каждый фрагмент дописывается сразу, поэтому сбой или отмена не теряют уже полученный текст.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.prefix = ""
+        self._file = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return ""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def begin(self, prefix=""):
+        """Начинает попытку: в файле остается только подтвержденный префикс."""
+        self.close()
+        self.prefix = prefix
+        self._file = open(self.path, 'w', encoding='utf-8')
+        if prefix:
+            self._file.write(prefix + '\n')
+        self._file.flush()
+
+    def write(self, text):
+        self._file.write(text)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,139 @@
+# core/chunker.py
+import re
+
+from .rate_limiter import estimate_tokens
+
+# Бюджет исходного текста на один запрос (в токенах) по умолчанию
+DEFAULT_CHUNK_TOKENS = 4000
+# Главы меньше этой доли бюджета считаются мелкими и склеиваются с соседними
+SMALL_CHAPTER_FRACTION = 0.25
+
+SEGMENT_MARKER = "[[[SEGMENT {index:04d}]]]"
+SEGMENT_MARKER_RE = re.compile(r"\[\[\[SEGMENT (\d{4})\]\]\]")
+
+PACK_INSTRUCTIONS = (
+    "\nThe text consists of several independent sections. Each section starts with a marker line "
+    "like [[[SEGMENT 0001]]]. Copy every marker line unchanged on its own line and translate "
+    "only the text between the markers.\n"
+)
+
+
+class Chapter:
+    def __init__(self, index, text, title):
+        self.index = index
+        self.text = text
+        self.title = title
+        self.tokens = estimate_tokens(text)
+
+
+class Segment:
+    """Кусок текста одного запроса: целая глава или одна из частей длинной главы."""
+
+    def __init__(self, chapter, text, part_no=0, part_count=1):
+        self.chapter = chapter
+        self.text = text
+        self.part_no = part_no
+        self.part_count = part_count
+
+    @property
+    def is_part(self):
+        return self.part_count > 1
+
+
+class TranslationRequest:
+    def __init__(self, segments):
+        self.segments = segments
+
+    @property
+    def is_packed(self):
+        return len(self.segments) > 1
+
+    @property
+    def label(self):
+        first = self.segments[0]
+        if self.is_packed:
+            return f"{first.chapter.index + 1}–{self.segments[-1].chapter.index + 1}"
+        if first.is_part:
+            return f"{first.chapter.index + 1} (часть {first.part_no + 1}/{first.part_count})"
+        return f"{first.chapter.index + 1}"
+
+    def source_text(self):
+        if not self.is_packed:
+            return self.segments[0].text
+        blocks = []
+        for n, segment in enumerate(self.segments):
+            blocks.append(SEGMENT_MARKER.format(index=n + 1))
+            blocks.append(segment.text)
+        return "\n".join(blocks)
+
+    def unpack(self, translated_text):
+        """
+        Разбирает ответ на пакетный запрос по маркерам.
+        Возвращает список переводов в порядке сегментов или None, если маркеры потеряны.
+        """
+        if not self.is_packed:
+            return [translated_text]
+        matches = list(SEGMENT_MARKER_RE.finditer(translated_text))
+        if [int(m.group(1)) for m in matches] != list(range(1, len(self.segments) + 1)):
+            return None
+        results = []
+        for n, match in enumerate(matches):
+            end = matches[n + 1].start() if n + 1 < len(matches) else len(translated_text)
+            results.append(translated_text[match.end():end].strip())
+        if not all(results):
+            return None
+        return results
+
+
+def split_text(text, budget):
+    """Делит текст на части не длиннее бюджета по границам абзацев (строк)."""
+    parts = []
+    current, current_tokens = [], 0
+    for paragraph in text.split('\n'):
+        tokens = estimate_tokens(paragraph)
+        if current and current_tokens + tokens > budget:
+            parts.append('\n'.join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+    if current:
+        parts.append('\n'.join(current))
+    return parts
+
+
+def plan_requests(chapters, budget=DEFAULT_CHUNK_TOKENS):
+    """
+    Превращает поток глав в поток запросов.
+    Длинные главы делятся по абзацам, мелкие соседние главы склеиваются в один запрос.
+    При budget <= 0 каждая глава идет отдельным запросом, как раньше.
+    """
+    if budget <= 0:
+        for chapter in chapters:
+            yield TranslationRequest([Segment(chapter, chapter.text)])
+        return
+
+    small_limit = budget * SMALL_CHAPTER_FRACTION
+    pack, pack_tokens = [], 0
+    for chapter in chapters:
+        if chapter.tokens <= small_limit:
+            if pack and pack_tokens + chapter.tokens > budget:
+                yield TranslationRequest(pack)
+                pack, pack_tokens = [], 0
+            pack.append(Segment(chapter, chapter.text))
+            pack_tokens += chapter.tokens
+            continue
+
+        if pack:
+            yield TranslationRequest(pack)
+            pack, pack_tokens = [], 0
+
+        if chapter.tokens <= budget:
+            yield TranslationRequest([Segment(chapter, chapter.text)])
+            continue
+
+        parts = split_text(chapter.text, budget)
+        for part_no, part_text in enumerate(parts):
+            yield TranslationRequest([Segment(chapter, part_text, part_no, len(parts))])
+
+    if pack:
+        yield TranslationRequest(pack)
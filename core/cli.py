@@ -0,0 +1,331 @@
+# core/cli.py
+"""
+Консольный запуск перевода без графического интерфейса (серверы сборки, контейнеры).
+
+    python -m core.cli --project МойПроект --input book.epub --output book.docx
+    python -m core.cli --config settings.json --input books/ --output out/
+    python -m core.cli --config settings.json --watch inbox/ --output out/
+    python -m core.cli --config settings.json --input books/ --dry-run [--exact-count]
+
+События идут в stdout строками JSON: {"event": "log", "data": "...", "time": ...}.
+Модуль не импортирует tkinter и customtkinter.
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+
+from .api_key_manager import ApiKeyManager
+from .batch import BatchScheduler, book_project_name
+from .cancellation import DEFAULT_REQUEST_TIMEOUT
+from .estimator import announce_estimate
+from .project_manager import ProjectManager
+from .prompts import DEFAULT_PROMPT
+from .translator import translation_process
+
+API_KEY_ENV = "GEMINI_API_KEY"
+CLI_PROJECT_PREFIX = "cli"
+DEFAULT_POLL_SECONDS = 10
+DONE_DIR = "done"
+FAILED_DIR = "failed"
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_STOPPED = 130
+
+DEFAULT_SETTINGS = {
+    "prompt": DEFAULT_PROMPT,
+    "glossary": "",
+    "model": "gemini-1.5-flash-latest",
+    "delay": 2.0,
+    "concurrency": 1,
+    "rpm": None,
+    "tpm": None,
+    "request_timeout": DEFAULT_REQUEST_TIMEOUT,
+    "use_regex": False,
+    "use_key_pool": False,
+    "use_translation_memory": True,
+    "stream": False,
+    "context_cache": False,
+    "deduplicate": True,
+    "near_duplicates": False,
+    "skip_boilerplate": False,
+}
+
+
+class JsonLinesQueue:
+    """Вместо очереди GUI: каждое сообщение translation_process сразу печатается строкой JSON."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    def put(self, message):
+        kind, data = message
+        if kind == "error":
+            self.errors += 1
+        line = json.dumps({"event": kind, "data": data, "time": round(time.time(), 3)}, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def output_path_for(epub_path, output_dir):
+    base = os.path.splitext(os.path.basename(epub_path))[0]
+    return os.path.join(output_dir, f"{base}_translated.docx")
+
+
+def load_settings(args, pm):
+    settings = dict(DEFAULT_SETTINGS)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    if args.project:
+        settings.update(pm.load(args.project))
+    for name in ("model", "concurrency", "parallel_books", "chunk_tokens", "rpm", "tpm",
+                 "request_timeout", "hedge_percentile", "hedge_max_fraction"):
+        value = getattr(args, name)
+        if value is not None:
+            settings[name] = value
+    if args.key_pool:
+        settings["use_key_pool"] = True
+    if args.fallback_models:
+        settings["fallback_models"] = [name.strip() for name in args.fallback_models.split(",") if name.strip()]
+    if args.rerun_fallback:
+        settings["rerun_fallback"] = True
+    if args.stream:
+        settings["stream"] = True
+    if args.context_cache:
+        settings["context_cache"] = True
+    if args.no_dedup:
+        settings["deduplicate"] = False
+    if args.near_duplicates:
+        settings["near_duplicates"] = True
+    if args.skip_boilerplate:
+        settings["skip_boilerplate"] = True
+    if args.skip_patterns:
+        with open(args.skip_patterns, 'r', encoding='utf-8') as f:
+            settings["skip_patterns"] = f.read()
+    if args.report:
+        settings["report_path"] = args.report
+    if args.prometheus_textfile:
+        settings["prometheus_path"] = args.prometheus_textfile
+    return settings
+
+
+def resolve_api_keys(args, settings):
+    """Ключ из аргумента, переменной окружения, настроек или хранилища ключей GUI (api_keys.json)."""
+    key_manager = ApiKeyManager()
+    api_key = args.api_key or os.environ.get(API_KEY_ENV) or settings.get("api_key")
+    key_name = args.key_name or settings.get("api_key_name")
+    if not api_key and key_name:
+        api_key = key_manager.get_key_value(key_name)
+    api_keys = None
+    if settings.get("use_key_pool"):
+        api_keys = {name: key_manager.get_key_value(name) for name in key_manager.get_key_names()} or None
+    if not api_key and api_keys:
+        api_key = next(iter(api_keys.values()))
+    return api_key, api_keys
+
+
+def build_project_data(settings, api_key, api_keys, project_name, pm):
+    # Журнал нужен только для списка готовых глав: дальше его открывает сам translation_process
+    try:
+        completed = pm.progress_store(project_name).completed()
+    finally:
+        pm.close()
+    project_data = {key: value for key, value in settings.items() if key not in ("completed_chapters", "api_key_name")}
+    project_data.update({
+        "api_key": api_key, "api_keys": api_keys, "project_name": project_name,
+        "resume": bool(completed), "completed_chapters_list": completed,
+    })
+    return project_data
+
+
+def run_file(base_data, epub_path, output_path, project_name, events, stop_event, pm):
+    project_data = build_project_data(base_data["settings"], base_data["api_key"], base_data["api_keys"],
+                                      project_name, pm)
+    project_data["epub_path"] = epub_path
+    project_data["output_path"] = output_path
+    if base_data.get("dry_run"):
+        announce_estimate(project_data, events, exact=base_data["exact_count"], is_halted=stop_event.is_set)
+        return
+    translation_process(project_data, events, stop_event)
+
+
+def run_batch(base_data, files, events, stop_event, pm):
+    project_data = build_project_data(base_data["settings"], base_data["api_key"], base_data["api_keys"],
+                                      base_data["project_name"], pm)
+    scheduler = BatchScheduler(project_data, files, events, stop_event)
+    if base_data.get("dry_run"):
+        scheduler.estimate(base_data["exact_count"])
+    else:
+        scheduler.run()
+    return scheduler
+
+
+def watch_inbox(base_data, inbox, output_dir, poll_seconds, events, stop_event, pm):
+    """
+    Следит за папкой: новая книга берется в работу, когда ее размер и время изменения
+    не менялись между двумя опросами (файл докопирован). После перевода книга
+    переносится в inbox/done, при ошибке — в inbox/failed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    seen = {}
+    events.put(("log", f"Ожидаем книги в папке {inbox} (опрос раз в {poll_seconds} сек.)"))
+    while not stop_event.is_set():
+        ready = []
+        current = {}
+        for filename in sorted(os.listdir(inbox)):
+            path = os.path.join(inbox, filename)
+            if not filename.lower().endswith(".epub") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            current[path] = (stat.st_size, stat.st_mtime)
+            if seen.get(path) == current[path]:
+                ready.append({"input": path, "output": output_path_for(path, output_dir)})
+        seen = current
+
+        if ready:
+            scheduler = run_batch(base_data, ready, events, stop_event, pm)
+            if stop_event.is_set():
+                break
+            for book_index, file_info in enumerate(ready):
+                target_dir = os.path.join(inbox, FAILED_DIR if book_index in scheduler.failed else DONE_DIR)
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.move(file_info["input"], os.path.join(target_dir, os.path.basename(file_info["input"])))
+                seen.pop(file_info["input"], None)
+                events.put(("book_finished", {"input": file_info["input"], "output": file_info["output"],
+                                              "status": "failed" if book_index in scheduler.failed else "done"}))
+            continue
+        stop_event.wait(poll_seconds)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m core.cli", description="Перевод EPUB без графического интерфейса.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--project", help="имя сохраненного проекта (projects/<имя>.json)")
+    source.add_argument("--config", help="JSON с настройками в формате файла проекта")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--input", help="EPUB-файл или папка с EPUB")
+    target.add_argument("--watch", metavar="INBOX", help="папка, за которой следить")
+    parser.add_argument("--output", help="DOCX-файл или папка для результатов")
+    parser.add_argument("--api-key", help=f"API-ключ (по умолчанию ${API_KEY_ENV})")
+    parser.add_argument("--key-name", help="имя ключа из api_keys.json")
+    parser.add_argument("--key-pool", action="store_true", help="распределять запросы по всем ключам из api_keys.json")
+    parser.add_argument("--model")
+    parser.add_argument("--fallback-models", metavar="MODELS",
+                        help="резервные модели через запятую на случай исчерпания квоты основной")
+    parser.add_argument("--rerun-fallback", action="store_true",
+                        help="перевести заново основной моделью главы, переведенные резервными")
+    parser.add_argument("--concurrency", type=int)
+    parser.add_argument("--parallel-books", type=int)
+    parser.add_argument("--chunk-tokens", type=int)
+    parser.add_argument("--rpm", type=int)
+    parser.add_argument("--tpm", type=int)
+    parser.add_argument("--request-timeout", type=float,
+                        help=f"срок ответа на запрос, сек ({DEFAULT_REQUEST_TIMEOUT}); без ответа запрос повторяется")
+    parser.add_argument("--stream", action="store_true", help="потоковый ответ с сохранением")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="загрузить инструкции и глоссарий в кеш контекста один раз на ключ")
+    parser.add_argument("--hedge-percentile", type=float,
+                        help="дублировать запрос, если ответ дольше этого перцентиля задержек прогона (например 0.9)")
+    parser.add_argument("--hedge-max-fraction", type=float, help="доля запросов, которую можно дублировать (0.1)")
+    parser.add_argument("--no-dedup", action="store_true", help="переводить повторяющиеся документы каждый раз")
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help="повтором считать и почти одинаковую короткую страницу, а не только точную копию")
+    parser.add_argument("--skip-boilerplate", action="store_true",
+                        help="не переводить служебные страницы (копирайт, рассылки) по списку шаблонов")
+    parser.add_argument("--skip-patterns", metavar="FILE",
+                        help="свой список шаблонов служебных страниц: регулярное выражение на строку")
+    parser.add_argument("--report", help="путь JSON-отчета о прогоне (по умолчанию projects/<проект>/run_report.json)")
+    parser.add_argument("--prometheus-textfile", help="файл .prom для textfile collector node_exporter")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="только оценить токены, стоимость и время, без перевода")
+    parser.add_argument("--exact-count", action="store_true",
+                        help="для --dry-run: считать токены через API модели, а не локально")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_SECONDS, help="интервал опроса папки, сек.")
+    args = parser.parse_args(argv)
+    if args.hedge_percentile is not None and not 0 < args.hedge_percentile < 1:
+        parser.error("--hedge-percentile — доля между 0 и 1, например 0.9")
+    if args.hedge_max_fraction is not None and not 0 < args.hedge_max_fraction <= 1:
+        parser.error("--hedge-max-fraction — доля больше 0 и не больше 1, например 0.1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    events = JsonLinesQueue()
+    pm = ProjectManager()
+    try:
+        return run(args, events, pm)
+    finally:
+        pm.close()
+
+
+def run(args, events, pm):
+    try:
+        settings = load_settings(args, pm)
+    except (OSError, ValueError) as e:
+        events.put(("error", f"Не удалось загрузить настройки: {e}"))
+        return EXIT_USAGE
+    api_key, api_keys = resolve_api_keys(args, settings)
+    # Локальной оценке ключ не нужен
+    if not api_key and not (args.dry_run and not args.exact_count):
+        events.put(("error", f"API-ключ не найден: передайте --api-key, задайте ${API_KEY_ENV} или --key-name."))
+        return EXIT_USAGE
+
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        events.put(("log", "⚠️ Получен сигнал отмены..."))
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    base_project = args.project or settings.get("project_name") or CLI_PROJECT_PREFIX
+    base_data = {"settings": settings, "api_key": api_key, "api_keys": api_keys, "project_name": base_project,
+                 "dry_run": args.dry_run, "exact_count": args.exact_count}
+
+    if args.watch and args.dry_run:
+        events.put(("error", "--dry-run не сочетается с --watch: оценивайте файл или папку через --input."))
+        return EXIT_USAGE
+    if args.watch:
+        if not args.output or not os.path.isdir(args.watch):
+            events.put(("error", "Для --watch нужны существующая папка и папка результатов --output."))
+            return EXIT_USAGE
+        watch_inbox(base_data, args.watch, args.output, args.poll, events, stop_event, pm)
+    elif not os.path.exists(args.input):
+        events.put(("error", f"Источник не найден: {args.input}"))
+        return EXIT_USAGE
+    elif os.path.isdir(args.input):
+        output_dir = args.output or args.input
+        os.makedirs(output_dir, exist_ok=True)
+        files = [{"input": os.path.join(args.input, filename),
+                  "output": output_path_for(filename, output_dir)}
+                 for filename in sorted(os.listdir(args.input)) if filename.lower().endswith(".epub")]
+        if not files:
+            events.put(("error", "Не найдено EPUB файлов для обработки."))
+            return EXIT_USAGE
+        run_batch(base_data, files, events, stop_event, pm)
+        events.put(("finish_signal", None))
+    else:
+        output_path = args.output or os.path.splitext(args.input)[0] + "_translated.docx"
+        # Сохраненный проект продолжает свой прогресс; иначе проект привязывается к пути книги
+        project_name = args.project or book_project_name(base_project, args.input)
+        run_file(base_data, args.input, output_path, project_name, events, stop_event, pm)
+
+    if stop_event.is_set():
+        return EXIT_STOPPED
+    return EXIT_ERROR if events.errors else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
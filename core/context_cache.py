@@ -0,0 +1,89 @@
+# core/context_cache.py
+import threading
+
+from .estimator import get_model_prices
+from .providers import DEFAULT_PROVIDER, get_provider
+from .rate_limiter import estimate_tokens
+
+DEFAULT_CACHE_TTL_SECONDS = 3600
+# Меньший префикс API в кеш не принимает, да и экономии на нем почти нет
+MIN_CACHE_TOKENS = 1024
+# Во сколько раз дешевле обычного входа оплачиваются токены из кеша (без учета платы за хранение)
+CACHED_TOKEN_PRICE_RATIO = 0.25
+
+
+class ContextCache:
+    """
+    Статический префикс промпта, загруженный в кеш контекста по одному разу на ключ пула.
+    Запросы глав ссылаются на кеш и несут только текст главы. Если провайдер кеш не умеет,
+    префикс слишком мал или API отказал, ключ получает промпт целиком, как раньше.
+    """
+
+    def __init__(self, key_pool, model_name, progress_queue, provider=DEFAULT_PROVIDER):
+        self.key_pool = key_pool
+        self.model_name = model_name
+        self.progress_queue = progress_queue
+        self.provider = provider
+        self.prefix_tokens = 0
+        self._lock = threading.Lock()
+        self._models = {}
+        self._created = []
+
+    def open(self, prefix, ttl_seconds=DEFAULT_CACHE_TTL_SECONDS):
+        """Создает кеш на каждом ключе. Возвращает True, если кеш есть хотя бы у одного."""
+        self.prefix_tokens = estimate_tokens(prefix)
+        if self.prefix_tokens < MIN_CACHE_TOKENS:
+            self.progress_queue.put(("log", f"Кеш контекста: префикс промпта ~{self.prefix_tokens} токенов, "
+                                            f"нужно от {MIN_CACHE_TOKENS}. Промпт отправляется целиком."))
+            return False
+        # Кеш привязан к модели: резервные модели каскада получают промпт целиком
+        for slot in [slot for slot in self.key_pool.healthy_slots() if slot.tier == 0]:
+            provider = get_provider(slot.api_key, self.provider)
+            if not hasattr(provider, "create_cached_model"):
+                self.progress_queue.put(("log", "Кеш контекста: провайдер модели его не поддерживает. "
+                                                "Промпт отправляется целиком."))
+                return False
+            try:
+                model, name = provider.create_cached_model(self.model_name, prefix, ttl_seconds)
+            except Exception as e:
+                self.progress_queue.put(("log", f"⚠️ Кеш контекста для ключа '{slot.name}' не создан, "
+                                                f"промпт отправляется целиком: {e}"))
+                continue
+            with self._lock:
+                self._models[slot] = model
+                self._created.append((provider, name))
+        if self._models:
+            self.progress_queue.put(("log", f"Кеш контекста: префикс ~{self.prefix_tokens} токенов загружен "
+                                            f"для ключей: {', '.join(slot.name for slot in self._models)}."))
+        return bool(self._models)
+
+    def model_for(self, slot):
+        """Модель с кешем для ключа или None, если этот ключ работает без кеша."""
+        with self._lock:
+            return self._models.get(slot)
+
+    def drop(self, slot):
+        """Кеш ключа пропал (истек или удален): дальше этот ключ шлет промпт целиком."""
+        with self._lock:
+            self._models.pop(slot, None)
+
+    def summary(self, prompt_tokens, cached_tokens):
+        """Строка лога с экономией: сколько входных токенов пришло из кеша."""
+        share = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+        line = f"Кеш контекста: из кеша {cached_tokens} из {prompt_tokens} входных токенов ({share:.0%})"
+        prices = get_model_prices(self.model_name)
+        if prices:
+            saved = cached_tokens / 1e6 * prices[0] * (1 - CACHED_TOKEN_PRICE_RATIO)
+            line += f", экономия ~${saved:.4f} без учета хранения"
+        return line + "."
+
+    def close(self):
+        """Удаляет созданные кеши, не дожидаясь TTL: хранение оплачивается по времени."""
+        with self._lock:
+            created, self._created = self._created, []
+            self._models = {}
+        for provider, name in created:
+            try:
+                provider.delete_cached_content(name)
+            except Exception as e:
+                self.progress_queue.put(("log", f"⚠️ Не удалось удалить кеш контекста {name}: {e}"))
@@ -0,0 +1,178 @@
+# core/dedup.py
+import hashlib
+import random
+import re
+import threading
+
+from .rate_limiter import estimate_tokens
+from .translation_memory import normalize_source
+
+# Шинглы по 5 слов, 64 перестановки minhash, LSH: 16 полос по 4 строки
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+# Копией считается документ с оценкой сходства Жаккара не ниже порога
+NEAR_DUPLICATE_THRESHOLD = 0.9
+# Короткие тексты («Часть первая» и «Часть вторая») похожи почти целиком, для них только точное совпадение
+MIN_SHINGLES = 20
+# Список служебных страниц проверяется только на коротких документах, чтобы не выбросить главу
+BOILERPLATE_MAX_TOKENS = 1500
+# Почти одинаковыми бывают служебные страницы, а не главы: у двух глав с общим длинным предисловием
+# сходство высокое, хотя сам текст разный. Поэтому сходство проверяется только на страницах такого размера
+NEAR_DUPLICATE_MAX_TOKENS = BOILERPLATE_MAX_TOKENS
+
+DEFAULT_SKIP_PATTERNS = (
+    "# Одно регулярное выражение на строку, без учета регистра\n"
+    "all rights reserved\n"
+    "^\\s*also by\\b\n"
+    "sign up for .{0,40}newsletter\n"
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(MINHASH_PERMUTATIONS)]
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), "big")
+
+
+def minhash_signature(text):
+    """Подпись minhash по шинглам из слов или None, если текст слишком короткий или длинный для сравнения."""
+    if estimate_tokens(text) > NEAR_DUPLICATE_MAX_TOKENS:
+        return None
+    words = re.findall(r"\w+", text.lower())
+    shingles = {_hash64(" ".join(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in shingles) for a, b in _PERMUTATIONS)
+
+
+class Fingerprint:
+    def __init__(self, text, near=False):
+        self.exact = hashlib.sha256(normalize_source(text).encode('utf-8')).hexdigest()
+        self.signature = minhash_signature(text) if near else None
+
+    def bands(self):
+        rows = MINHASH_PERMUTATIONS // LSH_BANDS
+        return [(band, self.signature[band * rows:(band + 1) * rows]) for band in range(LSH_BANDS)]
+
+    def similarity(self, other):
+        if self.signature is None or other.signature is None:
+            return 0.0
+        return sum(1 for a, b in zip(self.signature, other.signature) if a == b) / MINHASH_PERMUTATIONS
+
+
+class DocumentEntry:
+    def __init__(self, fingerprint, owner, label):
+        self.fingerprint = fingerprint
+        self.owner = owner
+        self.label = label
+        self.translation = None
+        self.waiters = []
+
+
+class DuplicateIndex:
+    """
+    Отпечатки документов книги или всего пакета: точный хеш нормализованного текста,
+    а с near=True еще и minhash для почти одинаковых коротких страниц (поиск кандидатов через LSH).
+    Каждый уникальный документ переводится один раз, копии получают его перевод.
+    Копия ждет оригинал только в своей книге; если оригинал еще переводится в другой книге,
+    копия переводится сама, чтобы книги пакета не зависели друг от друга.
+    """
+
+    def __init__(self, near=False):
+        self.near = near
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._bands = {}
+
+    def fingerprint(self, text):
+        return Fingerprint(text, self.near)
+
+    def _match(self, fingerprint):
+        entry = self._exact.get(fingerprint.exact)
+        if entry is not None or fingerprint.signature is None:
+            return entry
+        best, best_similarity = None, NEAR_DUPLICATE_THRESHOLD
+        seen = set()
+        for band in fingerprint.bands():
+            for candidate in self._bands.get(band, ()):
+                if id(candidate) in seen:
+                    continue
+                seen.add(id(candidate))
+                similarity = fingerprint.similarity(candidate.fingerprint)
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+        return best
+
+    def claim(self, fingerprint, owner, label, on_ready):
+        """
+        Решает судьбу документа. Возвращает пару:
+        ("translate", запись) — переводить самому, по готовности передать перевод в resolve (запись может быть None);
+        ("ready", (перевод, откуда)) — перевод копии уже есть;
+        ("wait", откуда) — оригинал переводится в этой же книге, on_ready(перевод, откуда) будет вызван из resolve.
+        """
+        with self._lock:
+            entry = self._match(fingerprint)
+            if entry is not None and entry.translation is not None:
+                return "ready", (entry.translation, entry.label)
+            if entry is not None and entry.owner is owner:
+                entry.waiters.append(on_ready)
+                return "wait", entry.label
+            if entry is not None:
+                return "translate", None
+            entry = DocumentEntry(fingerprint, owner, label)
+            self._exact[fingerprint.exact] = entry
+            if fingerprint.signature is not None:
+                for band in fingerprint.bands():
+                    self._bands.setdefault(band, []).append(entry)
+            return "translate", entry
+
+    def resolve(self, entry, translation):
+        with self._lock:
+            entry.translation = translation
+            waiters, entry.waiters = entry.waiters, []
+        for on_ready in waiters:
+            on_ready(translation, entry.label)
+
+    def abandon(self, owner):
+        """
+        Книга закончила работу: ее непереведенные оригиналы убираются из индекса,
+        чтобы копии в других книгах и следующих прогонах переводились сами.
+        Возвращает число копий, так и не дождавшихся перевода.
+        """
+        with self._lock:
+            dropped = [entry for entry in self._exact.values() if entry.owner is owner and entry.translation is None]
+            for entry in dropped:
+                del self._exact[entry.fingerprint.exact]
+                if entry.fingerprint.signature is not None:
+                    for band in entry.fingerprint.bands():
+                        self._bands[band].remove(entry)
+            return sum(len(entry.waiters) for entry in dropped)
+
+
+class BoilerplateFilter:
+    """Список служебных страниц: регулярные выражения по строке; короткий документ с совпадением не переводится."""
+
+    def __init__(self, text):
+        self.patterns = []
+        self.errors = []
+        for line in text.split('\n'):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                self.patterns.append(re.compile(line, re.IGNORECASE | re.MULTILINE))
+            except re.error as e:
+                self.errors.append(f"{line}: {e}")
+
+    def match(self, text):
+        """Шаблон, под который попал документ, или None."""
+        if estimate_tokens(text) > BOILERPLATE_MAX_TOKENS:
+            return None
+        for pattern in self.patterns:
+            if pattern.search(text):
+                return pattern.pattern
+        return None
@@ -0,0 +1,97 @@
+# core/docx_writer.py
+import io
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from docx import Document
+
+FRAGMENTS_DIRNAME = "docx"
+# Символы, запрещенные в XML 1.0: python-docx на них падает, в фрагментах они просто выбрасываются
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_DOCUMENT_PART = "word/document.xml"
+
+
+def _run_text(text):
+    text = escape(_INVALID_XML_CHARS.sub("", text))
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return f"<w:r><w:t{space}>{text}</w:t></w:r>"
+
+
+def render_chapter(title, text):
+    """
+    XML тела документа для одной главы: заголовок первого уровня, абзац на каждую
+    непустую строку перевода и разрыв страницы. Стили те же, что у add_heading в шаблоне python-docx.
+    """
+    parts = [f'<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr>{_run_text(title)}</w:p>']
+    for line in text.split('\n'):
+        line = line.rstrip()
+        if line.strip():
+            parts.append(f"<w:p>{_run_text(line)}</w:p>")
+    parts.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+    return "".join(parts)
+
+
+class DocxAssembler:
+    """
+    Собирает DOCX из готовых фрагментов глав. Фрагмент пишется, когда глава переведена,
+    поэтому в конце прогона остается только склеить их по порядку потоком в zip, не строя
+    документ целиком в памяти. При повторной сборке заново рендерятся лишь главы,
+    текст которых новее их фрагмента.
+    """
+
+    def __init__(self, fragments_dir):
+        self.fragments_dir = fragments_dir
+        os.makedirs(fragments_dir, exist_ok=True)
+
+    def fragment_path(self, chapter_index):
+        return os.path.join(self.fragments_dir, f"chapter_{chapter_index:04d}.xml")
+
+    def add_chapter(self, chapter_index, title, text):
+        path = self.fragment_path(chapter_index)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(render_chapter(title, text))
+        os.replace(tmp_path, path)
+
+    def _fresh_fragment(self, chapter_index, chapter_path, read_chapter):
+        """Путь к фрагменту и признак, что его пришлось отрендерить (нет фрагмента или текст главы новее)."""
+        path = self.fragment_path(chapter_index)
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(chapter_path):
+            return path, False
+        title, text = read_chapter(chapter_path)
+        self.add_chapter(chapter_index, title, text)
+        return path, True
+
+    def write(self, output_path, book_title, chapters, read_chapter):
+        """
+        chapters — пары (номер главы, путь к файлу перевода) в порядке книги;
+        read_chapter(путь) возвращает (заголовок, текст) для глав без свежего фрагмента.
+        Возвращает число глав, фрагменты которых пришлось отрендерить заново.
+        """
+        # Заготовка python-docx дает стили, свойства и раздел страницы; тело подставляется между ними
+        skeleton = Document()
+        skeleton.add_heading(book_title, 0)
+        buffer = io.BytesIO()
+        skeleton.save(buffer)
+        rendered = 0
+
+        tmp_path = output_path + ".tmp"
+        with zipfile.ZipFile(buffer) as source, zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as target:
+            for item in source.infolist():
+                if item.filename != _DOCUMENT_PART:
+                    target.writestr(item, source.read(item.filename))
+                    continue
+                document_xml = source.read(item.filename).decode('utf-8')
+                body_end = document_xml.rindex("<w:sectPr")
+                with target.open(_DOCUMENT_PART, 'w') as f:
+                    f.write(document_xml[:body_end].encode('utf-8'))
+                    for chapter_index, chapter_path in chapters:
+                        path, was_rendered = self._fresh_fragment(chapter_index, chapter_path, read_chapter)
+                        rendered += was_rendered
+                        with open(path, 'rb') as fragment:
+                            f.write(fragment.read())
+                    f.write(document_xml[body_end:].encode('utf-8'))
+        os.replace(tmp_path, output_path)
+        return rendered
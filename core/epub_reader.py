@@ -0,0 +1,75 @@
+# core/epub_reader.py
+import posixpath
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from urllib.parse import unquote
+
+CONTAINER_PATH = "META-INF/container.xml"
+NS = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+# ebooklib считает документом (ITEM_DOCUMENT) только элемент манифеста с этим типом, расширение не важно:
+# text/html с расширением .html для него не глава
+DOCUMENT_MEDIA_TYPE = "application/xhtml+xml"
+
+
+class EpubDocument:
+    def __init__(self, item_id, href, zip_path, media_type):
+        self.id = item_id
+        self.href = href
+        self.zip_path = zip_path
+        self.media_type = media_type
+
+
+class LazyEpub:
+    """
+    Читает EPUB прямо из zip-архива по OPF, не загружая книгу целиком.
+    При открытии разбирается только container.xml и OPF; содержимое документа
+    распаковывается лишь при вызове read(), картинки и прочие ресурсы не трогаются вовсе.
+
+    Документы перечисляются в порядке манифеста, как это делает
+    ebooklib.get_items_of_type(ITEM_DOCUMENT): номера глав в сохраненном прогрессе
+    остаются прежними.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        self._lock = threading.Lock()
+        try:
+            container = ET.fromstring(self._zip.read(CONTAINER_PATH))
+            rootfile = container.find(".//container:rootfile", NS)
+            self.opf_path = rootfile.get("full-path")
+            opf = ET.fromstring(self._zip.read(self.opf_path))
+        except Exception:
+            self._zip.close()
+            raise
+        opf_dir = posixpath.dirname(self.opf_path)
+
+        title = opf.find(".//opf:metadata/dc:title", NS)
+        self.title = title.text.strip() if title is not None and title.text else None
+
+        self.documents = []
+        manifest = opf.find("opf:manifest", NS)
+        for item in (manifest.findall("opf:item", NS) if manifest is not None else []):
+            href = unquote(item.get("href", ""))
+            media_type = item.get("media-type", "")
+            if media_type == DOCUMENT_MEDIA_TYPE:
+                zip_path = posixpath.normpath(posixpath.join(opf_dir, href))
+                self.documents.append(EpubDocument(item.get("id"), href, zip_path, media_type))
+
+    def read(self, document):
+        with self._lock:
+            return self._zip.read(document.zip_path)
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,303 @@
+# core/estimator.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from .chunker import DEFAULT_CHUNK_TOKENS, Chapter, plan_requests
+from .epub_reader import LazyEpub
+from .glossary import Glossary
+from .html_text import extract_chapter
+from .metrics import REPORT_FILENAME
+from .project_manager import PROJECTS_DIR
+from .prompts import build_prompt, build_prompt_template
+from .providers import DEFAULT_PROVIDER, get_provider
+from .rate_limiter import OUTPUT_TOKEN_RATIO, RateLimiter, estimate_tokens, get_model_limits, lookup_by_model
+
+TOKEN_CACHE_PATH = os.path.join(PROJECTS_DIR, "token_counts.sqlite")
+
+# Ориентировочные цены платного уровня, долларов за 1M токенов (вход, выход); ищутся по самому длинному префиксу
+MODEL_PRICES = {
+    "gemini-2.5-pro": (1.25, 10.0),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-flash-8b": (0.0375, 0.15),
+    "gemini-1.0-pro": (0.50, 1.50),
+}
+# Без замеров прошлого прогона: задержка до первого токена и скорость выдачи ответа
+DEFAULT_FIRST_TOKEN_SECONDS = 3.0
+DEFAULT_OUTPUT_TOKENS_PER_SECOND = 150.0
+
+
+def get_model_prices(model_name):
+    return lookup_by_model(MODEL_PRICES, model_name)
+
+
+class TokenCountCache:
+    """Точные счетчики токенов от API по хешу текста: count_tokens не повторяется для тех же промптов."""
+
+    def __init__(self, path=TOKEN_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS counts (hash TEXT, method TEXT, tokens INTEGER, PRIMARY KEY (hash, method))")
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, text_hash, method):
+        with self._lock:
+            row = self._conn.execute("SELECT tokens FROM counts WHERE hash = ? AND method = ?",
+                                     (text_hash, method)).fetchone()
+        return row[0] if row else None
+
+    def put(self, text_hash, method, tokens):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO counts (hash, method, tokens) VALUES (?, ?, ?)",
+                               (text_hash, method, int(tokens)))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TokenCounter:
+    """
+    Локальная оценка по умолчанию; с exact=True — count_tokens модели, если провайдер его умеет.
+    Кешируются только точные счетчики (method учитывает модель: у разных моделей разные токенизаторы),
+    локальная оценка дешевле поиска в кеше.
+    """
+
+    def __init__(self, cache=None, model=None, model_name="", exact=False):
+        self.cache = cache
+        self.model = model
+        self.method = f"api:{model_name}" if exact else "local"
+        self.exact = exact
+        self.cached = 0
+        self.counted = 0
+
+    def count(self, text):
+        if not self.exact:
+            self.counted += 1
+            return estimate_tokens(text)
+        text_hash = TokenCountCache.text_hash(text)
+        tokens = self.cache.get(text_hash, self.method)
+        if tokens is not None:
+            self.cached += 1
+            return tokens
+        tokens = self.model.count_tokens(text).total_tokens
+        self.cache.put(text_hash, self.method, tokens)
+        self.counted += 1
+        return tokens
+
+
+def _measured_latency(project_name):
+    """Скорость ответа из отчета прошлого прогона проекта: (задержка до ответа, токенов в секунду) или None."""
+    path = os.path.join(PROJECTS_DIR, project_name, REPORT_FILENAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            totals = json.load(f)["totals"]
+    except (OSError, ValueError, KeyError):
+        return None
+    if totals.get("requests", 0) <= 0 or totals.get("output_tokens", 0) <= 0 or totals.get("latency_seconds", 0) <= 0:
+        return None
+    return 0.0, totals["output_tokens"] / totals["latency_seconds"]
+
+
+def estimate_run(project_data, exact=False, is_halted=None):
+    """
+    Сухой прогон: извлекает все еще не переведенные главы, разбивает их на запросы так же,
+    как translation_process, собирает настоящие промпты и считает их токены.
+    Память переводов не учитывается: оценка — верхняя граница.
+    """
+    model_name = project_data["model"]
+    template, _ = build_prompt_template(project_data["prompt"])
+    glossary = Glossary(project_data.get("glossary", ""), project_data.get("use_regex", False))
+    completed = set(project_data.get("completed_chapters_list") or [])
+    chunk_tokens = int(project_data.get("chunk_tokens", DEFAULT_CHUNK_TOKENS))
+
+    cache = None
+    model = None
+    if exact:
+        provider = get_provider(project_data["api_key"], project_data.get("provider", DEFAULT_PROVIDER))
+        model = provider.get_model(model_name)
+        exact = hasattr(model, "count_tokens")
+    if exact:
+        cache = TokenCountCache()
+    counter = TokenCounter(cache, model, model_name, exact)
+
+    book = LazyEpub(project_data["epub_path"])
+    try:
+        def chapters():
+            for i, item in enumerate(book.documents):
+                if i in completed:
+                    continue
+                text, heading = extract_chapter(book.read(item))
+                if text.strip():
+                    yield Chapter(i, text, heading or f"Глава {i + 1}")
+
+        requests = []
+        for request in plan_requests(chapters(), chunk_tokens):
+            if is_halted and is_halted():
+                return None
+            source_text = request.source_text()
+            prompt = build_prompt(template, glossary, source_text, request.is_packed)
+            prompt_tokens = counter.count(prompt)
+            output_tokens = int(counter.count(source_text) * OUTPUT_TOKEN_RATIO)
+            requests.append({
+                "label": request.label,
+                "chapters": sorted({segment.chapter.index for segment in request.segments}),
+                "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+            })
+        total_chapters = len(book.documents)
+    finally:
+        book.close()
+        if cache is not None:
+            cache.close()
+
+    return summarize(project_data, requests, total_chapters, counter)
+
+
+class WallTime:
+    """
+    Время прогона по числу запросов и токенам. Тот же расчет квоты, что у ограничителя:
+    запас SAFETY_FACTOR и минимальный интервал; скорость ответа — из отчета прошлого прогона, если он есть.
+    """
+
+    def __init__(self, project_data):
+        default_rpm, default_tpm = get_model_limits(project_data["model"])
+        self.limiter = RateLimiter(project_data.get("rpm") or default_rpm, project_data.get("tpm") or default_tpm,
+                                   project_data.get("delay", 0))
+        self.keys = len(project_data.get("api_keys") or {}) or 1
+        self.concurrency = max(1, int(project_data.get("concurrency", 1)))
+        self.measured = _measured_latency(project_data.get("project_name", ""))
+        self.first_token_seconds, self.tokens_per_second = self.measured or (DEFAULT_FIRST_TOKEN_SECONDS,
+                                                                             DEFAULT_OUTPUT_TOKENS_PER_SECOND)
+
+    def latency(self, output_tokens):
+        return self.first_token_seconds + output_tokens / self.tokens_per_second
+
+    def estimate(self, requests, tokens, latency_seconds):
+        """(секунд, узкое место): прогон упирается в число запросов в минуту, токены в минуту или сами ответы."""
+        requests_per_minute = min(self.limiter.rpm, 60.0 / self.limiter.min_interval) * self.keys
+        wall_by_rpm = requests / requests_per_minute * 60
+        wall_by_tpm = tokens / (self.limiter.tpm * self.keys) * 60
+        wall_by_latency = latency_seconds / self.concurrency
+        wall_seconds = max(wall_by_rpm, wall_by_tpm, wall_by_latency)
+        return wall_seconds, {wall_by_rpm: "rpm", wall_by_tpm: "tpm", wall_by_latency: "latency"}[wall_seconds]
+
+
+class LiveEstimate:
+    """
+    Оценка времени для ETA во время перевода: копится по запросам, которые готовит сам конвейер,
+    поэтому книга не разбирается второй раз. Токены считаются локально.
+    """
+
+    def __init__(self, project_data):
+        self.wall_time = WallTime(project_data)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._tokens = 0
+        self._latency_seconds = 0.0
+        self._chapters = set()
+        self._reported_seconds = 0.0
+        self._reported_chapters = 0
+
+    def add(self, prompt, source_text, chapters):
+        """
+        Учитывает подготовленный запрос и возвращает прирост оценки для события ("eta", ...):
+        {"wall_seconds", "chapters"}. Приросты складываются, как оценки книг в пакете.
+        """
+        output_tokens = int(estimate_tokens(source_text) * OUTPUT_TOKEN_RATIO)
+        with self._lock:
+            self._requests += 1
+            self._tokens += estimate_tokens(prompt) + output_tokens
+            self._latency_seconds += self.wall_time.latency(output_tokens)
+            self._chapters.update(chapters)
+            wall_seconds, _ = self.wall_time.estimate(self._requests, self._tokens, self._latency_seconds)
+            delta = {"wall_seconds": round(wall_seconds - self._reported_seconds, 3),
+                     "chapters": len(self._chapters) - self._reported_chapters}
+            self._reported_seconds = wall_seconds
+            self._reported_chapters = len(self._chapters)
+        return delta
+
+
+def summarize(project_data, requests, total_chapters, counter):
+    model_name = project_data["model"]
+    wall_time = WallTime(project_data)
+    prompt_tokens = sum(r["prompt_tokens"] for r in requests)
+    output_tokens = sum(r["output_tokens"] for r in requests)
+    latency_seconds = sum(wall_time.latency(r["output_tokens"]) for r in requests)
+    wall_seconds, bottleneck = wall_time.estimate(len(requests), prompt_tokens + output_tokens, latency_seconds)
+
+    prices = get_model_prices(model_name)
+    cost = None
+    if prices:
+        cost = round(prompt_tokens / 1e6 * prices[0] + output_tokens / 1e6 * prices[1], 4)
+
+    chapters = {i for r in requests for i in r["chapters"]}
+    return {
+        "model": model_name,
+        "method": counter.method,
+        "chapters_total": total_chapters,
+        "chapters_pending": len(chapters),
+        "requests": len(requests),
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": cost,
+        "wall_seconds": round(wall_seconds, 1),
+        "bottleneck": bottleneck,
+        "latency_source": "run_report" if wall_time.measured else "default",
+        "counted": counter.counted,
+        "cached": counter.cached,
+        "per_request": requests,
+    }
+
+
+def format_estimate(estimate):
+    """Строки лога с итогами оценки."""
+    minutes, seconds = divmod(int(estimate["wall_seconds"]), 60)
+    hours, minutes = divmod(minutes, 60)
+    duration = f"{hours} ч {minutes} мин" if hours else f"{minutes} мин {seconds} с"
+    exact = estimate["method"].startswith("api:")
+    method = "точный подсчет через API" if exact else "локальная оценка"
+    bottleneck = {"rpm": "лимит запросов в минуту", "tpm": "лимит токенов в минуту",
+                  "latency": "скорость ответов модели"}[estimate["bottleneck"]]
+    cost = "цена модели неизвестна"
+    if estimate["cost_usd"] is not None:
+        cost = f"~${estimate['cost_usd']:.2f}" if estimate["cost_usd"] >= 0.01 else f"~${estimate['cost_usd']:.4f}"
+    return [
+        f"Оценка ({method}, модель {estimate['model']}): глав к переводу {estimate['chapters_pending']} "
+        f"из {estimate['chapters_total']}, запросов {estimate['requests']}.",
+        f"Токены: ~{estimate['prompt_tokens']} во входе, ~{estimate['output_tokens']} в ответах; стоимость {cost}.",
+        f"Время: ~{duration}, ограничивает {bottleneck}."
+        + (f" Посчитано через API {estimate['counted']}, взято из кеша {estimate['cached']}." if exact else ""),
+    ]
+
+
+def announce_estimate(project_data, progress_queue, exact=False, is_halted=None):
+    """Оценивает книгу без перевода и сообщает итог в очередь прогресса: событие ("estimate", {...}) и строки лога."""
+    try:
+        estimate = estimate_run(project_data, exact=exact, is_halted=is_halted)
+    except Exception as e:
+        progress_queue.put(("log", f"⚠️ Не удалось оценить объем работы: {e}"))
+        return None
+    if estimate is None:
+        return None
+    estimate.pop("per_request")
+    progress_queue.put(("estimate", estimate))
+    for line in format_estimate(estimate):
+        progress_queue.put(("log", line))
+    return estimate
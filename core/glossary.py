@@ -0,0 +1,178 @@
+# core/glossary.py
+import re
+from collections import deque
+
+# Сколько разных найденных форм одной RegEx-записи показывать модели
+MAX_REGEX_FORMS = 5
+# Запись, похожая на регулярное выражение ((?i)naruto, Naruto\w*) при выключенном RegEx:
+# как текст она в главе не встретится, поэтому передается модели всегда, как до выборочной подстановки
+REGEX_LIKE = re.compile(r"\(\?|\\.|[\[\]*+|^$]|\{\d")
+
+
+class GlossaryEntry:
+    def __init__(self, original, translation, pattern=None, always=False):
+        self.original = original
+        self.translation = translation
+        self.pattern = pattern
+        self.always = always
+
+
+class AhoCorasick:
+    """Автомат Ахо–Корасик: все вхождения всех терминов за один проход по тексту."""
+
+    def __init__(self, terms):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for term_id, term in enumerate(terms):
+            self._add(term, term_id)
+        self._build_links()
+
+    def _add(self, term, term_id):
+        state = 0
+        for ch in term:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(term_id)
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """Выдает пары (позиция конца вхождения, номер термина)."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for term_id in output[state]:
+                yield pos, term_id
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+class Glossary:
+    """
+    Глоссарий, скомпилированный один раз на прогон.
+    Обычные термины ищутся автоматом без учета регистра и по границам слов,
+    при включенном RegEx каждая запись компилируется в регулярное выражение.
+    В промпт попадают только правила для терминов, встреченных в тексте.
+    """
+
+    def __init__(self, text, use_regex=False):
+        self.entries = []
+        self.errors = []
+        # Похожие на RegEx записи при выключенном RegEx: для предупреждения в логе
+        self.regex_like = []
+        # Повторная запись для того же оригинала заменяет предыдущую
+        pairs = {}
+        for line in text.split('\n'):
+            if '->' in line and not line.strip().startswith('#'):
+                parts = line.split('->', 1)
+                original, translation = parts[0].strip(), parts[1].strip()
+                if original and translation:
+                    pairs[original] = translation
+        for original, translation in pairs.items():
+            self._add_entry(original, translation, use_regex)
+
+        self._literal = [entry for entry in self.entries if entry.pattern is None]
+        self._terms = [entry.original.lower() for entry in self._literal]
+        self._automaton = AhoCorasick(self._terms) if self._literal else None
+
+    def _add_entry(self, original, translation, use_regex):
+        translation = translation.strip("'\"")
+        if use_regex:
+            try:
+                self.entries.append(GlossaryEntry(original, translation, re.compile(original)))
+                return
+            except re.error as e:
+                # Неверное выражение не должно ронять прогон: считаем запись обычным термином
+                self.errors.append(f"{original}: {e}")
+        original = original.strip("'\"")
+        # Из одних кавычек остается пустой термин: искать нечего
+        if not original:
+            return
+        always = not use_regex and REGEX_LIKE.search(original) is not None
+        if always:
+            self.regex_like.append(original)
+        self.entries.append(GlossaryEntry(original, translation, always=always))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _literal_matches(self, text):
+        found = set()
+        if self._automaton is None:
+            return found
+        lowered = text.lower()
+        for end, term_id in self._automaton.iter_matches(lowered):
+            if term_id in found:
+                continue
+            term = self._terms[term_id]
+            start = end - len(term) + 1
+            if _is_word_char(term[0]) and start > 0 and _is_word_char(lowered[start - 1]):
+                continue
+            if _is_word_char(term[-1]) and end + 1 < len(lowered) and _is_word_char(lowered[end + 1]):
+                continue
+            found.add(term_id)
+        return found
+
+    def rules_for(self, text):
+        """Список пар (оригинал, перевод) для записей, встреченных в тексте, в порядке глоссария."""
+        literal_ids = self._literal_matches(text)
+        literal_entries = {id(self._literal[term_id]) for term_id in literal_ids}
+        rules = []
+        for entry in self.entries:
+            if entry.pattern is None:
+                if entry.always or id(entry) in literal_entries:
+                    rules.append((entry.original, entry.translation))
+                continue
+            forms = {}
+            for match in entry.pattern.finditer(text):
+                form = match.group(0)
+                if not form or form in forms:
+                    continue
+                try:
+                    forms[form] = match.expand(entry.translation)
+                except (re.error, IndexError):
+                    forms[form] = entry.translation
+                if len(forms) >= MAX_REGEX_FORMS:
+                    break
+            rules.extend(forms.items())
+        return rules
+
+    def instructions_for(self, text):
+        rules = self.rules_for(text)
+        if not rules:
+            return ""
+        instructions_list = ["\nStrictly follow these translation rules:"]
+        for original, translation in rules:
+            instructions_list.append(f'- Translate "{original}" as "{translation}".')
+        return "\n".join(instructions_list) + "\n"
+
+    def all_instructions(self):
+        """Прежнее поведение: все правила глоссария целиком (для сравнения в бенчмарке)."""
+        if not self.entries:
+            return ""
+        instructions_list = ["\nStrictly follow these translation rules:"]
+        for entry in self.entries:
+            instructions_list.append(f'- Translate "{entry.original}" as "{entry.translation}".')
+        return "\n".join(instructions_list) + "\n"
@@ -0,0 +1,77 @@
+# core/hedging.py
+import bisect
+import threading
+from collections import deque
+
+DEFAULT_HEDGE_PERCENTILE = 0.9
+# Дубли не больше этой доли запросов прогона: каждый дубль тратит квоту RPM/TPM
+DEFAULT_HEDGE_MAX_FRACTION = 0.1
+# Порог считается по замерам этого прогона, пока их мало — не дублируем
+MIN_LATENCY_SAMPLES = 5
+LATENCY_WINDOW = 200
+
+
+class HedgePolicy:
+    """
+    Дублирование медленных запросов: если ответ идет дольше заданного перцентиля задержек
+    этого прогона, такой же запрос уходит еще раз (по возможности через другой ключ),
+    берется тот ответ, что пришел первым. Число дублей ограничено долей от всех запросов.
+    """
+
+    def __init__(self, percentile=DEFAULT_HEDGE_PERCENTILE, max_fraction=DEFAULT_HEDGE_MAX_FRACTION):
+        # Перцентиль — доля, а не проценты: 50 вместо 0.5 молча дал бы порог по максимальной задержке
+        if not 0 < percentile < 1:
+            raise ValueError(f"перцентиль дублирования должен быть между 0 и 1, получено {percentile}")
+        if not 0 < max_fraction <= 1:
+            raise ValueError(f"доля дублей должна быть больше 0 и не больше 1, получено {max_fraction}")
+        self.percentile = percentile
+        self.max_fraction = max_fraction
+        self._lock = threading.Lock()
+        self._window = deque()
+        self._sorted = []
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._window.append(seconds)
+            bisect.insort(self._sorted, seconds)
+            if len(self._window) > LATENCY_WINDOW:
+                oldest = self._window.popleft()
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+
+    def threshold(self):
+        """Задержка, после которой запрос дублируется, или None, пока замеров мало."""
+        with self._lock:
+            if len(self._sorted) < MIN_LATENCY_SAMPLES:
+                return None
+            index = min(len(self._sorted) - 1, int(self.percentile * len(self._sorted)))
+            return self._sorted[index]
+
+    def try_hedge(self):
+        """Резервирует право на дубль в пределах доли от запросов. False — лимит дублей исчерпан."""
+        with self._lock:
+            if self.hedges + 1 > self.max_fraction * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def cancel_hedge(self):
+        """Дубль не ушел (у ключей нет свободной квоты): право возвращается."""
+        with self._lock:
+            self.hedges -= 1
+
+    def record_win(self):
+        with self._lock:
+            self.wins += 1
+
+    def summary(self):
+        threshold = self.threshold()
+        threshold_text = f"{threshold:.1f} с" if threshold is not None else "не набран"
+        return (f"Дублирование запросов: порог p{self.percentile * 100:.0f} {threshold_text}, "
+                f"дублей {self.hedges} из {self.requests} запросов, дубль ответил первым {self.wins} раз.")
@@ -0,0 +1,98 @@
+# core/html_text.py
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml.etree import ParserError
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+# Содержимое этих тегов BeautifulSoup не включает в get_text()
+SKIPPED_TAGS = {"script", "style", "template", "rt", "rp"}
+HEADING_TAGS = ("h1", "h2", "h3")
+
+XML_DECLARATION_RE = re.compile(r"^\s*<\?xml[^>]*\?>")
+BODY_TAG_RE = re.compile(r"<body[\s>/]", re.IGNORECASE)
+
+
+def extract_with_bs4(content):
+    """Эталонный путь: то, что раньше делал translation_process через html.parser."""
+    soup = BeautifulSoup(content, 'html.parser')
+    # ebooklib отдавал главу пересобранной только из <body>, поэтому <title> из <head> не учитываем
+    soup = soup.body or soup
+    text = soup.get_text(separator='\n', strip=True)
+    heading_tag = soup.find(list(HEADING_TAGS))
+    heading = heading_tag.get_text(strip=True) if heading_tag else None
+    return text, heading
+
+
+class _Walker:
+    """Один проход по дереву lxml: собирает строки текста и запоминает первый заголовок."""
+
+    def __init__(self):
+        self.strings = []
+        self.heading_span = None
+        self._heading_element = None
+
+    def walk(self, element, with_tail=True):
+        tag = element.tag
+        # У комментариев и инструкций обработки tag — не строка: их текст пропускается, хвост — нет
+        if isinstance(tag, str) and tag.lower() not in SKIPPED_TAGS:
+            is_heading = self._heading_element is None and tag.lower() in HEADING_TAGS
+            if is_heading:
+                self._heading_element = element
+                start = len(self.strings)
+            if element.text:
+                self.strings.append(element.text)
+            for child in element:
+                self.walk(child)
+            if is_heading:
+                self.heading_span = (start, len(self.strings))
+        if with_tail and element.tail:
+            self.strings.append(element.tail)
+
+
+def _extract_with_lxml(content):
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return None
+    # lxml не принимает str с объявлением кодировки
+    content = XML_DECLARATION_RE.sub('', content, count=1)
+    try:
+        document = lxml.html.document_fromstring(content)
+    except (ParserError, ValueError):
+        # Разбор не удался: пусть главу читает BeautifulSoup, а не пропускает как пустую
+        return None
+
+    # Без <body> в исходнике BeautifulSoup брал текст всего документа, включая <head>
+    root = document if not BODY_TAG_RE.search(content) else document.find("body")
+    if root is None:
+        root = document
+
+    walker = _Walker()
+    walker.walk(root, with_tail=False)
+    stripped = [s.strip() for s in walker.strings]
+    text = '\n'.join(s for s in stripped if s)
+    heading = None
+    if walker.heading_span is not None:
+        start, end = walker.heading_span
+        heading = ''.join(stripped[start:end])
+    return text, heading
+
+
+def extract_chapter(content):
+    """
+    Возвращает (текст главы по абзацам, текст первого заголовка h1–h3 или None).
+    Основной путь — C-парсер lxml за один проход; без lxml, для текста не в UTF-8
+    или если lxml не разобрал документ, используется прежний путь через BeautifulSoup с тем же результатом.
+    """
+    if HAVE_LXML:
+        result = _extract_with_lxml(content)
+        if result is not None:
+            return result
+    return extract_with_bs4(content)
@@ -0,0 +1,139 @@
+# core/key_pool.py
+import threading
+import time
+
+from .providers import DEFAULT_PROVIDER, get_provider
+from .rate_limiter import get_shared_limiter
+
+# Потолок паузы модели, квота которой исчерпывается раз за разом, пока работает резервная
+MAX_CASCADE_COOLDOWN = 600
+
+
+class KeySlot:
+    def __init__(self, name, api_key, model, limiter, model_name=None, tier=0):
+        self.name = name
+        self.api_key = api_key
+        self.model = model
+        self.limiter = limiter
+        self.model_name = model_name
+        # Место модели в каскаде: 0 — основная, дальше резервные
+        self.tier = tier
+        self.cooldown_until = 0.0
+        self.disabled = False
+        self.requests = 0
+        self.exhausted = 0
+        # ResourceExhausted подряд, без успешного ответа между ними
+        self.exhausted_streak = 0
+
+    def is_cooling_down(self):
+        return time.monotonic() < self.cooldown_until
+
+
+class KeyPool:
+    """
+    Раздает запросы по всем выбранным ключам.
+    У каждого ключа свой ограничитель квоты, счетчики и пауза после ResourceExhausted,
+    поэтому исчерпанный ключ не задерживает остальные.
+    С каскадом fallback_models у каждого ключа есть слот на каждую модель (квоты у моделей раздельные).
+    Запросы идут к основной модели; к следующей — только пока все ключи предыдущей на паузе
+    после ResourceExhausted. Когда пауза кончается, запросы возвращаются к основной модели.
+    """
+
+    def __init__(self, api_keys, model_name, rpm=None, tpm=None, min_interval=0.0, provider=DEFAULT_PROVIDER,
+                 fallback_models=()):
+        self._lock = threading.Lock()
+        self.slots = []
+        self.key_names = list(api_keys)
+        self.model_names = [model_name] + [name for name in fallback_models if name != model_name]
+        for tier, tier_model in enumerate(self.model_names):
+            for name, api_key in api_keys.items():
+                # Заданные вручную RPM/TPM относятся к основной модели, у резервных — лимиты по умолчанию
+                limiter = get_shared_limiter(api_key, tier_model, rpm=rpm if tier == 0 else None,
+                                             tpm=tpm if tier == 0 else None, min_interval=min_interval)
+                # Модель берется у долгоживущего провайдера ключа: соединение переиспользуется между книгами
+                model = get_provider(api_key, provider).get_model(tier_model)
+                self.slots.append(KeySlot(name, api_key, model, limiter, tier_model, tier))
+        if not self.slots:
+            raise ValueError("Пул ключей пуст.")
+
+    def healthy_slots(self):
+        return [slot for slot in self.slots if not slot.disabled]
+
+    def _cascade_slots(self, slots):
+        """Слоты первой по каскаду модели, у которой не все ключи на паузе; если на паузе все — все слоты."""
+        for tier in range(len(self.model_names)):
+            tier_slots = [slot for slot in slots if slot.tier == tier]
+            if any(not slot.is_cooling_down() for slot in tier_slots):
+                return tier_slots
+        return slots
+
+    def acquire(self, tokens, is_halted=None):
+        """
+        Ждет ключ со свободной квотой. Возвращает (слот, билет) или (None, None) при остановке.
+        Предпочтение отдается ключу с наименьшим числом запросов, чтобы нагрузка шла равномерно.
+        """
+        while True:
+            if is_halted and is_halted():
+                return None, None
+            slots = self.healthy_slots()
+            if not slots:
+                raise RuntimeError("В пуле не осталось рабочих API-ключей.")
+            shortest_wait = None
+            with self._lock:
+                for slot in sorted(self._cascade_slots(slots), key=lambda s: s.requests):
+                    ticket, wait = slot.limiter.try_acquire(tokens)
+                    if ticket is not None:
+                        slot.requests += 1
+                        return slot, ticket
+                    shortest_wait = wait if shortest_wait is None else min(shortest_wait, wait)
+            time.sleep(min(shortest_wait, 0.5))
+
+    def try_acquire(self, tokens, avoid=None):
+        """
+        Квота без ожидания: (слот, билет) или (None, None), если свободной квоты сейчас нет.
+        Слот avoid берется в последнюю очередь — так дубль запроса уходит через другой ключ.
+        """
+        with self._lock:
+            for slot in sorted(self._cascade_slots(self.healthy_slots()), key=lambda s: (s is avoid, s.requests)):
+                ticket, _ = slot.limiter.try_acquire(tokens)
+                if ticket is not None:
+                    slot.requests += 1
+                    return slot, ticket
+        return None, None
+
+    def report_exhausted(self, slot, seconds):
+        """
+        Ставит ключ на паузу. С каскадом моделей пауза растет вдвое с каждым исчерпанием подряд:
+        пока работает резервная модель, основную незачем пробовать каждые несколько секунд.
+        Возвращает фактическую длительность паузы.
+        """
+        with self._lock:
+            slot.exhausted += 1
+            slot.exhausted_streak += 1
+            if len(self.model_names) > 1 and slot.tier < len(self.model_names) - 1:
+                seconds = max(seconds, min(seconds * 2 ** (slot.exhausted_streak - 1), MAX_CASCADE_COOLDOWN))
+            slot.cooldown_until = max(slot.cooldown_until, time.monotonic() + seconds)
+        slot.limiter.block_for(seconds)
+        return seconds
+
+    def report_success(self, slot):
+        with self._lock:
+            slot.exhausted_streak = 0
+
+    def disable(self, slot):
+        """Исключает ключ со всеми его моделями до конца прогона. Возвращает False, если это был последний рабочий ключ."""
+        with self._lock:
+            if not any(other.api_key != slot.api_key for other in self.healthy_slots()):
+                return False
+            for other in self.slots:
+                if other.api_key == slot.api_key:
+                    other.disabled = True
+            return True
+
+    def summary(self):
+        lines = []
+        for slot in self.slots:
+            status = "отключен" if slot.disabled else ("пауза" if slot.is_cooling_down() else "ok")
+            name = f"{slot.name} ({slot.model_name})" if len(self.model_names) > 1 else slot.name
+            lines.append(f"{name}: запросов {slot.requests}, лимит исчерпан {slot.exhausted} раз, {status}")
+        return lines
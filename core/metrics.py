@@ -0,0 +1,253 @@
+# core/metrics.py
+import json
+import os
+import threading
+import time
+
+REPORT_FILENAME = "run_report.json"
+METRIC_PREFIX = "epub_translator"
+
+
+class RequestStats:
+    """Что известно об одном запросе к API: заполняется в _request_translation."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.exhausted = 0
+        # Попыток, не получивших ответа к сроку request_timeout
+        self.timeouts = 0
+        # Пустых ответов MAX_TOKENS: предел выходных токенов ушел на рассуждение модели
+        self.empty_max_tokens = 0
+        self.backoff_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.latency_seconds = 0.0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        # Входные токены, взятые из кеша контекста (входят в prompt_tokens)
+        self.cached_tokens = 0
+        # Запрос дублировался из-за медленного ответа; hedge_won — первым ответил дубль
+        self.hedged = False
+        self.hedge_won = False
+        self.finish_reason = None
+        # Модель, ответившая на запрос (при каскаде может быть резервной)
+        self.model = None
+
+
+class RunMetrics:
+    """
+    Замеры прогона: время разбора глав, очередь перед API, задержка ответа, токены,
+    повторы и паузы, finish_reason по каждому запросу, плюс время сборки DOCX.
+    По каждому запросу в очередь прогресса уходит событие ("metrics", {...}),
+    в конце прогона пишется JSON-отчет и, если задан путь, textfile для Prometheus.
+    """
+
+    def __init__(self, project_name, model_name, progress_queue=None):
+        self.project_name = project_name
+        self.model_name = model_name
+        self.progress_queue = progress_queue
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.parse_ms = {}
+        self.requests = []
+        self.phases = {}
+        self.counters = {"memory_hits": 0, "skipped_empty": 0, "failed_requests": 0,
+                         "duplicates_reused": 0, "boilerplate_skipped": 0, "continuations": 0,
+                         "truncated_kept": 0, "short_translations": 0}
+
+    def record_parse(self, chapter_index, milliseconds):
+        with self._lock:
+            self.parse_ms[chapter_index] = round(milliseconds, 2)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_request(self, label, chapters, stats, queue_seconds):
+        record = {
+            "label": label,
+            "chapters": chapters,
+            "parse_ms": round(sum(self.parse_ms.get(i, 0.0) for i in set(chapters)), 2),
+            "queue_seconds": round(queue_seconds, 3),
+            "wait_seconds": round(stats.wait_seconds, 3),
+            "latency_seconds": round(stats.latency_seconds, 3),
+            "attempts": stats.attempts,
+            "retries": stats.retries,
+            "exhausted": stats.exhausted,
+            "timeouts": stats.timeouts,
+            "empty_max_tokens": stats.empty_max_tokens,
+            "backoff_seconds": round(stats.backoff_seconds, 3),
+            "prompt_tokens": stats.prompt_tokens,
+            "output_tokens": stats.output_tokens,
+            "cached_tokens": stats.cached_tokens,
+            "hedged": stats.hedged,
+            "hedge_won": stats.hedge_won,
+            "finish_reason": stats.finish_reason,
+            "model": stats.model,
+        }
+        with self._lock:
+            self.requests.append(record)
+        if self.progress_queue is not None:
+            self.progress_queue.put(("metrics", record))
+
+    def total(self, field):
+        """Сумма поля по всем записанным запросам."""
+        with self._lock:
+            return sum(record[field] for record in self.requests)
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def add_phase_time(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def report(self, status):
+        with self._lock:
+            requests = list(self.requests)
+            phases = dict(self.phases)
+            counters = dict(self.counters)
+            parse_ms = dict(self.parse_ms)
+        wall = time.perf_counter() - self._started
+        chapters = {i for record in requests for i in record["chapters"]}
+        finish_reasons = {}
+        for record in requests:
+            reason = record["finish_reason"] or "UNKNOWN"
+            finish_reasons[reason] = finish_reasons.get(reason, 0) + 1
+        models = {}
+        for record in requests:
+            if record["model"]:
+                models[record["model"]] = models.get(record["model"], 0) + 1
+        latencies = sorted(record["latency_seconds"] for record in requests)
+        return {
+            "project": self.project_name,
+            "model": self.model_name,
+            "status": status,
+            "started_at": self.started_at,
+            "wall_seconds": round(wall, 3),
+            "phases": {name: round(seconds, 3) for name, seconds in phases.items()},
+            "totals": {
+                "requests": len(requests),
+                "chapters_translated": len(chapters),
+                "chapters_per_minute": round(len(chapters) / wall * 60, 2) if wall > 0 else 0.0,
+                "parse_ms": round(sum(parse_ms.values()), 2),
+                "prompt_tokens": sum(record["prompt_tokens"] for record in requests),
+                "output_tokens": sum(record["output_tokens"] for record in requests),
+                "cached_tokens": sum(record["cached_tokens"] for record in requests),
+                "hedges": sum(1 for record in requests if record["hedged"]),
+                "hedge_wins": sum(1 for record in requests if record["hedge_won"]),
+                "fallback_requests": sum(count for model, count in models.items() if model != self.model_name),
+                "attempts": sum(record["attempts"] for record in requests),
+                "retries": sum(record["retries"] for record in requests),
+                "exhausted": sum(record["exhausted"] for record in requests),
+                "timeouts": sum(record["timeouts"] for record in requests),
+                "empty_max_tokens": sum(record["empty_max_tokens"] for record in requests),
+                "backoff_seconds": round(sum(record["backoff_seconds"] for record in requests), 3),
+                "wait_seconds": round(sum(record["wait_seconds"] for record in requests), 3),
+                "latency_seconds": round(sum(latencies), 3),
+                "latency_p50_seconds": _percentile(latencies, 0.5),
+                "latency_p95_seconds": _percentile(latencies, 0.95),
+                **counters,
+            },
+            "finish_reasons": finish_reasons,
+            "models": models,
+            "requests": requests,
+        }
+
+    def write_json(self, path, report):
+        _write_atomic(path, json.dumps(report, indent=2, ensure_ascii=False))
+
+    def write_prometheus(self, path, report):
+        """Формат textfile collector у node_exporter: файл подменяется целиком, чтобы не читался наполовину."""
+        labels = f'project="{_escape(self.project_name)}",model="{_escape(self.model_name)}"'
+        totals = report["totals"]
+        lines = []
+
+        def metric(name, kind, help_text, value, extra_labels=""):
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            lines.append(f"{full_name}{{{labels}{extra_labels}}} {value}")
+
+        metric("run_wall_seconds", "gauge", "Длительность прогона.", report["wall_seconds"])
+        metric("run_timestamp_seconds", "gauge", "Время начала прогона.", round(report["started_at"], 3))
+        metric("run_success", "gauge", "1, если прогон завершен и DOCX собран.",
+               1 if report["status"] == "done" else 0)
+        metric("chapters_translated", "gauge", "Глав переведено через API за прогон.", totals["chapters_translated"])
+        metric("chapters_per_minute", "gauge", "Переведенных глав в минуту.", totals["chapters_per_minute"])
+        metric("requests", "gauge", "Запросов к API за прогон.", totals["requests"])
+        metric("request_attempts", "gauge", "Попыток запросов вместе с повторами.", totals["attempts"])
+        metric("request_retries", "gauge", "Повторных попыток.", totals["retries"])
+        metric("resource_exhausted", "gauge", "Ответов ResourceExhausted.", totals["exhausted"])
+        metric("request_timeouts", "gauge", "Попыток без ответа к сроку.", totals["timeouts"])
+        metric("empty_max_tokens", "gauge", "Пустых ответов MAX_TOKENS, повторенных без предела.",
+               totals["empty_max_tokens"])
+        metric("backoff_seconds", "gauge", "Паузы после ResourceExhausted.", totals["backoff_seconds"])
+        metric("quota_wait_seconds", "gauge", "Ожидание квоты перед запросами.", totals["wait_seconds"])
+        metric("api_latency_seconds_sum", "gauge", "Суммарное время ответов API.", totals["latency_seconds"])
+        metric("api_latency_p95_seconds", "gauge", "95-й перцентиль времени ответа API.", totals["latency_p95_seconds"])
+        metric("prompt_tokens", "gauge", "Токенов в промптах.", totals["prompt_tokens"])
+        metric("output_tokens", "gauge", "Токенов в ответах.", totals["output_tokens"])
+        metric("cached_tokens", "gauge", "Входных токенов из кеша контекста.", totals["cached_tokens"])
+        metric("hedged_requests", "gauge", "Запросов, продублированных из-за медленного ответа.", totals["hedges"])
+        metric("hedge_wins", "gauge", "Дублей, ответивших раньше основного запроса.", totals["hedge_wins"])
+        metric("fallback_requests", "gauge", "Запросов, на которые ответила резервная модель каскада.",
+               totals["fallback_requests"])
+        metric("parse_milliseconds", "gauge", "Время извлечения текста глав.", totals["parse_ms"])
+        metric("memory_hits", "gauge", "Фрагментов взято из памяти переводов.", totals["memory_hits"])
+        metric("duplicates_reused", "gauge", "Повторов документов с переводом оригинала.", totals["duplicates_reused"])
+        metric("boilerplate_skipped", "gauge", "Служебных страниц без перевода.", totals["boilerplate_skipped"])
+        metric("continuations", "gauge", "Запросов-продолжений для оборванных ответов.", totals["continuations"])
+        metric("truncated_kept", "gauge", "Оборванных ответов, принятых без продолжения.", totals["truncated_kept"])
+        metric("short_translations", "gauge", "Полных ответов подозрительно короче исходника.",
+               totals["short_translations"])
+        for phase, seconds in sorted(report["phases"].items()):
+            metric("phase_seconds", "gauge", "Время по этапам.", seconds, f',phase="{_escape(phase)}"')
+        for reason, count in sorted(report["finish_reasons"].items()):
+            metric("finish_reason", "gauge", "Запросов по finish_reason.", count, f',reason="{_escape(reason)}"')
+        for model, count in sorted(report["models"].items()):
+            metric("requests_by_model", "gauge", "Запросов по ответившей модели.", count,
+                   f',served_by="{_escape(model)}"')
+        # HELP/TYPE для одной метрики должны встречаться один раз
+        seen = set()
+        deduplicated = []
+        for line in lines:
+            if line.startswith("#"):
+                if line in seen:
+                    continue
+                seen.add(line)
+            deduplicated.append(line)
+        _write_atomic(path, "\n".join(deduplicated) + "\n")
+
+
+class _Phase:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_phase_time(self.name, time.perf_counter() - self._started)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -0,0 +1,125 @@
+# core/pipeline.py
+import queue
+import threading
+
+# Опрос очередей с таймаутом, чтобы остановка и сбой соседней стадии замечались быстро
+POLL_INTERVAL = 0.2
+_END = object()
+
+
+def put_until(target_queue, item, should_abandon):
+    """Кладет элемент в ограниченную очередь; возвращает False, если ждать больше незачем."""
+    while True:
+        if should_abandon():
+            return False
+        try:
+            target_queue.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+
+
+class TranslationPipeline:
+    """
+    Конвейер из трех стадий, связанных ограниченными очередями:
+    подготовка (чтение и разбор глав, память переводов, сборка промптов) в одном потоке,
+    запросы к API в `concurrency` потоках и запись результатов на диск в одном потоке.
+    Пока воркеры ждут ответа, подготовка уже собирает следующие промпты, а запись
+    не задерживает следующий запрос. Размер очередей ограничивает память: подготовка
+    не уходит вперед больше чем на `depth` промптов.
+
+    prepare(request, write) возвращает задание для API или None и может сразу отдать
+    запись в write (например, перевод из памяти). translate(job, write) выполняет запрос.
+    Записи — вызываемые объекты без аргументов, их выполняет стадия записи по порядку.
+    """
+
+    def __init__(self, concurrency, stop_event, abort_event, depth=None):
+        self.concurrency = max(1, concurrency)
+        self.depth = depth or self.concurrency * 2
+        self.stop_event = stop_event
+        self.abort_event = abort_event
+        self._jobs = queue.Queue(maxsize=self.depth)
+        self._writes = queue.Queue(maxsize=self.depth)
+        self._errors = []
+        self._errors_lock = threading.Lock()
+
+    def _is_halted(self):
+        return self.stop_event.is_set() or self.abort_event.is_set()
+
+    def _fail(self, error):
+        with self._errors_lock:
+            self._errors.append(error)
+        self.abort_event.set()
+
+    def write(self, action):
+        # Готовые ответы сохраняются и после нажатия «Стоп»: токены за них уже потрачены
+        put_until(self._writes, action, self.abort_event.is_set)
+
+    def _prepare_stage(self, requests, prepare):
+        try:
+            for request in requests:
+                if self._is_halted():
+                    break
+                job = prepare(request, self.write)
+                if job is not None and not put_until(self._jobs, job, self._is_halted):
+                    break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(self.concurrency):
+                put_until(self._jobs, _END, self.abort_event.is_set)
+
+    def _translate_stage(self, translate):
+        while True:
+            try:
+                job = self._jobs.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if self.abort_event.is_set():
+                    return
+                continue
+            if job is _END:
+                return
+            if self._is_halted():
+                continue
+            try:
+                translate(job, self.write)
+            except Exception as e:
+                self._fail(e)
+                return
+
+    def _write_stage(self):
+        while True:
+            try:
+                action = self._writes.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if self.abort_event.is_set():
+                    return
+                continue
+            if action is _END:
+                return
+            try:
+                action()
+            except Exception as e:
+                self._fail(e)
+                return
+
+    def run(self, requests, prepare, translate):
+        writer = threading.Thread(target=self._write_stage, name="pipeline-writer", daemon=True)
+        preparer = threading.Thread(target=self._prepare_stage, args=(requests, prepare),
+                                    name="pipeline-prepare", daemon=True)
+        workers = [threading.Thread(target=self._translate_stage, args=(translate,),
+                                    name=f"pipeline-api-{n}", daemon=True)
+                   for n in range(self.concurrency)]
+        writer.start()
+        preparer.start()
+        for worker in workers:
+            worker.start()
+
+        preparer.join()
+        for worker in workers:
+            worker.join()
+        put_until(self._writes, _END, lambda: not writer.is_alive())
+        writer.join()
+
+        if self._errors:
+            raise self._errors[0]
@@ -0,0 +1,65 @@
+# core/progress_store.py
+import os
+import sqlite3
+import threading
+
+
+class ProgressStore:
+    """
+    Журнал готовых глав проекта в SQLite (режим WAL).
+    Отметка главы — одна короткая транзакция, поэтому сбой посреди записи не портит прогресс,
+    а несколько потоков и процессов могут писать одновременно.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS completed (chapter INTEGER PRIMARY KEY)")
+        # Какая модель перевела главу: по ней главы резервных моделей переводятся заново основной
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chapter_models (chapter INTEGER PRIMARY KEY, model TEXT)")
+        self._conn.commit()
+
+    def mark_completed(self, index):
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO completed (chapter) VALUES (?)", (int(index),))
+            self._conn.commit()
+
+    def set_completed(self, indices):
+        """Атомарно заменяет весь список готовых глав."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM completed")
+                self._conn.executemany("INSERT OR IGNORE INTO completed (chapter) VALUES (?)",
+                                       [(int(i),) for i in indices])
+                self._conn.execute("DELETE FROM chapter_models WHERE chapter NOT IN (SELECT chapter FROM completed)")
+
+    def record_model(self, index, model, is_fallback):
+        """
+        Запоминает модель главы. Если части главы переводили разные модели,
+        остается резервная: такую главу нужно переводить заново целиком.
+        """
+        verb = "INSERT OR REPLACE" if is_fallback else "INSERT OR IGNORE"
+        with self._lock:
+            self._conn.execute(f"{verb} INTO chapter_models (chapter, model) VALUES (?, ?)", (int(index), model))
+            self._conn.commit()
+
+    def chapter_models(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT chapter, model FROM chapter_models ORDER BY chapter"))
+
+    def completed(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT chapter FROM completed ORDER BY chapter")]
+
+    def compact(self):
+        """Переносит журнал WAL в основной файл и усекает его; операция атомарна на стороне SQLite."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
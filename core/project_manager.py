@@ -2,6 +2,9 @@
 import os
 import json
 import shutil
+import threading
+
+from .progress_store import ProgressStore
 
 PROJECTS_DIR = "projects"
 
@@ -9,6 +12,8 @@ class ProjectManager:
     def __init__(self):
         if not os.path.exists(PROJECTS_DIR):
             os.makedirs(PROJECTS_DIR)
+        self._stores = {}
+        self._stores_lock = threading.Lock()
 
     def get_project_list(self):
         return [f.replace('.json', '') for f in os.listdir(PROJECTS_DIR) if f.endswith('.json')]
@@ -16,35 +21,85 @@ class ProjectManager:
     def get_project_path(self, project_name):
         return os.path.join(PROJECTS_DIR, f"{project_name}.json")
 
-    def load(self, project_name):
+    def get_progress_path(self, project_name):
+        return os.path.join(PROJECTS_DIR, project_name, "progress.sqlite")
+
+    def progress_store(self, project_name):
+        with self._stores_lock:
+            store = self._stores.get(project_name)
+            if store is None:
+                is_new = not os.path.exists(self.get_progress_path(project_name))
+                store = ProgressStore(self.get_progress_path(project_name))
+                if is_new:
+                    # Старые проекты хранили прогресс прямо в JSON — переносим его в журнал
+                    store.set_completed(self._load_json(project_name).get("completed_chapters", []))
+                self._stores[project_name] = store
+            return store
+
+    def _load_json(self, project_name):
         filepath = self.get_project_path(project_name)
+        if not os.path.exists(filepath):
+            return {}
         with open(filepath, 'r', encoding='utf-8') as f:
             return json.load(f)
 
+    def load(self, project_name):
+        filepath = self.get_project_path(project_name)
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data['completed_chapters'] = self.progress_store(project_name).completed()
+        return data
+
     def save(self, project_name, project_data):
+        # Пишем во временный файл и подменяем им старый, чтобы сбой не оставил полузаписанный JSON
         filepath = self.get_project_path(project_name)
-        with open(filepath, 'w', encoding='utf-8') as f:
+        tmp_path = filepath + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(project_data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
 
     def delete(self, project_name):
         filepath = self.get_project_path(project_name)
         if os.path.exists(filepath):
-            temp_dir = os.path.join(PROJECTS_DIR, project_name, "temp")
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
+            with self._stores_lock:
+                store = self._stores.pop(project_name, None)
+            if store is not None:
+                store.close()
+            project_dir = os.path.join(PROJECTS_DIR, project_name)
+            if os.path.exists(project_dir):
+                shutil.rmtree(project_dir)
             os.remove(filepath)
 
     def update_completed_chapters(self, project_name, completed_list):
-        filepath = self.get_project_path(project_name)
-        with open(filepath, 'r+', encoding='utf-8') as f:
-            data = json.load(f)
-            data['completed_chapters'] = completed_list
-            f.seek(0)
-            json.dump(data, f, indent=4, ensure_ascii=False)
-            f.truncate()
+        self.progress_store(project_name).set_completed(completed_list)
+
+    def mark_chapter_completed(self, project_name, chapter_index):
+        self.progress_store(project_name).mark_completed(chapter_index)
+
+    def record_chapter_model(self, project_name, chapter_index, model, is_fallback):
+        self.progress_store(project_name).record_model(chapter_index, model, is_fallback)
+
+    def fallback_chapters(self, project_name, primary_model):
+        """Главы, переведенные не основной моделью: {номер главы: модель}."""
+        return {index: model for index, model in self.progress_store(project_name).chapter_models().items()
+                if model != primary_model}
+
+    def compact_progress(self, project_name):
+        self.progress_store(project_name).compact()
+
+    def close(self):
+        """Закрывает открытые журналы прогресса: открытые файлы SQLite (и -wal, -shm) мешают удалить проект."""
+        with self._stores_lock:
+            stores = list(self._stores.values())
+            self._stores.clear()
+        for store in stores:
+            store.close()
 
     def cleanup_project(self, project_name):
         temp_dir = os.path.join(PROJECTS_DIR, project_name, "temp")
         if os.path.exists(temp_dir):
             shutil.rmtree(temp_dir)
-        self.update_completed_chapters(project_name, [])
\ No newline at end of file
+        self.update_completed_chapters(project_name, [])
+        self.compact_progress(project_name)
@@ -0,0 +1,57 @@
+# core/prompts.py
+from .chunker import PACK_INSTRUCTIONS
+
+DEFAULT_PROMPT = (
+    "You are a professional literary translator. Translate the following text from English into Russian.\n"
+    "Preserve the original style, tone, and formatting (paragraphs, line breaks). "
+    "Translate the meaning accurately, not just word for word.\n"
+    "{glossary}\n"
+    "Text to translate:\n"
+    "---\n"
+    "{text_to_translate}"
+)
+
+
+def build_prompt_template(user_prompt):
+    """
+    Возвращает (шаблон, был_ли_старый_формат).
+    Старые проекты хранили только инструкцию без {text_to_translate}: ее дополняем стандартным промптом.
+    """
+    if "{text_to_translate}" in user_prompt:
+        return user_prompt, False
+    return f"{user_prompt}\n\n{DEFAULT_PROMPT}", True
+
+
+def build_prompt(template, glossary, source_text, is_packed=False):
+    """Финальный промпт: в шаблон вставляются встреченные правила глоссария и текст для перевода."""
+    return template.format(
+        glossary=glossary.instructions_for(source_text) + (PACK_INSTRUCTIONS if is_packed else ""),
+        text_to_translate=source_text
+    )
+
+
+class SplitPrompt:
+    """
+    Шаблон, разделенный для кеша контекста: статический префикс (инструкции и весь глоссарий)
+    загружается один раз, с каждой главой уходит только остаток шаблона с текстом.
+    RegEx-правила зависят от найденных в главе форм, поэтому с RegEx глоссарий остается в запросе.
+    """
+
+    def __init__(self, template, glossary, use_regex=False):
+        glossary_at = template.find("{glossary}")
+        text_at = template.find("{text_to_translate}")
+        cut = glossary_at if 0 <= glossary_at < text_at else text_at
+        # Префикс без подстановок: format() только снимает экранирование фигурных скобок
+        self.prefix = template[:cut].format()
+        self.tail = template[cut:]
+        self.glossary_cached = cut == glossary_at and not use_regex
+        if self.glossary_cached:
+            self.prefix += glossary.all_instructions()
+
+    def build(self, glossary, source_text, is_packed=False):
+        """Часть промпта, которая уходит с главой при использовании кеша."""
+        instructions = "" if self.glossary_cached else glossary.instructions_for(source_text)
+        return self.tail.format(
+            glossary=instructions + (PACK_INSTRUCTIONS if is_packed else ""),
+            text_to_translate=source_text
+        )
@@ -0,0 +1,104 @@
+# core/providers.py
+import datetime
+import threading
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+
+DEFAULT_PROVIDER = "gemini"
+
+
+class GeminiProvider:
+    """
+    Долгоживущий клиент Gemini для одного ключа.
+    genai.configure меняет глобальное состояние SDK, поэтому у каждого ключа свой
+    GenerativeServiceClient: его gRPC-канал остается открытым и переиспользуется всеми
+    главами и книгами, а модели кешируются по имени. Клиент gRPC потокобезопасен.
+    """
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self._lock = threading.Lock()
+        self._client = None
+        self._model_client = None
+        self._cache_client = None
+        self._models = {}
+
+    def _generative_client(self):
+        if self._client is None:
+            self._client = glm.GenerativeServiceClient(client_options={"api_key": self.api_key})
+        return self._client
+
+    def get_model(self, model_name):
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = genai.GenerativeModel(model_name)
+                model._client = self._generative_client()
+                self._models[model_name] = model
+            return model
+
+    def create_cached_model(self, model_name, prefix, ttl_seconds):
+        """
+        Загружает префикс промпта в кеш контекста и возвращает (модель, имя кеша).
+        Модель отвечает на generate_content так же, как обычная, но запросы ссылаются на кеш;
+        это то же, что GenerativeModel.from_cached_content, только через клиент этого ключа.
+        """
+        with self._lock:
+            if self._cache_client is None:
+                self._cache_client = glm.CacheServiceClient(client_options={"api_key": self.api_key})
+            cache_client = self._cache_client
+        full_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        cached = cache_client.create_cached_content(glm.CreateCachedContentRequest(cached_content=glm.CachedContent(
+            model=full_name,
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prefix)])],
+            ttl=datetime.timedelta(seconds=ttl_seconds),
+        )))
+        model = genai.GenerativeModel(model_name)
+        model._cached_content = cached.name
+        with self._lock:
+            model._client = self._generative_client()
+        return model, cached.name
+
+    def delete_cached_content(self, name):
+        self._cache_client.delete_cached_content(glm.DeleteCachedContentRequest(name=name))
+
+    def list_models(self):
+        """Модели, поддерживающие generateContent, без обращения к глобальной настройке SDK."""
+        with self._lock:
+            if self._model_client is None:
+                self._model_client = glm.ModelServiceClient(client_options={"api_key": self.api_key})
+            client = self._model_client
+        return [m.name.replace("models/", "") for m in client.list_models(glm.ListModelsRequest())
+                if "generateContent" in m.supported_generation_methods]
+
+
+_factories = {DEFAULT_PROVIDER: GeminiProvider}
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def register_provider(name, factory):
+    """
+    Подключает другой бэкенд: factory(api_key) должна вернуть объект с get_model(model_name)
+    и list_models(). Модель отвечает на generate_content(prompt, safety_settings=..., stream=...)
+    так же, как genai.GenerativeModel. Кеш контекста необязателен: create_cached_model(model_name,
+    prefix, ttl_seconds) и delete_cached_content(name), без них промпт всегда уходит целиком.
+    """
+    with _providers_lock:
+        _factories[name] = factory
+        for key in [key for key in _providers if key[0] == name]:
+            del _providers[key]
+
+
+def get_provider(api_key, name=DEFAULT_PROVIDER):
+    """Один провайдер на пару (бэкенд, ключ) на весь процесс: книги пакета и повторные запуски делят клиентов."""
+    with _providers_lock:
+        provider = _providers.get((name, api_key))
+        if provider is None:
+            factory = _factories.get(name)
+            if factory is None:
+                raise ValueError(f"Неизвестный провайдер модели: {name}")
+            provider = factory(api_key)
+            _providers[(name, api_key)] = provider
+        return provider
@@ -0,0 +1,180 @@
+# core/rate_limiter.py
+import re
+import threading
+import time
+from collections import deque
+
+# Лимиты (запросов в минуту, токенов в минуту) по умолчанию для бесплатного уровня.
+# Ищется самый длинный префикс имени модели, поэтому "gemini-2.5-flash-lite" не попадет под "gemini-2.5-flash".
+MODEL_LIMITS = {
+    "gemini-2.5-pro": (5, 250000),
+    "gemini-2.5-flash": (10, 250000),
+    "gemini-2.5-flash-lite": (15, 250000),
+    "gemini-2.0-flash": (15, 1000000),
+    "gemini-2.0-flash-lite": (30, 1000000),
+    "gemini-1.5-pro": (2, 32000),
+    "gemini-1.5-flash": (15, 1000000),
+    "gemini-1.5-flash-8b": (15, 1000000),
+    "gemini-1.0-pro": (15, 32000),
+}
+DEFAULT_LIMITS = (10, 250000)
+
+WINDOW_SECONDS = 60.0
+# Доля квоты, которую разрешено использовать: небольшой запас на расхождение часов и оценок токенов
+SAFETY_FACTOR = 0.95
+# Во сколько раз ответ (русский текст) длиннее исходника в токенах
+OUTPUT_TOKEN_RATIO = 1.3
+
+
+def lookup_by_model(table, model_name, default=None):
+    """Значение таблицы по самому длинному префиксу имени модели (без "models/") или default."""
+    name = model_name.replace("models/", "")
+    best = None
+    for prefix in table:
+        if name.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return table[best] if best else default
+
+
+def get_model_limits(model_name):
+    return lookup_by_model(MODEL_LIMITS, model_name, DEFAULT_LIMITS)
+
+
+def estimate_tokens(text):
+    """Грубая локальная оценка: ~4 символа ASCII или ~2 символа прочих алфавитов на токен."""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return int(ascii_chars / 4 + (len(text) - ascii_chars) / 2) + 1
+
+
+def estimate_request_tokens(prompt, source_text):
+    return estimate_tokens(prompt) + int(estimate_tokens(source_text) * OUTPUT_TOKEN_RATIO)
+
+
+def retry_after_seconds(error):
+    """Достает подсказку о времени ожидания из ошибки ResourceExhausted, если сервер ее прислал."""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            seconds = getattr(delay, "seconds", 0) + getattr(delay, "nanos", 0) / 1e9
+            if seconds > 0:
+                return seconds
+    message = str(error)
+    match = re.search(r"retry in ([\d.]+)\s*s", message, re.IGNORECASE)
+    if not match:
+        match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", message)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class RateLimiter:
+    """
+    Общий для всех воркеров ограничитель RPM/TPM.
+    Запросы учитываются в журнале за последние 60 секунд, поэтому в любом минутном окне
+    квота не превышается, а запросы равномерно разносятся по времени.
+    """
+
+    def __init__(self, rpm, tpm, min_interval=0.0):
+        self._condition = threading.Condition()
+        self.configure(rpm, tpm, min_interval)
+        self._ledger = deque()  # [время, токены]
+        self._tokens_in_window = 0
+        self._last_request = 0.0
+        self._blocked_until = 0.0
+
+    def configure(self, rpm, tpm, min_interval=0.0):
+        with self._condition:
+            self.rpm = max(1, int(rpm * SAFETY_FACTOR))
+            self.tpm = max(1, int(tpm * SAFETY_FACTOR))
+            self.min_interval = max(float(min_interval or 0), WINDOW_SECONDS / self.rpm)
+            self._condition.notify_all()
+
+    def _expire(self, now):
+        while self._ledger and now - self._ledger[0][0] >= WINDOW_SECONDS:
+            self._tokens_in_window -= self._ledger.popleft()[1]
+
+    def _wait_time(self, tokens, now):
+        waits = [self._blocked_until - now, self._last_request + self.min_interval - now]
+        if len(self._ledger) >= self.rpm:
+            waits.append(self._ledger[0][0] + WINDOW_SECONDS - now)
+        excess = self._tokens_in_window + tokens - self.tpm
+        if excess > 0:
+            # Ждем, пока из окна уйдет достаточно старых записей
+            freed = 0
+            for stamp, spent in self._ledger:
+                freed += spent
+                if freed >= excess:
+                    waits.append(stamp + WINDOW_SECONDS - now)
+                    break
+        return max(waits)
+
+    def try_acquire(self, tokens):
+        """
+        Неблокирующая попытка занять квоту.
+        Возвращает (билет, 0) при успехе или (None, сколько секунд ждать).
+        """
+        tokens = min(max(1, int(tokens)), self.tpm)
+        with self._condition:
+            now = time.monotonic()
+            self._expire(now)
+            wait = self._wait_time(tokens, now)
+            if wait > 0:
+                return None, wait
+            ticket = [now, tokens]
+            self._ledger.append(ticket)
+            self._tokens_in_window += tokens
+            self._last_request = now
+            return ticket, 0
+
+    def acquire(self, tokens, is_halted=None):
+        """
+        Блокирует поток до появления квоты на запрос стоимостью `tokens`.
+        Возвращает билет для последующей сверки или None, если работа остановлена.
+        """
+        while True:
+            if is_halted and is_halted():
+                return None
+            ticket, wait = self.try_acquire(tokens)
+            if ticket is not None:
+                return ticket
+            # Короткие ожидания, чтобы быстро реагировать на остановку
+            with self._condition:
+                self._condition.wait(min(wait, 0.5))
+
+    def reconcile(self, ticket, actual_tokens):
+        """Заменяет оценку стоимости запроса фактическим числом токенов из ответа."""
+        if ticket is None or not actual_tokens:
+            return
+        with self._condition:
+            actual_tokens = int(actual_tokens)
+            if any(entry is ticket for entry in self._ledger):
+                self._tokens_in_window += actual_tokens - ticket[1]
+            ticket[1] = actual_tokens
+            self._condition.notify_all()
+
+    def block_for(self, seconds):
+        """Приостанавливает все запросы через этот ограничитель (например, после ResourceExhausted)."""
+        with self._condition:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+
+_shared_limiters = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_limiter(api_key, model_name, rpm=None, tpm=None, min_interval=0.0):
+    """Один ограничитель на пару ключ+модель, чтобы параллельные прогоны делили одну квоту."""
+    default_rpm, default_tpm = get_model_limits(model_name)
+    rpm = rpm or default_rpm
+    tpm = tpm or default_tpm
+    with _shared_lock:
+        limiter = _shared_limiters.get((api_key, model_name))
+        if limiter is None:
+            limiter = RateLimiter(rpm, tpm, min_interval)
+            _shared_limiters[(api_key, model_name)] = limiter
+        else:
+            limiter.configure(rpm, tpm, min_interval)
+        return limiter
@@ -0,0 +1,95 @@
+# core/translation_memory.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from .project_manager import PROJECTS_DIR
+
+TM_PATH = os.path.join(PROJECTS_DIR, "translation_memory.sqlite")
+DEFAULT_TM_MAX_MB = 200
+# При вытеснении чистим с запасом, чтобы не удалять по одной записи на каждой вставке
+EVICTION_TARGET = 0.9
+
+
+def normalize_source(text):
+    """Схлопывает пробелы внутри строк и убирает пустые строки, чтобы мелкие различия верстки не мешали совпадению."""
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def make_key(source_text, model_name, prompt_template, glossary):
+    digest = hashlib.sha256()
+    for part in (normalize_source(source_text), model_name, prompt_template, glossary):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class TranslationMemory:
+    """
+    Дисковая память переводов (SQLite) с вытеснением давно не использованных записей по размеру.
+    Одно соединение используется из всех воркеров под блокировкой.
+    """
+
+    def __init__(self, path=TM_PATH, max_mb=DEFAULT_TM_MAX_MB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tm ("
+            "key TEXT PRIMARY KEY, translation TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tm_last_used ON tm(last_used)")
+        self._conn.commit()
+        self._total_bytes = self._stored_bytes()
+
+    def _stored_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM tm").fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT translation FROM tm WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE tm SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, translation):
+        size = len(translation.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tm (key, translation, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, translation, size, time.time())
+            )
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Счетчик в памяти приблизителен (замены, другие процессы), поэтому перед вытеснением пересчитываем
+        total = self._stored_bytes()
+        if total <= self.max_bytes:
+            self._total_bytes = total
+            return
+        target = self.max_bytes * EVICTION_TARGET
+        for key, size in self._conn.execute("SELECT key, size FROM tm ORDER BY last_used").fetchall():
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM tm WHERE key = ?", (key,))
+            total -= size
+        self._total_bytes = total
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -4,201 +4,845 @@ import os
 import time
 import re
 import shutil
-import google.generativeai as genai
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
-from docx import Document
-from google.api_core.exceptions import ResourceExhausted
-
+import threading
+from google.api_core.exceptions import (DeadlineExceeded, NotFound, PermissionDenied, ResourceExhausted,
+                                        Unauthenticated)
+
+from .cancellation import (DEFAULT_REQUEST_TIMEOUT, RequestCancelled, RequestTimeout, await_result, call_async,
+                           wait_first)
+from .checkpoint import StreamCheckpoint, split_for_resume
+from .chunker import DEFAULT_CHUNK_TOKENS, Chapter, Segment, TranslationRequest, plan_requests
+from .context_cache import DEFAULT_CACHE_TTL_SECONDS, ContextCache
+from .dedup import DEFAULT_SKIP_PATTERNS, BoilerplateFilter, DuplicateIndex
+from .docx_writer import FRAGMENTS_DIRNAME, DocxAssembler
+from .epub_reader import LazyEpub
+from .estimator import LiveEstimate
+from .glossary import Glossary
+from .hedging import DEFAULT_HEDGE_MAX_FRACTION, HedgePolicy
+from .html_text import extract_chapter
+from .key_pool import KeyPool
+from .metrics import REPORT_FILENAME, RequestStats, RunMetrics
+from .pipeline import TranslationPipeline
 from .project_manager import PROJECTS_DIR, ProjectManager
-
-
-def translation_process(project_data, progress_queue, stop_event):
+from .prompts import SplitPrompt, build_prompt, build_prompt_template
+from .providers import DEFAULT_PROVIDER
+from .rate_limiter import estimate_request_tokens, estimate_tokens, retry_after_seconds
+from .translation_memory import DEFAULT_TM_MAX_MB, TranslationMemory, make_key
+from .truncation import MAX_CONTINUATIONS, is_truncated, output_budget, output_cap, short_translation
+
+SAFETY_SETTINGS = {
+    "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
+    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
+    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
+}
+MAX_RETRIES = 5
+# Базовая пауза после ResourceExhausted, если сервер не подсказал время ожидания
+BASE_RETRY_DELAY = 10
+CHAPTER_FILE_RE = re.compile(r"chapter_(\d{4})\.txt$")
+# Контрольные точки потока (.partial) и готовые части длинных глав (.tmp)
+PARTIAL_FILE_RE = re.compile(r"chapter_\d{4}.*\.(partial|tmp)$")
+
+
+def _has_partial_work(temp_dir):
+    """Есть ли в temp незавершенная работа прошлого запуска, даже если ни одна глава еще не готова."""
+    if not os.path.isdir(temp_dir):
+        return False
+    return any(PARTIAL_FILE_RE.match(filename) for filename in os.listdir(temp_dir))
+
+
+def _read_chapter_file(path):
+    """Файл главы в temp: первая строка — <h1>заголовок</h1>, дальше перевод."""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().split('\n', 1)
+    title = content[0].replace("<h1>", "").replace("</h1>", "")
+    return title, content[1] if len(content) > 1 else ""
+
+
+class PreparedRequest:
+    """
+    Запрос, готовый к отправке: промпт собран, продолжение после сбоя учтено.
+    cached_prompt — тот же запрос без статического префикса, для ключей с кешем контекста.
+    """
+
+    def __init__(self, request, prompt, source_text, checkpoint=None, resumed_prefix="", cached_prompt=None):
+        self.request = request
+        self.prompt = prompt
+        self.cached_prompt = cached_prompt
+        self.source_text = source_text
+        self.checkpoint = checkpoint
+        self.resumed_prefix = resumed_prefix
+        self.prepared_at = time.perf_counter()
+
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", 0) if usage else 0
+
+
+def _finish_reason_name(response):
+    feedback = getattr(response, "prompt_feedback", None)
+    if feedback and feedback.block_reason:
+        return f"BLOCKED_{feedback.block_reason.name}"
+    candidates = getattr(response, "candidates", None)
+    if candidates and candidates[0].finish_reason:
+        return candidates[0].finish_reason.name
+    return None
+
+
+def _record_usage(stats, response, prompt, translated_text):
+    # Без usage_metadata (старые версии SDK, обрыв потока) считаем по оценке
+    usage = getattr(response, "usage_metadata", None)
+    stats.prompt_tokens = (getattr(usage, "prompt_token_count", 0) if usage else 0) or estimate_tokens(prompt)
+    stats.output_tokens = (getattr(usage, "candidates_token_count", 0) if usage else 0) or estimate_tokens(translated_text)
+    stats.cached_tokens = (getattr(usage, "cached_content_token_count", 0) if usage else 0) or 0
+    stats.finish_reason = _finish_reason_name(response)
+
+
+def _stream_response(model, prompt, checkpoint, chapter_label, progress_queue, is_halted, timeout,
+                     generation_config=None):
+    """
+    Получает ответ потоком, сразу дописывая фрагменты в файл контрольной точки.
+    Поток читается во вспомогательном потоке, чтобы остановка срабатывала и между фрагментами.
+    Срок timeout отсчитывается от последнего фрагмента: длинный ответ, который идет, не обрывается.
+    Брошенный по сроку или остановке поток больше не пишет в контрольную точку.
+    Возвращает ответ или None, если работа остановлена посреди потока; по сроку бросает RequestTimeout.
+    """
+    checkpoint.begin(checkpoint.prefix)
+    started = time.monotonic()
+    lock = threading.Lock()
+    abandoned = []
+    progress = {"first_chunk_at": None, "last_chunk_at": started, "received": 0}
+
+    def consume():
+        response = model.generate_content(prompt, safety_settings=SAFETY_SETTINGS, stream=True,
+                                          generation_config=generation_config)
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            with lock:
+                if abandoned:
+                    return None
+                if progress["first_chunk_at"] is None:
+                    progress["first_chunk_at"] = time.monotonic()
+                checkpoint.write(text)
+                progress["received"] += len(text)
+                progress["last_chunk_at"] = time.monotonic()
+            if is_halted():
+                return None
+        return response
+
+    future = call_async(consume)
+    try:
+        while True:
+            try:
+                wait_first([future], is_halted, progress["last_chunk_at"] + timeout)
+                break
+            except RequestTimeout:
+                # Пока ждали, мог прийти фрагмент: тогда срок сдвигается
+                if time.monotonic() - progress["last_chunk_at"] >= timeout:
+                    raise
+        response = future.result()
+    except RequestCancelled:
+        return None
+    finally:
+        with lock:
+            abandoned.append(True)
+            checkpoint.close()
+
+    first_chunk_at = progress["first_chunk_at"]
+    if response is not None and first_chunk_at is not None:
+        stream_seconds = max(time.monotonic() - first_chunk_at, 1e-6)
+        progress_queue.put(("log", f"Глава {chapter_label}: первый фрагмент через {first_chunk_at - started:.1f} с, "
+                                   f"поток {progress['received'] / stream_seconds:.0f} симв./с"))
+    return response
+
+
+def _received_text(checkpoint):
+    """Текст, который последняя попытка успела получить потоком, без подтвержденного префикса."""
+    received = checkpoint.load()
+    if checkpoint.prefix:
+        return received[len(checkpoint.prefix) + 1:]
+    return received
+
+
+def _generate_async(model, prompt, timeout, generation_config=None):
+    """Запрос без потока в отдельном потоке; срок передается и в сам вызов, чтобы зависшее соединение закрылось."""
+    return call_async(lambda: model.generate_content(prompt, safety_settings=SAFETY_SETTINGS,
+                                                     generation_config=generation_config,
+                                                     request_options={"timeout": timeout}))
+
+
+def _generation_config(slot, max_output_tokens):
+    """Предел длины ответа для запроса по модели ключа (у резервной предел и минимум могут быть другими)."""
+    if not max_output_tokens:
+        return None
+    return {"max_output_tokens": output_cap(slot.model_name, max_output_tokens)}
+
+
+def _slot_suffix(key_pool, slot):
+    """Ключ и резервная модель для строк лога; с одним ключом и основной моделью — пусто."""
+    parts = []
+    if len(key_pool.key_names) > 1:
+        parts.append(f"ключ '{slot.name}'")
+    if slot.tier:
+        parts.append(f"резервная модель {slot.model_name}")
+    return "".join(f", {part}" for part in parts)
+
+
+def _slot_model(slot, prompt, context_cache, cached_prompt):
+    """Модель и промпт для ключа: с кешем контекста уходит запрос без статического префикса."""
+    cached_model = context_cache.model_for(slot) if context_cache is not None and cached_prompt else None
+    if cached_model is not None:
+        return cached_model, cached_prompt, True
+    return slot.model, prompt, False
+
+
+def _hedged_generate(key_pool, slot, ticket, model, request_prompt, hedging, estimated_tokens, prompt,
+                     context_cache, cached_prompt, chapter_label, progress_queue, stats, is_halted, timeout, deadline,
+                     max_output_tokens=None):
+    """
+    Запрос с дублированием: если ответа нет дольше порога политики, такой же запрос уходит
+    через другой ключ (или тот же, если другого нет), побеждает первый успешный ответ.
+    Проигравший вызов не прерывается, его результат просто не используется.
+    Оба запроса укладываются в один срок попытки deadline.
+    Возвращает (ответ, слот, билет) победителя; если оба запроса упали, бросает ошибку основного.
+    """
+    primary = _generate_async(model, request_prompt, timeout, _generation_config(slot, max_output_tokens))
+    hedging.record_request()
+    threshold = hedging.threshold()
+    if threshold is None or wait_first([primary], is_halted, deadline, threshold) or not hedging.try_hedge():
+        return await_result(primary, is_halted, deadline), slot, ticket
+    # Дубль имеет смысл только сразу: ждать квоту для него дольше, чем ждать основной ответ
+    hedge_slot, hedge_ticket = key_pool.try_acquire(estimated_tokens, avoid=slot)
+    if hedge_slot is None:
+        hedging.cancel_hedge()
+        return await_result(primary, is_halted, deadline), slot, ticket
+
+    hedge_model, hedge_prompt, _ = _slot_model(hedge_slot, prompt, context_cache, cached_prompt)
+    stats.hedged = True
+    progress_queue.put(("log", f"Глава {chapter_label}: ответа нет дольше {threshold:.1f} с, "
+                               f"дублируем запрос{_slot_suffix(key_pool, hedge_slot)}."))
+    hedge = _generate_async(hedge_model, hedge_prompt, max(deadline - time.monotonic(), 1e-3),
+                            _generation_config(hedge_slot, max_output_tokens))
+    pending = {primary: (slot, ticket), hedge: (hedge_slot, hedge_ticket)}
+    while pending:
+        done = wait_first(pending, is_halted, deadline)
+        for future in sorted(done, key=lambda f: f is not primary):
+            winner_slot, winner_ticket = pending.pop(future)
+            if future.exception() is not None:
+                continue
+            if future is hedge:
+                hedging.record_win()
+                stats.hedge_won = True
+            return future.result(), winner_slot, winner_ticket
+    return primary.result(), slot, ticket
+
+
+def _request_translation(key_pool, prompt, source_text, chapter_label, progress_queue, is_halted, checkpoint=None,
+                         stats=None, context_cache=None, cached_prompt=None, hedging=None,
+                         request_timeout=DEFAULT_REQUEST_TIMEOUT, max_output_tokens=None, resume_prompts=None):
+    """
+    Отправляет один запрос с повторами при превышении лимита.
+    Каждая попытка ограничена сроком request_timeout секунд: без ответа к сроку она повторяется.
+    Остановка прерывает ожидание ответа, не дожидаясь его.
+    max_output_tokens — предел длины ответа (generation_config), приводится к минимуму и пределу модели;
+    если весь предел ушел на рассуждение и ответ пустой (MAX_TOKENS), попытка повторяется без предела.
+    Каждая попытка сначала резервирует квоту у свободного ключа пула.
+    Если у ключа есть кеш контекста, уходит cached_prompt без статического префикса.
+    С политикой hedging медленный запрос без потока дублируется (см. _hedged_generate).
+    С контрольной точкой ответ запрашивается потоком и сохраняется по мере поступления.
+    Если поток оборвался (нет фрагментов к сроку, ошибка API), полученные полные абзацы остаются в префиксе,
+    а повтор запрашивает только непереведенный хвост: resume_prompts(хвост) возвращает для него (prompt, cached_prompt).
+    Попытки, паузы, задержку ответа и токены записывает в stats (RequestStats).
+    Возвращает переведенный текст всего source_text или пустую строку.
+    """
+    stats = stats if stats is not None else RequestStats()
+    translated_text = ""
+    received_text = ""
+    estimated_tokens = estimate_request_tokens(prompt, source_text)
+    # Исчерпанный ключ не должен съедать попытки главы, пока в пуле есть другие
+    max_attempts = MAX_RETRIES + len(key_pool.slots) - 1
+
+    for attempt in range(max_attempts):
+        if is_halted():
+            break
+        if attempt and checkpoint is not None and resume_prompts is not None:
+            # Без этого повтор переписал бы .partial старым префиксом и перевел бы полученное заново
+            done_text, tail = split_for_resume(source_text, _received_text(checkpoint))
+            if done_text:
+                checkpoint.prefix = f"{checkpoint.prefix}\n{done_text}" if checkpoint.prefix else done_text
+                received_text = f"{received_text}\n{done_text}" if received_text else done_text
+                source_text = tail
+                prompt, cached_prompt = resume_prompts(tail)
+                estimated_tokens = estimate_request_tokens(prompt, source_text)
+                progress_queue.put(("log", f"Глава {chapter_label}: {len(done_text.splitlines())} полученных абзацев "
+                                           f"сохранены, повтор запрашивает только непереведенный хвост."))
+        wait_started = time.perf_counter()
+        slot, ticket = key_pool.acquire(estimated_tokens, is_halted)
+        stats.wait_seconds += time.perf_counter() - wait_started
+        if slot is None:
+            break
+        stats.attempts = attempt + 1
+        stats.retries = attempt
+        key_suffix = _slot_suffix(key_pool, slot)
+        model, request_prompt, uses_cache = _slot_model(slot, prompt, context_cache, cached_prompt)
+        try:
+            progress_queue.put(
+                ("log", f"Глава {chapter_label}: Отправка запроса в API (попытка {attempt + 1}/{max_attempts}{key_suffix})..."))
+
+            request_started = time.perf_counter()
+            deadline = time.monotonic() + request_timeout
+            if checkpoint is None and hedging is not None:
+                response, slot, ticket = _hedged_generate(
+                    key_pool, slot, ticket, model, request_prompt, hedging, estimated_tokens, prompt,
+                    context_cache, cached_prompt, chapter_label, progress_queue, stats,
+                    is_halted, request_timeout, deadline, max_output_tokens)
+            elif checkpoint is None:
+                response = await_result(_generate_async(model, request_prompt, request_timeout,
+                                                        _generation_config(slot, max_output_tokens)),
+                                        is_halted, deadline)
+            else:
+                response = _stream_response(model, request_prompt, checkpoint, chapter_label, progress_queue,
+                                            is_halted, request_timeout, _generation_config(slot, max_output_tokens))
+                if response is None:
+                    break
+            stats.latency_seconds = time.perf_counter() - request_started
+            slot.limiter.reconcile(ticket, _usage_tokens(response))
+            key_pool.report_success(slot)
+            stats.model = slot.model_name
+            if hedging is not None and checkpoint is None:
+                hedging.record_latency(stats.latency_seconds)
+
+            try:
+                translated_text = response.text
+            except ValueError:
+                if max_output_tokens and _finish_reason_name(response) == "MAX_TOKENS":
+                    # Предел ушел на рассуждение модели (2.5), текста нет: повторяем без предела
+                    max_output_tokens = None
+                    stats.empty_max_tokens += 1
+                    progress_queue.put(("log", f"⚠️ Глава {chapter_label}: ответ пустой, предел выходных токенов "
+                                               f"исчерпан до начала текста. Повторяем запрос без предела."))
+                    continue
+                finish_reason = "Неизвестно"
+                if response.prompt_feedback and response.prompt_feedback.block_reason:
+                    finish_reason = f"Заблокировано по причине: {response.prompt_feedback.block_reason.name}"
+                elif response.candidates and response.candidates[0].finish_reason:
+                    finish_reason = f"Причина завершения: {response.candidates[0].finish_reason.name} ({response.candidates[0].finish_reason.value})"
+
+                progress_queue.put(("log", f"⚠️ Глава {chapter_label}: Ответ от API пустой. {finish_reason}"))
+                translated_text = ""
+            _record_usage(stats, response, prompt, translated_text)
+            if received_text and translated_text:
+                translated_text = received_text + "\n" + translated_text
+
+            progress_queue.put(("log", f"Глава {chapter_label}: Ответ от API получен."))
+            break
+
+        except ResourceExhausted as e:
+            # Подсказка сервера точнее слепого экспоненциального ожидания
+            retry_delay = key_pool.report_exhausted(slot, retry_after_seconds(e) or BASE_RETRY_DELAY * 2 ** attempt)
+            stats.exhausted += 1
+            stats.backoff_seconds += retry_delay
+            progress_queue.put((
+                "log",
+                f"⚠️ Превышен лимит API для главы {chapter_label}{key_suffix}. Попытка {attempt + 1}/{max_attempts}. "
+                f"Запросы через этот ключ приостановлены на {retry_delay:.0f} сек..."
+            ))
+
+        except RequestCancelled:
+            # Ответ брошенного вызова никто не ждет: поток с ним фоновый и завершится сам
+            break
+
+        except (RequestTimeout, DeadlineExceeded):
+            stats.timeouts += 1
+            progress_queue.put(("log", f"⚠️ Глава {chapter_label}: нет ответа за {request_timeout:.0f} сек{key_suffix}. "
+                                       f"Попытка {attempt + 1}/{max_attempts}, повторяем запрос..."))
+
+        except NotFound as e:
+            if not uses_cache:
+                progress_queue.put(("log", f"Критическая ошибка API: {e}"))
+                raise e
+            # Кеш истек или удален: повторяем с полным промптом
+            context_cache.drop(slot)
+            progress_queue.put(("log", f"⚠️ Кеш контекста ключа '{slot.name}' недоступен, "
+                                       f"дальше промпт отправляется целиком: {e}"))
+
+        except (PermissionDenied, Unauthenticated) as e:
+            if not key_pool.disable(slot):
+                progress_queue.put(("log", f"Критическая ошибка API: {e}"))
+                raise e
+            progress_queue.put(("log", f"⚠️ Ключ '{slot.name}' отклонен API и исключен из пула: {e}"))
+
+        except Exception as e:
+            progress_queue.put(("log", f"Критическая ошибка API: {e}"))
+            raise e
+
+    return translated_text
+
+
+def _write_run_report(metrics, status, project_data, progress_queue):
+    """JSON-отчет прогона (по умолчанию в папке проекта) и, если задан путь, textfile для Prometheus."""
+    try:
+        report = metrics.report(status)
+        report_path = project_data.get("report_path") or os.path.join(
+            PROJECTS_DIR, project_data["project_name"], REPORT_FILENAME)
+        metrics.write_json(report_path, report)
+        if project_data.get("prometheus_path"):
+            metrics.write_prometheus(project_data["prometheus_path"], report)
+        totals = report["totals"]
+        progress_queue.put(("log", f"Отчет о прогоне: {report_path} ({totals['requests']} запросов, "
+                                   f"{totals['prompt_tokens']} + {totals['output_tokens']} токенов, "
+                                   f"{totals['chapters_per_minute']} глав/мин)."))
+    except OSError as e:
+        progress_queue.put(("log", f"⚠️ Не удалось сохранить отчет о прогоне: {e}"))
+
+
+def translation_process(project_data, progress_queue, stop_event, duplicates=None):
+    """
+    Переводит одну книгу. duplicates — общий для пакета DuplicateIndex, чтобы повторяющиеся
+    документы серии переводились один раз; без него индекс заводится на книгу.
+    """
     pm = ProjectManager()
+    metrics = RunMetrics(project_data.get("project_name"), project_data.get("model"), progress_queue)
+    run_status = "error"
     try:
         project_name = project_data["project_name"]
         completed_chapters_list = project_data["completed_chapters_list"]
 
-        user_prompt = project_data["prompt"]
-        if "{text_to_translate}" not in user_prompt:
+        final_prompt_template, is_legacy_prompt = build_prompt_template(project_data["prompt"])
+        if is_legacy_prompt:
             progress_queue.put(("log", "⚠️ Обнаружен старый формат промпта. Автоматически модернизируем его."))
-            modern_prompt_template = (
-                "{user_prompt_text}\n\n"
-                "You are a professional literary translator. Translate the following text from English into Russian.\n"
-                "Preserve the original style, tone, and formatting (paragraphs, line breaks). "
-                "Translate the meaning accurately, not just word for word.\n"
-                "{glossary}\n"
-                "Text to translate:\n"
-                "---\n"
-                "{text_to_translate}"
-            )
-            final_prompt_template = modern_prompt_template.format(
-                user_prompt_text=user_prompt,
-                glossary="{glossary}",
-                text_to_translate="{text_to_translate}"
-            )
-        else:
-            final_prompt_template = user_prompt
 
         temp_dir = os.path.join(PROJECTS_DIR, project_name, "temp")
-        if not project_data["resume"]:
+        # GUI и CLI продолжают проект, только если есть готовые главы; прогон, остановленный
+        # до первой готовой главы, оставляет лишь контрольные точки — их тоже нельзя стирать
+        resume = project_data["resume"]
+        if not resume and _has_partial_work(temp_dir):
+            resume = True
+            progress_queue.put(("log", "Найдены недописанные главы прошлого запуска, продолжаем с сохраненного места."))
+        if not resume:
             if os.path.exists(temp_dir):
                 shutil.rmtree(temp_dir)
             completed_chapters_list = []
+            pm.update_completed_chapters(project_name, [])
+        elif project_data.get("rerun_fallback"):
+            # Главы, которые перевела резервная модель каскада, переводятся заново основной
+            fallback = pm.fallback_chapters(project_name, project_data["model"])
+            if fallback:
+                completed_chapters_list = [i for i in completed_chapters_list if i not in fallback]
+                pm.update_completed_chapters(project_name, completed_chapters_list)
+                progress_queue.put(("log", f"Заново основной моделью: главы "
+                                           f"{', '.join(str(i + 1) for i in fallback)}."))
         os.makedirs(temp_dir, exist_ok=True)
-
-        genai.configure(api_key=project_data["api_key"])
-        model = genai.GenerativeModel(project_data["model"])
-
-        # 1. Парсим глоссарий из текстового поля
-        glossary = {}
-        for line in project_data["glossary"].split('\n'):
-            if '->' in line and not line.strip().startswith('#'):
-                parts = line.split('->', 1)
-                original, translation = parts[0].strip(), parts[1].strip()
-                if original and translation:
-                    glossary[original] = translation
-
-        # 2. Формируем инструкции для AI на основе глоссария
-        glossary_instructions = ""
-        if glossary:
-            instructions_list = ["\nStrictly follow these translation rules:"]
-            for original, translation in glossary.items():
-                original_clean = original.strip("'\"")
-                translation_clean = translation.strip("'\"")
-                instructions_list.append(f'- Translate "{original_clean}" as "{translation_clean}".')
-            glossary_instructions = "\n".join(instructions_list) + "\n"
-
+        # Фрагменты DOCX готовятся по мере перевода глав, в конце их остается только склеить
+        assembler = DocxAssembler(os.path.join(temp_dir, FRAGMENTS_DIRNAME))
+
+        # Темп задают лимиты RPM/TPM модели на каждом ключе; "delay" остается минимальным интервалом между запросами
+        api_keys = project_data.get("api_keys") or {"default": project_data["api_key"]}
+        key_pool = KeyPool(
+            api_keys, project_data["model"],
+            rpm=project_data.get("rpm"), tpm=project_data.get("tpm"),
+            min_interval=project_data.get("delay", 0),
+            provider=project_data.get("provider", DEFAULT_PROVIDER),
+            fallback_models=project_data.get("fallback_models") or ()
+        )
+        limiter = key_pool.slots[0].limiter
+
+        # 1. Компилируем глоссарий один раз: в каждый запрос попадут только встреченные в нем термины
+        glossary = Glossary(project_data["glossary"], project_data.get("use_regex", False))
+        for error in glossary.errors:
+            progress_queue.put(("log", f"⚠️ Глоссарий: неверное регулярное выражение, используется как текст: {error}"))
+        if glossary.regex_like:
+            progress_queue.put(("log", f"⚠️ Глоссарий: записи похожи на регулярные выражения, но RegEx выключен, "
+                                       f"поэтому они передаются модели всегда: {', '.join(glossary.regex_like)}"))
+
+        # Служебные страницы по списку шаблонов не переводятся, повторы документов переводятся один раз
+        boilerplate = None
+        if project_data.get("skip_boilerplate", False):
+            boilerplate = BoilerplateFilter(project_data.get("skip_patterns") or DEFAULT_SKIP_PATTERNS)
+            for error in boilerplate.errors:
+                progress_queue.put(("log", f"⚠️ Список служебных страниц: неверное регулярное выражение пропущено: {error}"))
+        if duplicates is None and project_data.get("deduplicate", True):
+            duplicates = DuplicateIndex(project_data.get("near_duplicates", False))
+        duplicate_owner = object()
+        canonical_entries = {}
+
+        concurrency = max(1, int(project_data.get("concurrency", 1)))
+        use_stream = project_data.get("stream", False)
+        request_timeout = float(project_data.get("request_timeout") or DEFAULT_REQUEST_TIMEOUT)
+        # Медленные запросы дублируются; порог — перцентиль задержек этого прогона
+        hedging = None
+        if project_data.get("hedge_percentile"):
+            hedging = HedgePolicy(float(project_data["hedge_percentile"]),
+                                  float(project_data.get("hedge_max_fraction", DEFAULT_HEDGE_MAX_FRACTION)))
+            if use_stream:
+                progress_queue.put(("log", "Дублирование запросов работает только без потокового ответа: "
+                                           "главы с контрольной точкой не дублируются."))
         progress_queue.put(("log", f"Используется модель: {project_data['model']}"))
-        book = epub.read_epub(project_data["epub_path"])
-        items = list(book.get_items_of_type(ebooklib.ITEM_DOCUMENT))
+        if len(key_pool.model_names) > 1:
+            progress_queue.put(("log", f"Каскад моделей при исчерпании квоты: {' → '.join(key_pool.model_names)}"))
+        progress_queue.put(("log", f"Лимиты на ключ: {limiter.rpm} запросов/мин, {limiter.tpm} токенов/мин."))
+        if len(glossary):
+            progress_queue.put(("log", f"Глоссарий: {len(glossary)} записей, в промпт попадут только встреченные."))
+        if len(key_pool.key_names) > 1:
+            progress_queue.put(("log", f"Пул ключей: {', '.join(key_pool.key_names)}"))
+        # Книга читается лениво: глава распаковывается и разбирается только перед отправкой
+        book = LazyEpub(project_data["epub_path"])
+        items = book.documents
         total_items = len(items)
 
-        for i, item in enumerate(items):
-            if stop_event.is_set():
-                break
+        # Общее состояние воркеров: список готовых глав, счетчик прогресса и части глав защищены одной блокировкой
+        state_lock = threading.RLock()
+        abort_event = threading.Event()
+        done_count = [len([i for i in completed_chapters_list if i < total_items])]
 
-            if i in completed_chapters_list:
-                progress_queue.put(("log", f"Глава {i + 1} уже переведена. Пропускаем."))
-                progress_queue.put(("progress", (i + 1, total_items)))
-                continue
+        def is_halted():
+            return stop_event.is_set() or abort_event.is_set()
 
-            progress_queue.put(("progress", (i, total_items)))
-            soup = BeautifulSoup(item.get_content(), 'html.parser')
-            original_text = soup.get_text(separator='\n', strip=True)
-            if not original_text.strip():
-                progress_queue.put(("log", f"Глава {i + 1} пустая, пропускаем."))
+        def mark_completed(i):
+            with state_lock:
                 completed_chapters_list.append(i)
-                pm.update_completed_chapters(project_name, completed_chapters_list)
-                progress_queue.put(("progress", (i + 1, total_items)))
-                continue
-
-            # 3. Собираем финальный промпт, вставляя инструкции и текст для перевода
-            # Используем `final_prompt_template`, который был подготовлен в начале функции
-            prompt = final_prompt_template.format(
-                glossary=glossary_instructions,
-                text_to_translate=original_text
-            )
-
-            translated_text = ""
-            max_retries = 5
-            retry_delay = 10
-
-            safety_settings = {
-                "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
-                "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
-                "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
-                "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
-            }
-
-            for attempt in range(max_retries):
-                if stop_event.is_set():
-                    break
-                try:
-                    progress_queue.put(
-                        ("log", f"Глава {i + 1}: Отправка запроса в API (попытка {attempt + 1}/{max_retries})..."))
+                pm.mark_chapter_completed(project_name, i)
+                done_count[0] += 1
+                progress_queue.put(("progress", (done_count[0], total_items)))
 
-                    response = model.generate_content(prompt, safety_settings=safety_settings)
+        # Память переводов: ключ учитывает текст, модель, шаблон промпта и глоссарий
+        memory = None
+        if project_data.get("use_translation_memory", True):
+            memory = TranslationMemory(max_mb=project_data.get("tm_max_mb", DEFAULT_TM_MAX_MB))
 
-                    try:
-                        translated_text = response.text
-                    except ValueError:
-                        finish_reason = "Неизвестно"
-                        if response.prompt_feedback and response.prompt_feedback.block_reason:
-                            finish_reason = f"Заблокировано по причине: {response.prompt_feedback.block_reason.name}"
-                        elif response.candidates and response.candidates[0].finish_reason:
-                            finish_reason = f"Причина завершения: {response.candidates[0].finish_reason.name} ({response.candidates[0].finish_reason.value})"
+        def segment_key(segment, model=None):
+            return make_key(segment.text, model or project_data["model"], final_prompt_template,
+                            project_data["glossary"])
 
-                        progress_queue.put(("log", f"⚠️ Глава {i + 1}: Ответ от API пустой. {finish_reason}"))
-                        translated_text = ""
-
-                    progress_queue.put(("log", f"Глава {i + 1}: Ответ от API получен."))
-                    break
-
-                except ResourceExhausted as e:
-                    progress_queue.put((
-                        "log",
-                        f"⚠️ Превышен лимит API для главы {i + 1}. Попытка {attempt + 1}/{max_retries}. "
-                        f"Ждем {retry_delay} секунд..."
-                    ))
-                    for _ in range(retry_delay):
-                        if stop_event.is_set(): break
-                        time.sleep(1)
-                    if stop_event.is_set(): break
-                    retry_delay *= 2
-
-                except Exception as e:
-                    progress_queue.put(("log", f"Критическая ошибка API: {e}"))
-                    raise e
-
-            if stop_event.is_set():
-                break
+        def write_chapter(chapter, translated_text):
+            temp_file_path = os.path.join(temp_dir, f"chapter_{chapter.index:04d}.txt")
+            with open(temp_file_path, 'w', encoding='utf-8') as f:
+                f.write(f"<h1>{chapter.title}</h1>\n{translated_text}")
+            assembler.add_chapter(chapter.index, chapter.title, translated_text)
+            mark_completed(chapter.index)
+            with state_lock:
+                entry = canonical_entries.pop(chapter.index, None)
+            if entry is not None:
+                duplicates.resolve(entry, translated_text)
+
+        def write_copy(chapter, source_label, translated_text):
+            progress_queue.put(("log", f"Глава {chapter.index + 1}: повтор документа «{source_label}», "
+                                       f"перевод взят у него."))
+            metrics.count("duplicates_reused")
+            write_chapter(chapter, translated_text)
+
+        def filter_chapter(chapter):
+            """Служебная страница остается без перевода, копия берет перевод оригинала. True — отправлять в API."""
+            pattern = boilerplate.match(chapter.text) if boilerplate is not None else None
+            if pattern is not None:
+                progress_queue.put(("log", f"Глава {chapter.index + 1}: служебная страница (шаблон «{pattern}»), "
+                                           f"оставлена без перевода."))
+                metrics.count("boilerplate_skipped")
+                write_chapter(chapter, chapter.text)
+                return False
+            if duplicates is None:
+                return True
+            label = f"{chapter.title}, {os.path.basename(project_data['epub_path'])}"
+            decision, data = duplicates.claim(duplicates.fingerprint(chapter.text), duplicate_owner, label,
+                                              lambda text, source, chapter=chapter: write_copy(chapter, source, text))
+            if decision == "ready":
+                write_copy(chapter, data[1], data[0])
+                return False
+            if decision == "wait":
+                progress_queue.put(("log", f"Глава {chapter.index + 1}: повтор документа, ждет перевода оригинала."))
+                return False
+            if data is not None:
+                with state_lock:
+                    canonical_entries[chapter.index] = data
+            return True
+
+        def part_path(segment):
+            return os.path.join(
+                temp_dir, f"chapter_{segment.chapter.index:04d}.part{segment.part_no + 1:02d}of{segment.part_count:02d}.tmp")
+
+        def partial_path(segment):
+            suffix = f".part{segment.part_no + 1:02d}of{segment.part_count:02d}" if segment.is_part else ""
+            return os.path.join(temp_dir, f"chapter_{segment.chapter.index:04d}{suffix}.partial")
+
+        def store_segment(segment, translated_text):
+            if not segment.is_part:
+                write_chapter(segment.chapter, translated_text)
+                return
+            # Части длинной главы хранятся отдельно, чтобы при возобновлении не переводить их заново
+            with open(part_path(segment), 'w', encoding='utf-8') as f:
+                f.write(translated_text)
+            with state_lock:
+                paths = [part_path(Segment(segment.chapter, "", n, segment.part_count))
+                         for n in range(segment.part_count)]
+                if not all(os.path.exists(path) for path in paths):
+                    return
+                texts = []
+                for path in paths:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        texts.append(f.read().strip())
+                write_chapter(segment.chapter, "\n".join(texts))
+                for path in paths:
+                    os.remove(path)
+
+        def build_prompts(source_text, is_packed):
+            """(полный промпт, промпт для ключей с кешем контекста или None) для текста главы или ее хвоста."""
+            prompt = build_prompt(final_prompt_template, glossary, source_text, is_packed)
+            cached_prompt = None
+            if context_cache is not None:
+                cached_prompt = split_prompt.build(glossary, source_text, is_packed)
+            return prompt, cached_prompt
+
+        def prepare_request(request, write):
+            """Локальная подготовка запроса: файлы частей, память переводов, контрольная точка и промпт."""
+            if not request.is_packed and request.segments[0].is_part and os.path.exists(part_path(request.segments[0])):
+                progress_queue.put(("log", f"Глава {request.label} уже переведена. Пропускаем."))
+                with open(part_path(request.segments[0]), 'r', encoding='utf-8') as f:
+                    write(lambda segment=request.segments[0], text=f.read(): store_segment(segment, text))
+                return None
+
+            if memory is not None:
+                missing = []
+                for segment in request.segments:
+                    cached = memory.get(segment_key(segment))
+                    if cached is None:
+                        missing.append(segment)
+                        continue
+                    progress_queue.put(("log", f"Глава {TranslationRequest([segment]).label}: перевод взят из памяти переводов."))
+                    metrics.count("memory_hits")
+                    write(lambda segment=segment, text=cached: store_segment(segment, text))
+                if not missing:
+                    return None
+                if len(missing) < len(request.segments):
+                    request = TranslationRequest(missing)
+
+            # Потоковый ответ пишется в файл главы по мере поступления; после сбоя или отмены
+            # перевод продолжается с последнего полного абзаца. Пакеты мелких глав идут без потока.
+            source_text = request.source_text()
+            checkpoint = None
+            resumed_prefix = ""
+            if use_stream and not request.is_packed:
+                checkpoint = StreamCheckpoint(partial_path(request.segments[0]))
+                resumed_prefix, source_text = split_for_resume(source_text, checkpoint.load())
+                checkpoint.prefix = resumed_prefix
+                if resumed_prefix:
+                    progress_queue.put(("log", f"Глава {request.label}: продолжаем с сохраненного места "
+                                               f"({len(resumed_prefix.splitlines())} абзацев уже переведено)."))
+
+            # 2. Собираем финальный промпт, вставляя инструкции и текст для перевода
+            # Используем `final_prompt_template`, который был подготовлен в начале функции
+            prompt, cached_prompt = build_prompts(source_text, request.is_packed)
+            # ETA уточняется по мере подготовки запросов: книга не разбирается отдельно ради оценки
+            progress_queue.put(("eta", live_estimate.add(prompt, source_text,
+                                                         [segment.chapter.index for segment in request.segments])))
+            return PreparedRequest(request, prompt, source_text, checkpoint, resumed_prefix, cached_prompt)
+
+        def save_results(segments, results, checkpoint, model, cacheable=True):
+            is_fallback = model != project_data["model"]
+            for segment, text in zip(segments, results):
+                # Перевод резервной модели хранится под ее именем: повтор основной моделью не возьмет его из памяти.
+                # Оборванный или подозрительно короткий перевод в память не попадает, чтобы следующий запуск переспросил API
+                if memory is not None and cacheable:
+                    memory.put(segment_key(segment, model), text)
+                pm.record_chapter_model(project_name, segment.chapter.index, model, is_fallback)
+                store_segment(segment, text)
+            if checkpoint is not None:
+                checkpoint.discard()
+
+        def complete_truncated(request, source_text, translated_text, stats):
+            """
+            Ответ, оборванный пределом выходных токенов (MAX_TOKENS), дополняется запросами-продолжениями:
+            переведенные абзацы остаются, в API уходит только непереведенный хвост исходника.
+            Подозрительно короткий полный ответ только отмечается в логе и отчете.
+            Возвращает (полный перевод, модель, stats последнего запроса, можно ли сохранить в память переводов);
+            если продолжение не удалось — (None, None, stats продолжения, False).
+            """
+            model = stats.model
+            chapters = [segment.chapter.index for segment in request.segments]
+            continuation = 0
+            while is_truncated(stats.finish_reason):
+                if continuation == MAX_CONTINUATIONS:
+                    progress_queue.put(("log", f"⚠️ Глава {request.label}: ответ все еще оборван после "
+                                               f"{MAX_CONTINUATIONS} продолжений. Перевод сохранен как есть."))
+                    metrics.count("truncated_kept")
+                    return translated_text, model, stats, False
+                done_text, tail = split_for_resume(source_text, translated_text)
+                if not done_text:
+                    progress_queue.put(("log", f"⚠️ Глава {request.label}: ответ оборван, но абзацы "
+                                               f"не сопоставить с исходником. Перевод сохранен как есть."))
+                    metrics.count("truncated_kept")
+                    return translated_text, model, stats, False
+                continuation += 1
+                source_paragraphs = len([line for line in source_text.split('\n') if line.strip()])
+                tail_paragraphs = len([line for line in tail.split('\n') if line.strip()])
+                progress_queue.put(("log", f"⚠️ Глава {request.label}: ответ оборван пределом выходных токенов, "
+                                           f"досылаем непереведенный хвост: {tail_paragraphs} из "
+                                           f"{source_paragraphs} абзацев."))
+                metrics.count("continuations")
+                label = f"{request.label} (продолжение {continuation})"
+                prompt, cached_prompt = build_prompts(tail, request.is_packed)
+                stats = RequestStats()
+                tail_text = _request_translation(key_pool, prompt, tail, label, progress_queue, is_halted, None, stats,
+                                                 context_cache, cached_prompt, hedging, request_timeout,
+                                                 output_budget(tail))
+                if stats.attempts:
+                    metrics.record_request(label, chapters, stats, 0.0)
+                if not tail_text:
+                    return None, None, stats, False
+                if stats.model != project_data["model"]:
+                    model = stats.model
+                # Перевод снова сопоставляется с исходником целиком: так следующий хвост считается от начала главы
+                translated_text = done_text + "\n" + tail_text
+
+            ratio = short_translation(source_text, translated_text)
+            if ratio is not None:
+                progress_queue.put(("log", f"⚠️ Глава {request.label}: перевод короче исходника в {ratio:.1f} раза, "
+                                           f"хотя модель закончила ответ. Проверьте, не пропущены ли абзацы."))
+                metrics.count("short_translations")
+            return translated_text, model, stats, ratio is None
+
+        def translate_request(job, write):
+            request = job.request
+            queue_seconds = time.perf_counter() - job.prepared_at
+            stats = RequestStats()
+            translated_text = _request_translation(key_pool, job.prompt, job.source_text, request.label,
+                                                   progress_queue, is_halted, job.checkpoint, stats,
+                                                   context_cache, job.cached_prompt, hedging, request_timeout,
+                                                   output_budget(job.source_text),
+                                                   lambda tail: build_prompts(tail, request.is_packed))
+            if stats.attempts:
+                metrics.record_request(request.label, [segment.chapter.index for segment in request.segments],
+                                       stats, queue_seconds)
+            if is_halted():
+                return
+
+            cacheable = False
+            if translated_text:
+                translated_text, model, stats, cacheable = complete_truncated(request, job.source_text,
+                                                                              translated_text, stats)
+                if is_halted():
+                    return
 
             if not translated_text:
+                metrics.count("failed_requests")
                 progress_queue.put(("log",
-                                    f"❌ Не удалось получить перевод для главы {i + 1} после {max_retries} попыток. Пропускаем."))
-                continue
-
-            temp_file_path = os.path.join(temp_dir, f"chapter_{i:04d}.txt")
-            with open(temp_file_path, 'w', encoding='utf-8') as f:
-                chapter_title_tag = soup.find(['h1', 'h2', 'h3'])
-                chapter_title = chapter_title_tag.get_text(strip=True) if chapter_title_tag else f"Глава {i + 1}"
-                f.write(f"<h1>{chapter_title}</h1>\n{translated_text}")
-
-            completed_chapters_list.append(i)
-            pm.update_completed_chapters(project_name, completed_chapters_list)
-
-            progress_queue.put(("progress", (i + 1, total_items)))
-            if not stop_event.is_set() and project_data["delay"] > 0:
-                progress_queue.put(("log", f"Задержка на {project_data['delay']} сек..."))
-                time.sleep(project_data["delay"])
+                                    f"❌ Не удалось получить перевод для главы {request.label} (попыток: {stats.attempts}). Пропускаем."))
+                return
+
+            if job.resumed_prefix:
+                translated_text = job.resumed_prefix + "\n" + translated_text
+
+            results = request.unpack(translated_text)
+            if results is None:
+                # Модель потеряла маркеры: переводим главы пакета по одной
+                progress_queue.put(("log", f"⚠️ Главы {request.label}: не удалось разобрать пакетный ответ, "
+                                           f"переводим главы по отдельности."))
+                for segment in request.segments:
+                    single = prepare_request(TranslationRequest([segment]), write)
+                    if single is not None:
+                        translate_request(single, write)
+                return
+
+            write(lambda: save_results(request.segments, results, job.checkpoint, model, cacheable))
+
+        def pending_chapters():
+            for i, item in enumerate(items):
+                if i in completed_chapters_list:
+                    progress_queue.put(("log", f"Глава {i + 1} уже переведена. Пропускаем."))
+                    continue
+                parse_started = time.perf_counter()
+                original_text, chapter_heading = extract_chapter(book.read(item))
+                metrics.record_parse(i, (time.perf_counter() - parse_started) * 1000)
+                if not original_text.strip():
+                    progress_queue.put(("log", f"Глава {i + 1} пустая, пропускаем."))
+                    metrics.count("skipped_empty")
+                    mark_completed(i)
+                    continue
+                chapter_title = chapter_heading if chapter_heading is not None else f"Глава {i + 1}"
+                chapter = Chapter(i, original_text, chapter_title)
+                if filter_chapter(chapter):
+                    yield chapter
+
+        progress_queue.put(("progress", (done_count[0], total_items)))
+        live_estimate = LiveEstimate(project_data)
+        if concurrency > 1:
+            progress_queue.put(("log", f"Параллельный режим: до {concurrency} запросов одновременно."))
+
+        # Инструкции и глоссарий одинаковы для всех глав: с кешем контекста они загружаются один раз на ключ
+        context_cache = None
+        split_prompt = None
+        if project_data.get("context_cache"):
+            split_prompt = SplitPrompt(final_prompt_template, glossary, project_data.get("use_regex", False))
+            context_cache = ContextCache(key_pool, project_data["model"], progress_queue,
+                                         project_data.get("provider", DEFAULT_PROVIDER))
+            if not context_cache.open(split_prompt.prefix,
+                                      project_data.get("context_cache_ttl", DEFAULT_CACHE_TTL_SECONDS)):
+                context_cache = None
+
+        # Длинные главы делятся, мелкие склеиваются; порядок в итоговой книге задается номером файла главы
+        chunk_tokens = int(project_data.get("chunk_tokens", DEFAULT_CHUNK_TOKENS))
+        # Подготовка, запросы к API и запись идут параллельно; очереди между стадиями ограничены,
+        # поэтому вперед готовится не больше двух запросов на воркер
+        pipeline = TranslationPipeline(concurrency, stop_event, abort_event)
+        try:
+            with metrics.phase("translate"):
+                pipeline.run(plan_requests(pending_chapters(), chunk_tokens), prepare_request, translate_request)
+        finally:
+            book.close()
+            if context_cache is not None:
+                progress_queue.put(("log", context_cache.summary(metrics.total("prompt_tokens"),
+                                                                 metrics.total("cached_tokens"))))
+                context_cache.close()
+            if duplicates is not None:
+                waiting = duplicates.abandon(duplicate_owner)
+                if waiting:
+                    progress_queue.put(("log", f"⚠️ Повторов без перевода: {waiting} (оригинал не переведен). "
+                                               f"Они будут переведены при следующем запуске."))
+            if memory is not None:
+                progress_queue.put(("log", f"Память переводов: попаданий {memory.hits}, промахов {memory.misses}."))
+                memory.close()
+            pm.compact_progress(project_name)
+
+        if hedging is not None:
+            progress_queue.put(("log", hedging.summary()))
+        if len(key_pool.slots) > 1:
+            for line in key_pool.summary():
+                progress_queue.put(("log", f"Ключ {line}"))
 
         if not stop_event.is_set():
             progress_queue.put(("log", "Все главы переведены. Собираем DOCX..."))
-            doc = Document()
-            metadata_title = book.get_metadata('DC', 'title')
-            doc.add_heading(metadata_title[0][0] if metadata_title else "Переведенная книга", 0)
-
-            if os.path.exists(temp_dir) and os.listdir(temp_dir):
+            with metrics.phase("assembly"):
+                chapters = []
                 for filename in sorted(os.listdir(temp_dir)):
-                    if filename.endswith(".txt"):
-                        with open(os.path.join(temp_dir, filename), 'r', encoding='utf-8') as f:
-                            content = f.read().split('\n', 1)
-                            title = content[0].replace("<h1>", "").replace("</h1>", "")
-                            text = content[1] if len(content) > 1 else ""
-                            doc.add_heading(title, level=1)
-                            doc.add_paragraph(text)
-                            doc.add_page_break()
-
-            doc.save(project_data["output_path"])
-            pm.cleanup_project(project_name)
+                    match = CHAPTER_FILE_RE.match(filename)
+                    if match:
+                        chapters.append((int(match.group(1)), os.path.join(temp_dir, filename)))
+                rendered = assembler.write(project_data["output_path"], book.title or "Переведенная книга",
+                                           chapters, _read_chapter_file)
+                if rendered:
+                    progress_queue.put(("log", f"DOCX: {rendered} глав без готового фрагмента оформлено при сборке."))
+            fallback = pm.fallback_chapters(project_name, project_data["model"])
+            if fallback:
+                # Прогресс и главы остаются в проекте, чтобы потом перевести заново только эти главы
+                progress_queue.put(("log", f"⚠️ Резервными моделями переведены главы: "
+                                           f"{', '.join(f'{i + 1} ({model})' for i, model in fallback.items())}. "
+                                           f"Повторный запуск с «Перевести заново главы резервных моделей» "
+                                           f"переведет их основной моделью."))
+            else:
+                pm.cleanup_project(project_name)
+            run_status = "done"
             progress_queue.put(("done", None))
         else:
+            run_status = "stopped"
             progress_queue.put(("log", "Перевод отменен. Прогресс сохранен."))
 
     except Exception as e:
         import traceback
         progress_queue.put(("error", traceback.format_exc()))
     finally:
-        progress_queue.put(("finish_signal", None))
\ No newline at end of file
+        pm.close()
+        _write_run_report(metrics, run_status, project_data, progress_queue)
+        progress_queue.put(("finish_signal", None))
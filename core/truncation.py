@@ -0,0 +1,53 @@
+# core/truncation.py
+from .rate_limiter import OUTPUT_TOKEN_RATIO, estimate_tokens, lookup_by_model
+
+# Предел max_output_tokens по моделям; ищется самый длинный префикс имени (lookup_by_model)
+MODEL_OUTPUT_LIMITS = {
+    "gemini-2.5": 65536,
+    "gemini-2.0": 8192,
+    "gemini-1.5": 8192,
+    "gemini-1.0": 2048,
+}
+DEFAULT_OUTPUT_LIMIT = 8192
+# Модели 2.5 рассуждают перед ответом, и рассуждение расходует тот же max_output_tokens:
+# с пределом по длине исходника короткая глава может вернуться вовсе без текста
+MODEL_MIN_OUTPUT_BUDGETS = {
+    "gemini-2.5": 16384,
+}
+# Запас к ожидаемой длине перевода: оценка грубая, а модели 2.5 тратят выходные токены и на рассуждение
+OUTPUT_BUDGET_FACTOR = 2.0
+MIN_OUTPUT_BUDGET = 1024
+# Полный ответ (STOP) короче этой доли исходника (в символах) подозрителен: модель могла пропустить абзацы.
+# Продолжение для него не запрашивается: абзацы сопоставляются только по счету и могли слиться или разделиться
+MIN_LENGTH_RATIO = 0.5
+# На коротких текстах доля ничего не говорит: заголовок или оглавление переводятся как угодно коротко
+MIN_RATIO_CHECK_CHARS = 1500
+# Сколько раз подряд досылать хвост одного ответа, прежде чем принять его как есть
+MAX_CONTINUATIONS = 3
+
+
+def output_limit(model_name):
+    return lookup_by_model(MODEL_OUTPUT_LIMITS, model_name, DEFAULT_OUTPUT_LIMIT)
+
+
+def output_cap(model_name, budget):
+    """max_output_tokens запроса к модели: бюджет не ниже минимума модели и не выше ее предела."""
+    floor = lookup_by_model(MODEL_MIN_OUTPUT_BUDGETS, model_name, MIN_OUTPUT_BUDGET)
+    return min(max(budget, floor), output_limit(model_name))
+
+
+def output_budget(source_text):
+    """max_output_tokens для запроса по длине исходника, до ограничения пределом модели."""
+    return max(MIN_OUTPUT_BUDGET, int(estimate_tokens(source_text) * OUTPUT_TOKEN_RATIO * OUTPUT_BUDGET_FACTOR))
+
+
+def is_truncated(finish_reason):
+    """Ответ оборван пределом выходных токенов: только такой ответ дополняется продолжением."""
+    return finish_reason == "MAX_TOKENS"
+
+
+def short_translation(source_text, translated_text):
+    """Во сколько раз перевод короче исходника, если подозрительно короче, иначе None."""
+    if len(source_text) >= MIN_RATIO_CHECK_CHARS and len(translated_text) < MIN_LENGTH_RATIO * len(source_text):
+        return len(source_text) / max(len(translated_text), 1)
+    return None
@@ -10,10 +10,25 @@ import customtkinter as ctk
 from tkinter import filedialog, messagebox, TclError
 
 from core.project_manager import ProjectManager
+from core.providers import get_provider
+from core.prompts import DEFAULT_PROMPT
 from core.translator import translation_process
 from core.api_key_manager import ApiKeyManager
+from core.batch import DEFAULT_PARALLEL_BOOKS, BatchScheduler
+from core.cancellation import DEFAULT_REQUEST_TIMEOUT
+from core.chunker import DEFAULT_CHUNK_TOKENS
+from core.estimator import announce_estimate
+from core.hedging import DEFAULT_HEDGE_PERCENTILE
+from gui.log_spool import LogSpool
 
 FALLBACK_MODELS = ["gemini-1.5-flash-latest", "gemini-1.5-pro-latest", "gemini-1.0-pro"]
+# Окно лога показывает только последние строки; полный лог хранится во временном файле
+DEFAULT_LOG_LINES = 2000
+QUEUE_POLL_MS = 100
+# Сколько сообщений разбирается за один тик, чтобы интерфейс не замирал при всплеске
+MAX_MESSAGES_PER_TICK = 2000
+# Вес предварительной оценки в ETA, в главах: пока переведено меньше, больше верим оценке, чем замеру
+ETA_PRIOR_CHAPTERS = 3
 
 
 class App(ctk.CTk):
@@ -33,6 +48,15 @@ class App(ctk.CTk):
         self.translation_thread = None
         self.stop_event = threading.Event()
         self.progress_queue = queue.Queue()
+        self.book_progress = {}
+        self.estimate_seconds = 0.0
+        self.estimate_chapters = 0
+        self.eta_baseline = None
+        # Свой список служебных страниц правится в файле проекта; пустой — список по умолчанию
+        self.skip_patterns = ""
+        self.log_spool = LogSpool()
+        self.pending_log_lines = []
+        self.log_line_count = 0
 
         self.is_modifier_pressed = False
 
@@ -41,9 +65,27 @@ class App(ctk.CTk):
         self.output_path_var = ctk.StringVar()
         self.project_name_var = ctk.StringVar(value="<Выберите проект>")
         self.model_var = ctk.StringVar(value=FALLBACK_MODELS[0])
+        self.fallback_models_var = ctk.StringVar(value="")
         self.delay_var = ctk.StringVar(value="2.0")
+        self.concurrency_var = ctk.StringVar(value="1")
+        self.rpm_var = ctk.StringVar(value="")
+        self.tpm_var = ctk.StringVar(value="")
+        self.request_timeout_var = ctk.StringVar(value=str(DEFAULT_REQUEST_TIMEOUT))
+        self.chunk_tokens_var = ctk.StringVar(value=str(DEFAULT_CHUNK_TOKENS))
+        self.parallel_books_var = ctk.StringVar(value=str(DEFAULT_PARALLEL_BOOKS))
         self.regex_var = ctk.BooleanVar(value=False)
+        self.key_pool_var = ctk.BooleanVar(value=False)
+        self.translation_memory_var = ctk.BooleanVar(value=True)
+        self.stream_var = ctk.BooleanVar(value=False)
+        self.context_cache_var = ctk.BooleanVar(value=False)
+        self.deduplicate_var = ctk.BooleanVar(value=True)
+        self.near_duplicates_var = ctk.BooleanVar(value=False)
+        self.skip_boilerplate_var = ctk.BooleanVar(value=False)
+        self.hedge_var = ctk.BooleanVar(value=False)
+        self.exact_count_var = ctk.BooleanVar(value=False)
+        self.rerun_fallback_var = ctk.BooleanVar(value=False)
         self.batch_mode_var = ctk.StringVar(value="Файл")
+        self.log_lines_var = ctk.StringVar(value=str(DEFAULT_LOG_LINES))
 
         self.build_ui()
         self.update_project_list()
@@ -131,12 +173,62 @@ class App(ctk.CTk):
         self.update_models_button = ctk.CTkButton(model_frame, text="Обновить", width=80,
                                                   command=self.start_model_list_update)
         self.update_models_button.grid(row=1, column=1, padx=(5, 0))
-        ctk.CTkLabel(left_panel, text="Задержка между главами (сек):").pack(padx=10, pady=(10, 0), anchor="w")
+        ctk.CTkLabel(left_panel, text="Резервные модели (через запятую):").pack(padx=10, pady=(10, 0), anchor="w")
+        self.fallback_models_entry = ctk.CTkEntry(left_panel, textvariable=self.fallback_models_var,
+                                                  placeholder_text="gemini-1.5-flash, gemini-1.5-flash-8b")
+        self.fallback_models_entry.pack(pady=5, padx=10, fill="x")
+        self.add_default_bindings(self.fallback_models_entry)
+        ctk.CTkLabel(left_panel, text="Мин. интервал между запросами (сек):").pack(padx=10, pady=(10, 0), anchor="w")
         self.delay_entry = ctk.CTkEntry(left_panel, textvariable=self.delay_var)
         self.delay_entry.pack(pady=5, padx=10, fill="x")
         self.add_default_bindings(self.delay_entry)
+        ctk.CTkLabel(left_panel, text="Параллельных запросов:").pack(padx=10, pady=(10, 0), anchor="w")
+        self.concurrency_entry = ctk.CTkEntry(left_panel, textvariable=self.concurrency_var)
+        self.concurrency_entry.pack(pady=5, padx=10, fill="x")
+        self.add_default_bindings(self.concurrency_entry)
+        limits_frame = ctk.CTkFrame(left_panel, fg_color="transparent")
+        limits_frame.pack(pady=5, padx=10, fill="x")
+        limits_frame.grid_columnconfigure((0, 1), weight=1)
+        ctk.CTkLabel(limits_frame, text="RPM:").grid(row=0, column=0, sticky="w")
+        ctk.CTkLabel(limits_frame, text="TPM:").grid(row=0, column=1, padx=(5, 0), sticky="w")
+        self.rpm_entry = ctk.CTkEntry(limits_frame, textvariable=self.rpm_var, placeholder_text="по модели")
+        self.rpm_entry.grid(row=1, column=0, sticky="ew")
+        self.add_default_bindings(self.rpm_entry)
+        self.tpm_entry = ctk.CTkEntry(limits_frame, textvariable=self.tpm_var, placeholder_text="по модели")
+        self.tpm_entry.grid(row=1, column=1, padx=(5, 0), sticky="ew")
+        self.add_default_bindings(self.tpm_entry)
+        ctk.CTkLabel(left_panel, text="Срок ответа на запрос (сек):").pack(padx=10, pady=(10, 0), anchor="w")
+        self.request_timeout_entry = ctk.CTkEntry(left_panel, textvariable=self.request_timeout_var)
+        self.request_timeout_entry.pack(pady=5, padx=10, fill="x")
+        self.add_default_bindings(self.request_timeout_entry)
+        ctk.CTkLabel(left_panel, text="Токенов на запрос (0 = глава целиком):").pack(padx=10, pady=(10, 0), anchor="w")
+        self.chunk_tokens_entry = ctk.CTkEntry(left_panel, textvariable=self.chunk_tokens_var)
+        self.chunk_tokens_entry.pack(pady=5, padx=10, fill="x")
+        self.add_default_bindings(self.chunk_tokens_entry)
         self.regex_checkbox = ctk.CTkCheckBox(left_panel, text="Включить RegEx в глоссарии", variable=self.regex_var)
         self.regex_checkbox.pack(pady=10, padx=10, fill="x")
+        self.translation_memory_checkbox = ctk.CTkCheckBox(left_panel, text="Память переводов",
+                                                           variable=self.translation_memory_var)
+        self.translation_memory_checkbox.pack(pady=(0, 10), padx=10, fill="x")
+        self.stream_checkbox = ctk.CTkCheckBox(left_panel, text="Потоковый ответ с сохранением",
+                                               variable=self.stream_var)
+        self.stream_checkbox.pack(pady=(0, 10), padx=10, fill="x")
+        self.context_cache_checkbox = ctk.CTkCheckBox(left_panel, text="Кеш контекста для инструкций и глоссария",
+                                                      variable=self.context_cache_var)
+        self.context_cache_checkbox.pack(pady=(0, 10), padx=10, fill="x")
+        self.deduplicate_checkbox = ctk.CTkCheckBox(left_panel, text="Повторы документов переводить один раз",
+                                                    variable=self.deduplicate_var)
+        self.deduplicate_checkbox.pack(pady=(0, 10), padx=10, fill="x")
+        self.near_duplicates_checkbox = ctk.CTkCheckBox(left_panel,
+                                                        text="Повтором считать и почти одинаковые короткие страницы",
+                                                        variable=self.near_duplicates_var)
+        self.near_duplicates_checkbox.pack(pady=(0, 10), padx=10, fill="x")
+        self.skip_boilerplate_checkbox = ctk.CTkCheckBox(left_panel, text="Не переводить служебные страницы",
+                                                         variable=self.skip_boilerplate_var)
+        self.skip_boilerplate_checkbox.pack(pady=(0, 10), padx=10, fill="x")
+        self.hedge_checkbox = ctk.CTkCheckBox(left_panel, text="Дублировать медленные запросы",
+                                              variable=self.hedge_var)
+        self.hedge_checkbox.pack(pady=(0, 10), padx=10, fill="x")
         separator2 = ctk.CTkFrame(left_panel, height=2, fg_color="gray50")
         separator2.pack(pady=10, fill="x", padx=5)
         ctk.CTkLabel(left_panel, text="Управление", font=bold_font).pack(pady=10)
@@ -145,6 +237,14 @@ class App(ctk.CTk):
         self.stop_button = ctk.CTkButton(left_panel, text="❌ Отмена", fg_color="red", hover_color="#C41E3A",
                                          command=self.stop_translation, state="disabled")
         self.stop_button.pack(pady=5, padx=10, fill="x")
+        self.rerun_fallback_checkbox = ctk.CTkCheckBox(left_panel, text="Перевести заново главы резервных моделей",
+                                                       variable=self.rerun_fallback_var)
+        self.rerun_fallback_checkbox.pack(pady=(0, 5), padx=10, fill="x")
+        self.estimate_button = ctk.CTkButton(left_panel, text="📊 Оценить", command=self.start_estimate)
+        self.estimate_button.pack(pady=5, padx=10, fill="x")
+        self.exact_count_checkbox = ctk.CTkCheckBox(left_panel, text="Точный подсчет токенов (API)",
+                                                    variable=self.exact_count_var)
+        self.exact_count_checkbox.pack(pady=(0, 5), padx=10, fill="x")
         separator3 = ctk.CTkFrame(left_panel, height=2, fg_color="gray50")
         separator3.pack(pady=10, fill="x", padx=5)
         self.theme_switch = ctk.CTkSwitch(left_panel, text="Тёмная тема", command=self.toggle_theme)
@@ -162,12 +262,20 @@ class App(ctk.CTk):
         self.api_key_menu.grid(row=0, column=0, padx=(0, 5), pady=5, sticky="ew")
         self.manage_keys_button = ctk.CTkButton(key_frame, text="...", width=40, command=self.open_key_manager_window)
         self.manage_keys_button.grid(row=0, column=1, pady=5)
+        self.key_pool_checkbox = ctk.CTkCheckBox(key_frame, text="Пул: все ключи", variable=self.key_pool_var)
+        self.key_pool_checkbox.grid(row=0, column=2, padx=(10, 0), pady=5)
         source_frame = ctk.CTkFrame(settings_frame, fg_color="transparent")
         source_frame.grid(row=1, column=0, columnspan=2, sticky="ew", padx=10)
         source_frame.grid_columnconfigure(1, weight=1)
         ctk.CTkLabel(source_frame, text="Режим:").grid(row=0, column=0, padx=(0, 5))
         self.mode_switch = ctk.CTkSegmentedButton(source_frame, values=["Файл", "Папка"], variable=self.batch_mode_var)
         self.mode_switch.grid(row=0, column=1, pady=5, sticky="w")
+        books_frame = ctk.CTkFrame(source_frame, fg_color="transparent")
+        books_frame.grid(row=0, column=1, columnspan=2, sticky="e")
+        ctk.CTkLabel(books_frame, text="Книг одновременно (папка):").pack(side="left", padx=(0, 5))
+        self.parallel_books_entry = ctk.CTkEntry(books_frame, textvariable=self.parallel_books_var, width=50)
+        self.parallel_books_entry.pack(side="left", padx=5)
+        self.add_default_bindings(self.parallel_books_entry)
         ctk.CTkLabel(source_frame, text="Источник:").grid(row=1, column=0)
         self.epub_path_entry = ctk.CTkEntry(source_frame, textvariable=self.epub_path_var,
                                             placeholder_text="Путь к файлу или папке")
@@ -190,22 +298,14 @@ class App(ctk.CTk):
         self.prompt_textbox = ctk.CTkTextbox(self.tab_view.tab("Промпт"), font=unicode_font)
         self.prompt_textbox.pack(expand=True, fill="both", padx=5, pady=5)
 
-        default_prompt = (
-            "You are a professional literary translator. Translate the following text from English into Russian.\n"
-            "Preserve the original style, tone, and formatting (paragraphs, line breaks). "
-            "Translate the meaning accurately, not just word for word.\n"
-            "{glossary}\n"
-            "Text to translate:\n"
-            "---\n"
-            "{text_to_translate}"
-        )
-        self.prompt_textbox.insert("0.0", default_prompt)
+        self.prompt_textbox.insert("0.0", DEFAULT_PROMPT)
 
         self.add_default_bindings(self.prompt_textbox)
         self.glossary_textbox = ctk.CTkTextbox(self.tab_view.tab("Глоссарий"), font=unicode_font)
         self.glossary_textbox.pack(expand=True, fill="both", padx=5, pady=5)
         self.glossary_textbox.insert("0.0",
-                                     "# Формат: Оригинал -> Перевод\n# RegEx поддерживается, если включен флажок.\n# Пример:\n(?i)naruto -> Наруто\nshinobi -> шиноби")
+                                     "# Формат: Оригинал -> Перевод\n# RegEx, например (?i)naruto, поддерживается, если включен флажок.\n"
+                                     "# Пример:\nNaruto -> Наруто\nshinobi -> шиноби")
         self.add_default_bindings(self.glossary_textbox)
 
         progress_frame = ctk.CTkFrame(self)
@@ -224,8 +324,13 @@ class App(ctk.CTk):
         self.log_textbox = ctk.CTkTextbox(log_frame, state="disabled", font=unicode_font)
         self.log_textbox.grid(row=0, column=0, sticky="nsew", padx=5, pady=(5, 0))
         self.add_default_bindings(self.log_textbox)
-        self.save_log_button = ctk.CTkButton(log_frame, text="Сохранить лог в файл", command=self.save_log)
-        self.save_log_button.grid(row=1, column=0, padx=5, pady=5, sticky="ew")
+        log_controls = ctk.CTkFrame(log_frame, fg_color="transparent")
+        log_controls.grid(row=1, column=0, padx=5, pady=5, sticky="ew")
+        log_controls.grid_columnconfigure(0, weight=1)
+        self.save_log_button = ctk.CTkButton(log_controls, text="Сохранить лог в файл", command=self.save_log)
+        self.save_log_button.grid(row=0, column=0, sticky="ew")
+        ctk.CTkLabel(log_controls, text="Строк в окне:").grid(row=0, column=1, padx=(10, 5))
+        ctk.CTkEntry(log_controls, textvariable=self.log_lines_var, width=70).grid(row=0, column=2)
 
     def select_source(self):
         if self.batch_mode_var.get() == "Файл":
@@ -245,14 +350,8 @@ class App(ctk.CTk):
             if path: self.output_path_var.set(path)
 
     def save_log(self):
-        self.log_textbox.configure(state="normal")
-        log_content = self.log_textbox.get("1.0", "end-1c")
-        if not self.is_running:
-            pass
-        else:
-            self.log_textbox.configure(state="disabled")
-
-        if not log_content.strip():
+        self.flush_log()
+        if not self.log_spool.size:
             messagebox.showinfo("Информация", "Лог пуст, нечего сохранять.", parent=self)
             return
 
@@ -263,8 +362,7 @@ class App(ctk.CTk):
         )
         if filepath:
             try:
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(log_content)
+                self.log_spool.copy_to(filepath)
                 self.log(f"Лог успешно сохранен в: {filepath}")
             except Exception as e:
                 self.log(f"Ошибка сохранения лога: {e}")
@@ -388,8 +486,24 @@ class App(ctk.CTk):
             "prompt": self.prompt_textbox.get("1.0", "end-1c"),
             "glossary": self.glossary_textbox.get("1.0", "end-1c"),
             "model": self.model_var.get(),
+            "fallback_models": self.fallback_models(),
             "delay": float(self.delay_var.get() or 2.0),
+            "concurrency": int(self.concurrency_var.get() or 1),
+            "rpm": int(self.rpm_var.get()) if self.rpm_var.get().strip() else None,
+            "tpm": int(self.tpm_var.get()) if self.tpm_var.get().strip() else None,
+            "request_timeout": float(self.request_timeout_var.get() or DEFAULT_REQUEST_TIMEOUT),
+            "chunk_tokens": int(self.chunk_tokens_var.get() or DEFAULT_CHUNK_TOKENS),
+            "parallel_books": int(self.parallel_books_var.get() or DEFAULT_PARALLEL_BOOKS),
             "use_regex": self.regex_var.get(),
+            "use_key_pool": self.key_pool_var.get(),
+            "use_translation_memory": self.translation_memory_var.get(),
+            "stream": self.stream_var.get(),
+            "context_cache": self.context_cache_var.get(),
+            "deduplicate": self.deduplicate_var.get(),
+            "near_duplicates": self.near_duplicates_var.get(),
+            "skip_boilerplate": self.skip_boilerplate_var.get(),
+            "skip_patterns": self.skip_patterns,
+            "hedge_percentile": DEFAULT_HEDGE_PERCENTILE if self.hedge_var.get() else None,
             "completed_chapters": completed_chapters
         }
         self.pm.save(project_name, project_data)
@@ -413,32 +527,45 @@ class App(ctk.CTk):
             self.prompt_textbox.insert("1.0", data.get("prompt", ""))
             self.glossary_textbox.insert("1.0", data.get("glossary", ""))
             self.model_var.set(data.get("model", FALLBACK_MODELS[0]))
+            self.fallback_models_var.set(", ".join(data.get("fallback_models") or []))
             self.delay_var.set(str(data.get("delay", 2.0)))
+            self.concurrency_var.set(str(data.get("concurrency", 1)))
+            self.rpm_var.set(str(data.get("rpm") or ""))
+            self.tpm_var.set(str(data.get("tpm") or ""))
+            self.request_timeout_var.set(str(data.get("request_timeout", DEFAULT_REQUEST_TIMEOUT)))
+            self.chunk_tokens_var.set(str(data.get("chunk_tokens", DEFAULT_CHUNK_TOKENS)))
+            self.parallel_books_var.set(str(data.get("parallel_books", DEFAULT_PARALLEL_BOOKS)))
             self.regex_var.set(data.get("use_regex", False))
+            self.key_pool_var.set(data.get("use_key_pool", False))
+            self.translation_memory_var.set(data.get("use_translation_memory", True))
+            self.stream_var.set(data.get("stream", False))
+            self.context_cache_var.set(data.get("context_cache", False))
+            self.deduplicate_var.set(data.get("deduplicate", True))
+            self.near_duplicates_var.set(data.get("near_duplicates", False))
+            self.skip_boilerplate_var.set(data.get("skip_boilerplate", False))
+            self.skip_patterns = data.get("skip_patterns", "")
+            self.hedge_var.set(bool(data.get("hedge_percentile")))
             self.log(f"Проект '{project_name}' загружен.")
         except Exception as e:
             self.log(f"Ошибка при загрузке проекта: {e}")
 
-    def start_translation(self):
-        if self.is_running:
-            return
-
+    def collect_files(self):
         source_path = self.epub_path_var.get()
         output_path = self.output_path_var.get()
         if not source_path or not output_path:
             messagebox.showerror("Ошибка", "Пути источника и результата не могут быть пустыми.")
-            return
+            return None
 
         files_to_process = []
         if self.batch_mode_var.get() == "Файл":
             if not source_path.lower().endswith(".epub"):
                 messagebox.showerror("Ошибка", "В режиме 'Файл' источник должен быть .epub файлом.")
-                return
+                return None
             files_to_process.append({"input": source_path, "output": output_path})
         else:
             if not os.path.isdir(source_path):
                 messagebox.showerror("Ошибка", "В режиме 'Папка' источник должен быть папкой.")
-                return
+                return None
             if not os.path.isdir(output_path):
                 os.makedirs(output_path, exist_ok=True)
             for filename in os.listdir(source_path):
@@ -451,42 +578,74 @@ class App(ctk.CTk):
 
         if not files_to_process:
             messagebox.showerror("Ошибка", "Не найдено EPUB файлов для обработки.")
-            return
+            return None
+        return files_to_process
 
+    def begin_run(self):
         self.is_running = True
         self.stop_event.clear()
         self.start_button.configure(state="disabled")
+        self.estimate_button.configure(state="disabled")
         self.stop_button.configure(state="normal")
         self.project_menu.configure(state="disabled")
 
         self.log_textbox.configure(state="normal")
         self.log_textbox.delete("1.0", "end")
         self.log_textbox.configure(state="disabled")
+        self.pending_log_lines = []
+        self.log_line_count = 0
+        self.log_spool.clear()
+        self.book_progress = {}
+        self.estimate_seconds = 0.0
+        self.estimate_chapters = 0
+        self.eta_baseline = None
 
+    def start_translation(self):
+        if self.is_running:
+            return
+        files_to_process = self.collect_files()
+        if not files_to_process:
+            return
+        self.begin_run()
         self.translation_thread = threading.Thread(target=self.batch_translation_manager, args=(files_to_process,))
         self.translation_thread.start()
 
-    def batch_translation_manager(self, files_to_process):
-        total_books = len(files_to_process)
-        self.progress_queue.put(("log", f"Начинаем пакетную обработку. Всего книг: {total_books}"))
+    def start_estimate(self):
+        if self.is_running:
+            return
+        files_to_process = self.collect_files()
+        if not files_to_process:
+            return
+        self.begin_run()
+        self.translation_thread = threading.Thread(target=self.estimate_manager,
+                                                   args=(files_to_process, self.exact_count_var.get()))
+        self.translation_thread.start()
 
-        for i, file_info in enumerate(files_to_process):
-            if self.stop_event.is_set():
-                self.progress_queue.put(("log", "Пакетная обработка отменена пользователем."))
-                break
+    def estimate_manager(self, files_to_process, exact):
+        project_data = self.collect_project_data()
+        if project_data:
+            if self.batch_mode_var.get() == "Файл":
+                project_data["epub_path"] = files_to_process[0]["input"]
+                announce_estimate(project_data, self.progress_queue, exact=exact, is_halted=self.stop_event.is_set)
+            else:
+                BatchScheduler(project_data, files_to_process, self.progress_queue, self.stop_event).estimate(exact)
+        self.progress_queue.put(("finish_signal", None))
 
-            self.progress_queue.put(
-                ("log", f"--- Книга {i + 1}/{total_books}: {os.path.basename(file_info['input'])} ---"))
-            project_data = self.collect_project_data()
-            if not project_data:
-                break
+    def batch_translation_manager(self, files_to_process):
+        project_data = self.collect_project_data()
+        if not project_data:
+            self.progress_queue.put(("finish_signal", None))
+            return
 
+        if self.batch_mode_var.get() == "Файл":
+            file_info = files_to_process[0]
             project_data["epub_path"] = file_info["input"]
             project_data["output_path"] = file_info["output"]
             translation_process(project_data, self.progress_queue, self.stop_event)
+            return
 
-        if not self.stop_event.is_set():
-            self.progress_queue.put(("log", "🎉 Вся пакетная обработка завершена!"))
+        # В режиме папки у каждой книги свой проект, книги идут параллельно под общим лимитом
+        BatchScheduler(project_data, files_to_process, self.progress_queue, self.stop_event).run()
         self.progress_queue.put(("finish_signal", None))
 
     def collect_project_data(self):
@@ -494,11 +653,45 @@ class App(ctk.CTk):
         if not api_key:
             self.progress_queue.put(("error", "API-ключ не найден!"))
             return None
+        # В режиме пула главы распределяются по всем сохраненным ключам
+        api_keys = None
+        if self.key_pool_var.get():
+            api_keys = {name: self.key_manager.get_key_value(name) for name in self.key_manager.get_key_names()}
         try:
             delay = float(self.delay_var.get())
         except ValueError:
             self.progress_queue.put(("error", "Неверное значение задержки!"))
             return None
+        try:
+            concurrency = int(self.concurrency_var.get())
+            if concurrency < 1:
+                raise ValueError
+        except ValueError:
+            self.progress_queue.put(("error", "Число параллельных запросов должно быть целым числом от 1!"))
+            return None
+        try:
+            rpm = int(self.rpm_var.get()) if self.rpm_var.get().strip() else None
+            tpm = int(self.tpm_var.get()) if self.tpm_var.get().strip() else None
+        except ValueError:
+            self.progress_queue.put(("error", "Лимиты RPM/TPM должны быть целыми числами или пустыми!"))
+            return None
+        try:
+            request_timeout = float(self.request_timeout_var.get())
+            if request_timeout <= 0:
+                raise ValueError
+        except ValueError:
+            self.progress_queue.put(("error", "Срок ответа на запрос должен быть положительным числом секунд!"))
+            return None
+        try:
+            chunk_tokens = int(self.chunk_tokens_var.get())
+        except ValueError:
+            self.progress_queue.put(("error", "Бюджет токенов на запрос должен быть целым числом!"))
+            return None
+        try:
+            parallel_books = max(1, int(self.parallel_books_var.get()))
+        except ValueError:
+            self.progress_queue.put(("error", "Число книг одновременно должно быть целым числом!"))
+            return None
 
         project_name = self.project_name_var.get()
         if project_name == "<Выберите проект>" or project_name == "<Нет проектов>":
@@ -515,12 +708,23 @@ class App(ctk.CTk):
             pass
 
         return {
-            "api_key": api_key, "prompt": self.prompt_textbox.get("1.0", "end-1c"),
+            "api_key": api_key, "api_keys": api_keys, "prompt": self.prompt_textbox.get("1.0", "end-1c"),
             "glossary": self.glossary_textbox.get("1.0", "end-1c"), "model": self.model_var.get(),
-            "delay": delay, "use_regex": self.regex_var.get(), "project_name": project_name,
+            "fallback_models": self.fallback_models(), "rerun_fallback": self.rerun_fallback_var.get(),
+            "delay": delay, "concurrency": concurrency, "rpm": rpm, "tpm": tpm, "request_timeout": request_timeout,
+            "chunk_tokens": chunk_tokens, "parallel_books": parallel_books, "use_regex": self.regex_var.get(),
+            "use_translation_memory": self.translation_memory_var.get(), "stream": self.stream_var.get(),
+            "context_cache": self.context_cache_var.get(), "deduplicate": self.deduplicate_var.get(),
+            "near_duplicates": self.near_duplicates_var.get(), "skip_boilerplate": self.skip_boilerplate_var.get(), "skip_patterns": self.skip_patterns,
+            "hedge_percentile": DEFAULT_HEDGE_PERCENTILE if self.hedge_var.get() else None,
+            "project_name": project_name,
             "resume": resume_translation, "completed_chapters_list": completed_chapters
         }
 
+    def fallback_models(self):
+        """Каскад резервных моделей из поля через запятую, по порядку."""
+        return [name.strip() for name in self.fallback_models_var.get().split(",") if name.strip()]
+
     def create_new_project(self):
         dialog = ctk.CTkInputDialog(text="Введите имя нового проекта:", title="Создание проекта")
         project_name = dialog.get_input()
@@ -539,10 +743,26 @@ class App(ctk.CTk):
         self.output_path_var.set("")
         self.prompt_textbox.delete("1.0", "end")
         self.glossary_textbox.delete("1.0", "end")
-        self.glossary_textbox.insert("0.0", "# Формат: Оригинал -> Перевод\n# Пример:\n(?i)naruto -> Наруто")
+        self.glossary_textbox.insert("0.0", "# Формат: Оригинал -> Перевод\n# Пример:\nNaruto -> Наруто")
         self.model_var.set(FALLBACK_MODELS[0])
+        self.fallback_models_var.set("")
         self.delay_var.set("2.0")
+        self.concurrency_var.set("1")
+        self.rpm_var.set("")
+        self.tpm_var.set("")
+        self.request_timeout_var.set(str(DEFAULT_REQUEST_TIMEOUT))
+        self.chunk_tokens_var.set(str(DEFAULT_CHUNK_TOKENS))
+        self.parallel_books_var.set(str(DEFAULT_PARALLEL_BOOKS))
         self.regex_var.set(False)
+        self.key_pool_var.set(False)
+        self.translation_memory_var.set(True)
+        self.stream_var.set(False)
+        self.context_cache_var.set(False)
+        self.deduplicate_var.set(True)
+        self.near_duplicates_var.set(False)
+        self.skip_boilerplate_var.set(False)
+        self.skip_patterns = ""
+        self.hedge_var.set(False)
         self.update_api_key_list()
 
     def delete_project(self):
@@ -573,10 +793,37 @@ class App(ctk.CTk):
                 self.clear_fields()
 
     def log(self, message):
+        # Строка попадает в окно при ближайшем тике check_queue, одной вставкой вместе с остальными
         timestamp = time.strftime("%H:%M:%S")
+        line = f"[{timestamp}] {message}\n"
+        self.log_spool.write(line)
+        self.pending_log_lines.append(line)
+
+    def get_log_line_limit(self):
+        try:
+            return max(100, int(self.log_lines_var.get()))
+        except ValueError:
+            return DEFAULT_LOG_LINES
+
+    def flush_log(self):
+        if not self.pending_log_lines:
+            return
+        limit = self.get_log_line_limit()
+        lines = self.pending_log_lines[-limit:]
+        self.pending_log_lines = []
+        # Сообщение может занимать несколько строк (например, traceback)
+        new_count = sum(line.count("\n") for line in lines)
+
+        state = self.log_textbox.cget("state")
         self.log_textbox.configure(state="normal")
-        self.log_textbox.insert("end", f"[{timestamp}] {message}\n")
-        self.log_textbox.configure(state="disabled")
+        self.log_textbox.insert("end", "".join(lines))
+        self.log_line_count += new_count
+        if self.log_line_count > limit:
+            # Кольцевой буфер: старые строки удаляются из окна, но остаются в файле лога
+            excess = self.log_line_count - limit
+            self.log_textbox.delete("1.0", f"{excess + 1}.0")
+            self.log_line_count = limit
+        self.log_textbox.configure(state=state)
         self.log_textbox.see("end")
 
     def toggle_theme(self):
@@ -591,11 +838,8 @@ class App(ctk.CTk):
         threading.Thread(target=self.fetch_models_thread, args=(api_key,)).start()
 
     def fetch_models_thread(self, api_key):
-        import google.generativeai as genai
         try:
-            genai.configure(api_key=api_key)
-            models = [m.name.replace("models/", "") for m in genai.list_models() if
-                      'generateContent' in m.supported_generation_methods]
+            models = get_provider(api_key).list_models()
             self.progress_queue.put(("update_models", models))
         except Exception as e:
             self.progress_queue.put(("log", f"Ошибка получения списка моделей: {e}"))
@@ -614,17 +858,67 @@ class App(ctk.CTk):
             self.log("Не удалось обновить список моделей. Используется стандартный набор.")
         self.update_models_button.configure(text="Обновить", state="normal")
 
+    def show_progress(self, current, total):
+        percentage = current / total if total > 0 else 0
+        self.progress_bar.set(percentage)
+        label = f"Переведено глав: {current} / {total} ({percentage:.0%})"
+        eta = self.estimate_remaining(current, total)
+        if eta is not None:
+            minutes, seconds = divmod(int(eta), 60)
+            hours, minutes = divmod(minutes, 60)
+            label += f" · осталось ~{hours} ч {minutes} мин" if hours else f" · осталось ~{minutes} мин {seconds} с"
+        if self.book_progress:
+            books_done = sum(1 for done, count in self.book_progress.values() if done >= count)
+            label += f" · книг готово: {books_done} / {len(self.book_progress)} в работе"
+        self.progress_label.configure(text=label)
+
+    def estimate_remaining(self, current, total):
+        """
+        Секунд до конца: время на главу из предварительной оценки, уточняемое замером текущего прогона.
+        Отсчет идет от первого обновления прогресса, главы из прошлых прогонов в замер не попадают.
+        """
+        now = time.monotonic()
+        if self.eta_baseline is None:
+            self.eta_baseline = (now, current)
+        started_at, started_with = self.eta_baseline
+        done = current - started_with
+        remaining = total - current
+        if remaining <= 0:
+            return None
+        estimated = self.estimate_seconds / self.estimate_chapters if self.estimate_chapters else None
+        observed = (now - started_at) / done if done > 0 else None
+        if estimated is None and observed is None:
+            return None
+        if estimated is None:
+            per_chapter = observed
+        elif observed is None:
+            per_chapter = estimated
+        else:
+            per_chapter = (estimated * ETA_PRIOR_CHAPTERS + observed * done) / (ETA_PRIOR_CHAPTERS + done)
+        return per_chapter * remaining
+
     def check_queue(self):
+        # За тик разбираем накопившиеся сообщения, а рисуем один раз: лог одной вставкой,
+        # из обновлений прогресса — только последнее
+        latest_progress = None
         try:
-            while not self.progress_queue.empty():
+            for _ in range(MAX_MESSAGES_PER_TICK):
                 message, data = self.progress_queue.get_nowait()
                 if message == "log":
                     self.log(data)
                 elif message == "progress":
-                    current, total = data
-                    percentage = current / total if total > 0 else 0
-                    self.progress_bar.set(percentage)
-                    self.progress_label.configure(text=f"Переведено глав: {current} / {total} ({percentage:.0%})")
+                    latest_progress = data
+                elif message == "estimate":
+                    # В пакете оценки приходят по каждой книге и складываются
+                    self.estimate_seconds += data["wall_seconds"]
+                    self.estimate_chapters += data["chapters_pending"]
+                elif message == "eta":
+                    # Во время перевода оценка приходит приростами по мере подготовки запросов
+                    self.estimate_seconds += data["wall_seconds"]
+                    self.estimate_chapters += data["chapters"]
+                elif message == "book_progress":
+                    book_index, current, total = data
+                    self.book_progress[book_index] = (current, total)
                 elif message == "done":
                     self.log("✅ Перевод успешно завершен!")
                 elif message == "error":
@@ -637,7 +931,10 @@ class App(ctk.CTk):
         except queue.Empty:
             pass
         finally:
-            self.after(100, self.check_queue)
+            if latest_progress is not None:
+                self.show_progress(*latest_progress)
+            self.flush_log()
+            self.after(QUEUE_POLL_MS, self.check_queue)
 
     def stop_translation(self):
         if self.is_running:
@@ -648,6 +945,7 @@ class App(ctk.CTk):
     def translation_finished(self):
         self.is_running = False
         self.start_button.configure(state="normal")
+        self.estimate_button.configure(state="normal")
         self.stop_button.configure(text="❌ Отмена", state="disabled")
         self.project_menu.configure(state="normal")
         self.log_textbox.configure(state="normal")
\ No newline at end of file
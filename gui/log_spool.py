@@ -0,0 +1,35 @@
+# gui/log_spool.py
+import shutil
+import tempfile
+
+
+class LogSpool:
+    """
+    Полный лог сессии во временном файле.
+    Окно лога хранит только последние строки, а «Сохранить лог» берет весь текст отсюда.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        self.size = 0
+
+    def write(self, text):
+        self._file.write(text)
+        self.size += len(text)
+
+    def clear(self):
+        self._file.seek(0)
+        self._file.truncate()
+        self.size = 0
+
+    def copy_to(self, path):
+        self._file.flush()
+        self._file.seek(0)
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                shutil.copyfileobj(self._file, f)
+        finally:
+            self._file.seek(0, 2)
+
+    def close(self):
+        self._file.close()